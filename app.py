@@ -8,15 +8,70 @@ Company: [Your Company]
 """
 
 import os
+import atexit
+import base64
+import contextlib
+import csv
+import filecmp
+import gzip
+import hashlib
+import heapq
+import hmac
+import importlib.util
+import io
+import json
+import math
+import mimetypes
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import stat
+import threading
+import tempfile
+import time
+import urllib.parse
+import uuid
+from collections import OrderedDict, namedtuple
+from email.message import EmailMessage
+from email.utils import format_datetime
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
-from flask import Flask, render_template, request, redirect, url_for, flash, abort
+from html import unescape
+import click
+from flask import (Flask, render_template, request, redirect, url_for, flash, abort,
+                   g, session, jsonify, make_response, has_request_context, send_from_directory, stream_with_context,
+                   before_render_template, template_rendered)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.exc import DatabaseError, OperationalError
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from markupsafe import Markup, escape
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-import markdown
-import bleach
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+# markdown and bleach (post writes), Pillow (image jobs), brotli (asset
+# builds), smtplib (mail), urllib.request (asset downloads), multiprocessing
+# (export) and the Postgres dialect are imported where they are used, so
+# starting a process does not pay for them. Pillow and brotli are optional:
+# without Pillow uploads are served as stored, without brotli assets-build
+# only writes .gz files.
+
+@lru_cache(maxsize=None)
+def module_available(name):
+    """Whether the optional module ``name`` is installed, found without importing it."""
+    return importlib.util.find_spec(name) is not None
 
 # Load environment variables from a local .env file if present (not committed)
 load_dotenv()
@@ -24,14 +79,202 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blog.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///blog.db').replace(
+    'postgres://', 'postgresql://', 1)  # some hosts still hand out the old scheme
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
+
+# Connection pool for server databases (Postgres/MySQL); SQLite is tuned with pragmas below
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+# Pragmas applied to every new SQLite connection. WAL lets readers run while a
+# writer commits; busy_timeout makes writers wait for the lock instead of failing.
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)),  # negative means KiB
+    'temp_store': 'MEMORY',
+}
+app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY', 80))
+
+# Background job queue (run `flask --app app worker`, or start worker threads inside each web process)
+app.config['JOB_WORKER_THREADS'] = int(os.environ.get('JOB_WORKER_THREADS', 0))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+app.config['JOB_RETRY_BASE_SECONDS'] = int(os.environ.get('JOB_RETRY_BASE_SECONDS', 10))
+app.config['JOB_RETRY_MAX_SECONDS'] = int(os.environ.get('JOB_RETRY_MAX_SECONDS', 3600))
+app.config['JOB_LOCK_TIMEOUT'] = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))  # requeue jobs of crashed workers
+app.config['JOB_RETENTION_DAYS'] = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+# Outgoing mail for contact replies (without MAIL_SERVER replies are only logged)
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
+app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@localhost')
+
+# Rendered page cache for anonymous visitors (PAGE_CACHE_DIR enables the shared file
+# backend, which keeps up to PAGE_CACHE_DIR_MAX_ENTRIES files for all workers; the
+# directory must belong to the app's user with no group or other access, and
+# "auto" picks one, see default_page_cache_dir()), and the age in seconds past which an entry is re-rendered even if
+# nothing invalidated it (0 keeps entries until they are invalidated)
+app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 256))
+app.config['PAGE_CACHE_MAX_AGE'] = int(os.environ.get('PAGE_CACHE_MAX_AGE', 300))
+app.config['PAGE_CACHE_DIR'] = os.environ.get('PAGE_CACHE_DIR')
+app.config['PAGE_CACHE_DIR_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_DIR_MAX_ENTRIES', 2000))
+
+# Template fragments wrapped in {% cache %}, kept per process for every
+# visitor including logged-in ones (a TTL of 0 turns the cache off)
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+
+# HTTP caching of public pages by browsers, CDNs and reverse proxies
+app.config['HTTP_CACHE_MAX_AGE'] = int(os.environ.get('HTTP_CACHE_MAX_AGE', 60))
+app.config['HTTP_CACHE_S_MAXAGE'] = int(os.environ.get('HTTP_CACHE_S_MAXAGE', 300))
+app.config['HTTP_CACHE_STALE_WHILE_REVALIDATE'] = int(os.environ.get('HTTP_CACHE_STALE_WHILE_REVALIDATE', 600))
+
+# Tags: most tags per post and how many related posts a post page lists
+app.config['MAX_TAGS_PER_POST'] = int(os.environ.get('MAX_TAGS_PER_POST', 10))
+app.config['RELATED_POSTS'] = int(os.environ.get('RELATED_POSTS', 4))
+
+# Feeds and sitemap: items per feed, post URLs per sitemap file and the public
+# base URL for their absolute links (defaults to the requested host)
+app.config['FEED_ITEMS'] = int(os.environ.get('FEED_ITEMS', 20))
+app.config['SITEMAP_CHUNK_SIZE'] = int(os.environ.get('SITEMAP_CHUNK_SIZE', 50000))
+app.config['SITE_URL'] = os.environ.get('SITE_URL')
+
+# Keyset pagination page sizes and how long approximate totals are reused
+app.config['POSTS_PER_PAGE'] = int(os.environ.get('POSTS_PER_PAGE', 6))
+app.config['ADMIN_ROWS_PER_PAGE'] = int(os.environ.get('ADMIN_ROWS_PER_PAGE', 25))
+app.config['SEARCH_RESULTS_PER_PAGE'] = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 10))
+# Rank only the newest N matches of a search query (0 ranks every match); older
+# matches are left out of the results, which say so
+app.config['SEARCH_RANK_WINDOW'] = int(os.environ.get('SEARCH_RANK_WINDOW', 2000))
+app.config['APPROX_COUNT_TTL'] = int(os.environ.get('APPROX_COUNT_TTL', 60))
+
+# Fail requests that issue more SQL queries than their view allows (enable in tests/CI)
+app.config['QUERY_BUDGET_ENFORCED'] = os.environ.get('QUERY_BUDGET_ENFORCED', 'false').lower() == 'true'
+
+# Request metrics: slow request log threshold (0 disables), Server-Timing header and /metrics scrape token
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+app.config['SERVER_TIMING_ENABLED'] = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Reverse proxies in front of the app (Railway and Vercel each add one). Their
+# X-Forwarded-For and X-Forwarded-Proto entries give the client address the
+# rate limits key on and the scheme of external URLs. Set 0 when clients
+# connect to gunicorn directly, or they could pick their own address.
+app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))
+if app.config['TRUSTED_PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'],
+                            x_proto=app.config['TRUSTED_PROXY_HOPS'])
+
+# Authentication: user cache lifetime (0 disables), werkzeug hash method and login token buckets
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['LOGIN_THROTTLE_ENABLED'] = os.environ.get('LOGIN_THROTTLE_ENABLED', 'true').lower() == 'true'
+app.config['LOGIN_IP_BURST'] = int(os.environ.get('LOGIN_IP_BURST', 20))
+app.config['LOGIN_IP_PER_MINUTE'] = int(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+app.config['LOGIN_USER_BURST'] = int(os.environ.get('LOGIN_USER_BURST', 5))
+app.config['LOGIN_USER_PER_MINUTE'] = int(os.environ.get('LOGIN_USER_PER_MINUTE', 2))
+
+# Contact form: token buckets per client IP and per sender email, how long an
+# identical message is dropped as a duplicate (0 disables) and the write-behind
+# buffer (0 inserts every submission in its own transaction)
+app.config['CONTACT_THROTTLE_ENABLED'] = os.environ.get('CONTACT_THROTTLE_ENABLED', 'true').lower() == 'true'
+app.config['CONTACT_IP_BURST'] = int(os.environ.get('CONTACT_IP_BURST', 5))
+app.config['CONTACT_IP_PER_MINUTE'] = int(os.environ.get('CONTACT_IP_PER_MINUTE', 2))
+app.config['CONTACT_EMAIL_BURST'] = int(os.environ.get('CONTACT_EMAIL_BURST', 3))
+app.config['CONTACT_EMAIL_PER_MINUTE'] = int(os.environ.get('CONTACT_EMAIL_PER_MINUTE', 1))
+app.config['CONTACT_DEDUP_SECONDS'] = int(os.environ.get('CONTACT_DEDUP_SECONDS', 3600))
+app.config['CONTACT_BUFFER_SIZE'] = int(os.environ.get('CONTACT_BUFFER_SIZE', 0))
+app.config['CONTACT_BUFFER_SECONDS'] = float(os.environ.get('CONTACT_BUFFER_SECONDS', 2.0))
+
+# Rows deleted or updated per statement by account deletion and bulk admin
+# actions; every batch is committed on its own
+app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 500))
+
+# Startup: check the schema on the first request of each process and bootstrap
+# it if migrations are missing (turn off when deploys run `flask db-upgrade`),
+# and keep compiled templates as bytecode in JINJA_CACHE_DIR (default: a
+# private directory under the system temp dir) so new processes skip compiling
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', 'true').lower() == 'true'
+app.config['JINJA_BYTECODE_CACHE'] = os.environ.get('JINJA_BYTECODE_CACHE', 'true').lower() == 'true'
+app.config['JINJA_CACHE_DIR'] = os.environ.get('JINJA_CACHE_DIR')
+if app.config['JINJA_BYTECODE_CACHE']:
+    if app.config['JINJA_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_CACHE_DIR'], exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR'])}
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Database connection tuning
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+class PoolStats:
+    """Process-wide counters fed by SQLAlchemy pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.invalidated = 0
+
+    def on_connect(self, *args):
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, *args):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def on_invalidate(self, *args):
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'invalidated': self.invalidated,
+            }
+
+pool_stats = PoolStats()
+event.listen(Pool, 'connect', pool_stats.on_connect)
+event.listen(Pool, 'checkout', pool_stats.on_checkout)
+event.listen(Pool, 'checkin', pool_stats.on_checkin)
+event.listen(Pool, 'invalidate', pool_stats.on_invalidate)
+
 # Initialize extensions
 db = SQLAlchemy(app)
 login_manager = LoginManager()
@@ -43,18 +286,26 @@ login_manager.login_view = 'login'
 def utility_processor():
     return {
         'format_local_time': format_local_time,
-        'get_local_time': get_local_time
+        'get_local_time': get_local_time,
+        'static_url': static_url,
+        'asset_urls': asset_urls,
+        'image_version': image_version
     }
 
 # Utility functions
+# IST is UTC+5:30
+LOCAL_TIMEZONE = timezone(timedelta(hours=5, minutes=30))
+
+# Pages format the same timestamps on every request (a dashboard page has two
+# per row); datetimes are immutable, so the results are memoized per process
+@lru_cache(maxsize=4096)
 def get_local_time(utc_time):
     """Convert UTC time to local timezone (IST for India)."""
     if utc_time is None:
         return None
-    # IST is UTC+5:30
-    ist_offset = timedelta(hours=5, minutes=30)
-    return utc_time.replace(tzinfo=timezone.utc).astimezone(timezone(ist_offset))
+    return utc_time.replace(tzinfo=timezone.utc).astimezone(LOCAL_TIMEZONE)
 
+@lru_cache(maxsize=4096)
 def format_local_time(utc_time):
     """Format UTC time to local timezone string."""
     local_time = get_local_time(utc_time)
@@ -62,156 +313,2983 @@ def format_local_time(utc_time):
         return local_time.strftime('%B %d, %Y at %I:%M %p')
     return utc_time.strftime('%B %d, %Y at %I:%M %p') if utc_time else ''
 
-# Database Models
-class User(UserMixin, db.Model):
-    """User model for authentication and user management."""
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    first_name = db.Column(db.String(50), nullable=False)
-    last_name = db.Column(db.String(50), nullable=False)
-    bio = db.Column(db.Text)
-    profile_picture = db.Column(db.String(200))
-    is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    posts = db.relationship('Post', backref='author', lazy=True)
+# Database Models
+class User(UserMixin, db.Model):
+    """User model for authentication and user management."""
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    bio = db.Column(db.Text)
+    profile_picture = db.Column(db.String(200))
+    is_admin = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # fragment cache keys
+    posts = db.relationship('Post', backref='author', lazy=True)
+
+    def set_password(self, password):
+        """Hash and set user password."""
+        self.password_hash = generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+
+    def check_password(self, password):
+        """Verify user password."""
+        return check_password_hash(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash was made with other settings than PASSWORD_HASH_METHOD."""
+        return self.password_hash.split('$', 1)[0] != password_hash_settings(app.config['PASSWORD_HASH_METHOD'])
+
+    def __repr__(self):
+        return f'<User {self.username}>'
+
+class Post(db.Model):
+    """Blog post model for content management."""
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    excerpt = db.Column(db.Text)
+    featured_image = db.Column(db.String(200))
+    slug = db.Column(db.String(200), unique=True, nullable=False)
+    status = db.Column(db.String(20), default='draft')  # draft, published, archived
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tags = db.relationship('Tag', secondary='post_tags', backref='posts')
+
+    # Render cache filled on save by render_post_content()
+    content_format = db.Column(db.String(20), default='html')  # html, markdown
+    rendered_html = db.Column(db.Text)
+    render_version = db.Column(db.String(40))
+    word_count = db.Column(db.Integer, default=0)
+    reading_time = db.Column(db.Integer, default=1)  # minutes
+    auto_excerpt = db.Column(db.Text)
+    toc = db.Column(db.Text)  # JSON list of {level, id, title}
+
+    @property
+    def table_of_contents(self):
+        """Headings of the rendered post as a list of dicts."""
+        return json.loads(self.toc) if self.toc else []
+
+    def __repr__(self):
+        return f'<Post {self.title}>'
+
+class Tag(db.Model):
+    """Tag model for categorizing blog posts."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    description = db.Column(db.Text)
+    post_count = db.Column(db.Integer, nullable=False, default=0)  # published posts, see adjust_tag_counts()
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+# Association table for many-to-many relationship between posts and tags
+post_tags = db.Table('post_tags',
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+)
+
+class Contact(db.Model):
+    """Contact form submission model."""
+    id = db.Column(db.Integer, primary_key=True)
+    first_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_read = db.Column(db.Boolean, default=False)
+    content_hash = db.Column(db.String(64))  # see contact_hash()
+    reply_count = db.Column(db.Integer, nullable=False, default=0)  # see add_contact_reply()
+    last_reply_at = db.Column(db.DateTime)
+    replies = db.relationship('Reply', backref='contact', lazy=True, cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<Contact {self.first_name} {self.last_name}>'
+
+class Reply(db.Model):
+    """Admin reply to contact messages."""
+    id = db.Column(db.Integer, primary_key=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=False)
+    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)  # set by the send_reply_email job
+    admin = db.relationship('User', backref='replies')
+
+    def __repr__(self):
+        return f'<Reply {self.id} to Contact {self.contact_id}>'
+
+class Job(db.Model):
+    """Background job stored in the database and run by the worker (see JOB_HANDLERS)."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    idempotency_key = db.Column(db.String(200), unique=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class Tally(db.Model):
+    """Named running total kept in step with the rows it counts (see adjust_tally())."""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    """Record of an applied schema migration (see MIGRATIONS)."""
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Secondary indexes matching the hot list queries, all ordered like keyset_paginate()
+db.Index('ix_post_published_recent', Post.created_at.desc(), Post.id.desc(),
+         sqlite_where=db.text("status = 'published'"), postgresql_where=db.text("status = 'published'"))
+db.Index('ix_post_user_recent', Post.user_id, Post.created_at, Post.id)
+db.Index('ix_post_recent', Post.created_at, Post.id)
+db.Index('ix_post_tags_tag_id', post_tags.c.tag_id)
+db.Index('ix_contact_email_recent', Contact.email, Contact.created_at, Contact.id)
+db.Index('ix_contact_recent', Contact.created_at, Contact.id)
+db.Index('ix_contact_content_hash', Contact.content_hash, Contact.created_at)
+db.Index('ix_reply_contact_id', Reply.contact_id, Reply.created_at)
+db.Index('ix_reply_admin_id', Reply.admin_id)
+db.Index('ix_user_recent', User.created_at, User.id)
+db.Index('ix_job_due', Job.status, Job.run_at, Job.id)
+db.Index('ix_job_status_recent', Job.status, Job.created_at, Job.id)
+db.Index('ix_job_recent', Job.created_at, Job.id)
+
+# Per-request SQL accounting
+def query_budget(max_queries):
+    """Declare the maximum number of SQL queries a view may issue per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+@app.after_request
+def enforce_query_budget(response):
+    """Turn the response of a view that went over its query budget into a plain 500.
+
+    The violation is logged and counted in blog_query_budget_violations_total.
+    The 500 is not rendered from a template, which would run more queries in
+    the request that already failed.
+    """
+    if not app.config['QUERY_BUDGET_ENFORCED']:
+        return response
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    count = g.get('query_count', 0)
+    if budget is None or count <= budget:
+        return response
+    message = f'{request.endpoint} issued {count} queries, budget is {budget} ({request.full_path.rstrip("?")})'
+    app.logger.error('Query budget exceeded: %s', message)
+    query_budget_violations.inc(endpoint=request.endpoint)
+    response.close()
+    return app.response_class(f'Query budget exceeded: {message}\n', status=500, mimetype='text/plain')
+
+# Request instrumentation
+# Process-local metrics in the Prometheus text format. Under gunicorn every
+# worker process keeps its own numbers; scrape each worker or sum them.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SLOW_REQUEST_MAX_STATEMENTS = 50
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, key)), value
+
+class Histogram(Counter):
+    """Cumulative-bucket histogram keyed by label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', {**labels, 'le': format_value(bound)}, bucket_count
+            yield f'{self.name}_bucket', {**labels, 'le': '+Inf'}, count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+class Gauge:
+    """Value read from a callback at scrape time; it may return a number or {label pairs: value}.
+
+    ``kind='counter'`` exposes a running total kept elsewhere (e.g. PageCache.hits).
+    """
+
+    def __init__(self, name, documentation, read, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        value = self.read()
+        if isinstance(value, dict):
+            for labels, item in sorted(value.items()):
+                yield self.name, dict(labels), item
+        else:
+            yield self.name, {}, value
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+http_requests = metrics.register(Counter(
+    'blog_http_requests_total', 'HTTP requests by endpoint, method and status.', ('endpoint', 'method', 'status')))
+http_latency = metrics.register(Histogram(
+    'blog_http_request_duration_seconds', 'Time spent handling a request.', ('endpoint',)))
+http_response_size = metrics.register(Histogram(
+    'blog_http_response_size_bytes', 'Size of response bodies.', ('endpoint',), SIZE_BUCKETS))
+db_queries = metrics.register(Histogram(
+    'blog_db_queries_per_request', 'SQL statements executed per request.', ('endpoint',), QUERY_COUNT_BUCKETS))
+db_time = metrics.register(Histogram(
+    'blog_db_time_per_request_seconds', 'Time spent executing SQL per request.', ('endpoint',)))
+template_time = metrics.register(Histogram(
+    'blog_template_render_seconds', 'Jinja template render time.', ('template',)))
+metrics.register(Gauge(
+    'blog_page_cache_lookups_total', 'Page cache lookups by result.',
+    lambda: {(('result', 'hit'),): page_cache.hits, (('result', 'miss'),): page_cache.misses}, kind='counter'))
+login_attempts = metrics.register(Counter(
+    'blog_login_attempts_total', 'Login form submissions by result.', ('result',)))
+query_budget_violations = metrics.register(Counter(
+    'blog_query_budget_violations_total', 'Requests over their view query budget (QUERY_BUDGET_ENFORCED).',
+    ('endpoint',)))
+contact_submissions = metrics.register(Counter(
+    'blog_contact_submissions_total', 'Contact form submissions by result.', ('result',)))
+metrics.register(Gauge(
+    'blog_contact_buffer_pending', 'Accepted contact submissions waiting in the write-behind buffer.',
+    lambda: contact_buffer.pending()))
+metrics.register(Gauge(
+    'blog_user_cache_lookups_total', 'User cache lookups by result.',
+    lambda: {(('result', 'hit'),): user_cache.hits, (('result', 'miss'),): user_cache.misses}, kind='counter'))
+metrics.register(Gauge(
+    'blog_fragment_cache_lookups_total', 'Template fragment cache lookups by result.',
+    lambda: {(('result', 'hit'),): fragment_cache.hits, (('result', 'miss'),): fragment_cache.misses}, kind='counter'))
+metrics.register(Gauge(
+    'blog_db_connections_checked_out', 'Database connections currently in use.',
+    lambda: pool_stats.snapshot()['checked_out']))
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_request_queries(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_request_queries(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not has_request_context() or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    g.sql_time = g.get('sql_time', 0.0) + elapsed
+    statements = g.setdefault('sql_statements', [])
+    if app.config['SLOW_REQUEST_MS'] > 0 and len(statements) < SLOW_REQUEST_MAX_STATEMENTS:
+        statements.append((elapsed, ' '.join(statement.split())))
+
+@event.listens_for(Engine, 'handle_error')
+def discard_failed_query_timer(exception_context):
+    # A statement that raises never reaches after_cursor_execute; drop its start
+    # time so later statements on this pooled connection pop their own
+    connection = exception_context.connection
+    if connection is None or exception_context.execution_context is None or not has_request_context():
+        return
+    started = connection.info.get('query_started')
+    if started:
+        started.pop()
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template_time(sender, template, context, **extra):
+    started = g.get('template_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    g.template_time = g.get('template_time', 0.0) + elapsed
+    template_time.observe(elapsed, template=template.name or 'string')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    queries = g.get('query_count', 0)
+    sql_time = g.get('sql_time', 0.0)
+    http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    http_latency.observe(elapsed, endpoint=endpoint)
+    db_queries.observe(queries, endpoint=endpoint)
+    db_time.observe(sql_time, endpoint=endpoint)
+    # Only bodies already in memory: measuring a streamed body would buffer all of it
+    if response.is_sequence:
+        http_response_size.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+
+    if app.config['SERVER_TIMING_ENABLED']:
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, db;dur={sql_time * 1000:.1f};desc="{queries} queries", '
+            f'tpl;dur={g.get("template_time", 0.0) * 1000:.1f}')
+
+    if 0 < app.config['SLOW_REQUEST_MS'] <= elapsed * 1000:
+        statements = '\n'.join(f'  {duration * 1000:8.1f} ms  {sql}' for duration, sql in g.get('sql_statements', []))
+        app.logger.warning('Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms\n%s',
+                           request.method, request.full_path.rstrip('?'), endpoint, elapsed * 1000, queries, sql_time * 1000,
+                           g.get('template_time', 0.0) * 1000, statements)
+    return response
+
+# Authentication
+# Flask-Login loads the user on every authenticated request. Its column values
+# are cached per process for USER_CACHE_TTL seconds and turned back into a
+# session-bound User without a query. Commits that update or delete a user drop
+# its entry here; other processes pick the change up when their copy expires.
+USER_CACHE_MAX_ENTRIES = 10000
+RATE_LIMIT_MAX_KEYS = 10000
+
+class UserCache:
+    """Process-local TTL cache of user column values keyed by id."""
+
+    def __init__(self, ttl, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            generation = self._generation
+        values = load(user_id)
+        with self._lock:
+            # Skip storing if the user changed while it was being loaded
+            if values is not None and self.ttl > 0 and generation == self._generation:
+                self._entries[user_id] = (now, values)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return values
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+user_cache = UserCache(app.config['USER_CACHE_TTL'])
+
+def user_row(user_id):
+    row = db.session.execute(db.select(*User.__table__.columns).where(User.id == user_id)).mappings().first()
+    return dict(row) if row is not None else None
+
+@login_manager.user_loader
+def load_user(user_id):
+    """Load user for Flask-Login, from the user cache when possible."""
+    values = user_cache.get(int(user_id), user_row)
+    if values is None:
+        return None
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def remember_changed_user(mapper, connection, target):
+    object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_users(session):
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        user_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_users', None)
+
+_password_hash_settings = {}
+
+def password_hash_settings(method):
+    """The settings prefix werkzeug writes for ``method``, e.g. ``scrypt:32768:8:1``."""
+    if method not in _password_hash_settings:
+        _password_hash_settings[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _password_hash_settings[method]
+
+class RateLimiter:
+    """Token buckets for rate-limited actions such as logins and contact form posts.
+
+    Each bucket holds up to ``burst`` tokens and refills ``per_minute`` tokens
+    a minute. Buckets are process-local and the least recently used ones are
+    dropped beyond ``max_keys``; a dropped bucket simply starts full again.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, *limits):
+        """Take a token from every ``(key, burst, per_minute)`` bucket.
+
+        Returns 0 on success, otherwise the seconds until all of them have a
+        token again; no bucket is charged for a rejected attempt.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, burst, per_minute in limits:
+                tokens, updated = self._buckets.get(key, (burst, now))
+                levels.append((key, min(burst, tokens + (now - updated) * per_minute / 60), per_minute))
+            wait = max(((1 - tokens) * 60 / max(per_minute, 1) for _, tokens, per_minute in levels if tokens < 1),
+                       default=0)
+            if wait:
+                return wait
+            for key, tokens, _ in levels:
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0
+
+login_throttle = RateLimiter()
+
+def throttle_login(username):
+    """Charge a login attempt to the client IP and the username; returns seconds to wait or 0.
+
+    Behind a proxy the client IP is only the real one with TRUSTED_PROXY_HOPS
+    set; otherwise every visitor shares the proxy's address and bucket.
+    """
+    if not app.config['LOGIN_THROTTLE_ENABLED']:
+        return 0
+    return login_throttle.acquire(
+        (f'ip:{request.remote_addr}', app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE']),
+        (f'user:{(username or "").strip().lower()[:80]}', app.config['LOGIN_USER_BURST'],
+         app.config['LOGIN_USER_PER_MINUTE']))
+
+# Utility functions
+def allowed_file(filename):
+    """Check if uploaded file is allowed."""
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+
+def create_slug(title):
+    """Create URL-friendly slug from title."""
+    slug = re.sub(r'[^\w\s-]', '', title.lower())
+    slug = re.sub(r'[-\s]+', '-', slug)
+    return slug
+
+# Background jobs
+# Slow side effects (mail, image resizing, file cleanup) are stored as Job rows
+# in the same transaction as the change that causes them, so a job exists if
+# and only if that change committed. Workers claim due jobs one at a time,
+# retry failures with exponential backoff and give up after max_attempts.
+JOB_HANDLERS = {}
+
+def job_handler(kind, max_attempts=5):
+    """Register the function run for jobs of ``kind``; it receives the payload as keyword arguments."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = (func, max_attempts)
+        return func
+    return decorator
+
+def insert_ignoring_conflicts(model, index_elements):
+    """INSERT into ``model`` that skips rows clashing on the unique ``index_elements``, or None if unsupported."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(model).on_conflict_do_nothing(index_elements=index_elements)
+
+def enqueue(kind, payload=None, key=None, delay=0):
+    """Add a job to the current transaction; it becomes visible to workers on commit.
+
+    With an idempotency ``key`` an existing job with the same key is returned
+    instead of adding a duplicate. The row is inserted with ON CONFLICT DO
+    NOTHING, so two requests enqueueing the same key at once get one job.
+    """
+    job = Job(kind=kind, payload=json.dumps(payload or {}), idempotency_key=key,
+              max_attempts=JOB_HANDLERS[kind][1], run_at=datetime.utcnow() + timedelta(seconds=delay))
+    insert = insert_ignoring_conflicts(Job, ['idempotency_key']) if key is not None else None
+    if insert is not None:
+        db.session.execute(insert.values(kind=job.kind, payload=job.payload, idempotency_key=key,
+                                         max_attempts=job.max_attempts, run_at=job.run_at))
+        job = Job.query.filter_by(idempotency_key=key).one()
+    else:
+        if key is not None:
+            existing = Job.query.filter_by(idempotency_key=key).first()
+            if existing is not None:
+                return existing
+        db.session.add(job)
+    job_workers.start()
+    return job
+
+def retry_delay(attempts):
+    """Seconds before retry number ``attempts``: exponential with +/-25% jitter."""
+    delay = min(app.config['JOB_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1), app.config['JOB_RETRY_MAX_SECONDS'])
+    return delay * random.uniform(0.75, 1.25)
+
+def claim_job(worker_name):
+    """Atomically mark the next due job as running and return it, or None."""
+    now = datetime.utcnow()
+    due = (db.select(Job.id).where(Job.status == 'queued', Job.run_at <= now)
+           .order_by(Job.run_at, Job.id).limit(1).with_for_update(skip_locked=True).scalar_subquery())
+    job_id = db.session.execute(
+        db.update(Job).where(Job.id == due, Job.status == 'queued')
+        .values(status='running', locked_by=worker_name, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id)
+    ).scalar()
+    db.session.commit()
+    return db.session.get(Job, job_id) if job_id is not None else None
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True on success."""
+    job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+    try:
+        if kind not in JOB_HANDLERS:
+            raise LookupError(f'no handler registered for {kind!r}')
+        JOB_HANDLERS[kind][0](**json.loads(job.payload))
+    except Exception as e:
+        db.session.rollback()
+        finished = attempts >= max_attempts
+        db.session.execute(db.update(Job).where(Job.id == job_id).values(
+            status='failed' if finished else 'queued',
+            run_at=datetime.utcnow() + timedelta(seconds=0 if finished else retry_delay(attempts)),
+            finished_at=datetime.utcnow() if finished else None,
+            locked_by=None, locked_at=None, last_error=f'{type(e).__name__}: {e}'[:2000]))
+        db.session.commit()
+        app.logger.warning('Job %s (%s) attempt %s/%s failed: %s', job_id, kind, attempts, max_attempts, e)
+        return False
+    db.session.execute(db.update(Job).where(Job.id == job_id).values(
+        status='done', finished_at=datetime.utcnow(), locked_by=None, locked_at=None, last_error=None))
+    db.session.commit()
+    return True
+
+def requeue_stale_jobs():
+    """Release jobs whose worker died mid-run (locked longer than JOB_LOCK_TIMEOUT)."""
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['JOB_LOCK_TIMEOUT'])
+    stale = (Job.status == 'running', Job.locked_at < cutoff)
+    db.session.execute(db.update(Job).where(*stale, Job.attempts >= Job.max_attempts).values(
+        status='failed', finished_at=datetime.utcnow(), last_error='worker lock expired'))
+    db.session.execute(db.update(Job).where(*stale).values(status='queued', locked_by=None, locked_at=None))
+    db.session.commit()
+
+def prune_jobs():
+    """Delete finished jobs older than JOB_RETENTION_DAYS (their idempotency keys expire with them)."""
+    cutoff = datetime.utcnow() - timedelta(days=app.config['JOB_RETENTION_DAYS'])
+    db.session.execute(db.delete(Job).where(Job.status == 'done', Job.finished_at < cutoff))
+    db.session.commit()
+
+def work_off(worker_name, max_jobs=None):
+    """Run due jobs until none are left (or ``max_jobs`` ran) and return how many ran."""
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        with app.app_context():
+            job = claim_job(worker_name)
+            if job is None:
+                break
+            run_job(job)
+        ran += 1
+    return ran
+
+def run_worker(worker_name, stop, poll_interval=None):
+    """Worker loop: run due jobs, then sleep until the next poll or until ``stop`` is set."""
+    poll_interval = poll_interval or app.config['JOB_POLL_INTERVAL']
+    last_maintenance = 0
+    while not stop.is_set():
+        try:
+            if time.monotonic() - last_maintenance > 60:
+                with app.app_context():
+                    requeue_stale_jobs()
+                    prune_jobs()
+                last_maintenance = time.monotonic()
+            ran = work_off(worker_name)
+        except Exception:
+            app.logger.exception('Job worker %s crashed; retrying', worker_name)
+            ran = 0
+        if not ran:
+            stop.wait(poll_interval)
+
+class EmbeddedWorkers:
+    """Optional worker threads inside a web process (JOB_WORKER_THREADS > 0).
+
+    Started on the first enqueue so forking servers do not inherit threads;
+    meant for single-process deployments and development.
+    """
+
+    def __init__(self, threads):
+        self.threads = threads
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def start(self):
+        if not self.threads or self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for n in range(self.threads):
+                name = f'{socket.gethostname()}:{os.getpid()}:web-{n}'
+                threading.Thread(target=run_worker, args=(name, self.stop), name=f'job-worker-{n}',
+                                 daemon=True).start()
+
+job_workers = EmbeddedWorkers(app.config['JOB_WORKER_THREADS'])
+
+def send_mail(to, subject, body):
+    """Send a plain text email through MAIL_SERVER, or just log it when no server is configured."""
+    if not app.config['MAIL_SERVER']:
+        app.logger.info('MAIL_SERVER not set; not sending "%s" to %s', subject, to)
+        return
+    import smtplib
+    message = EmailMessage()
+    message['From'] = app.config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    message.set_content(body)
+    with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT'], timeout=30) as smtp:
+        if app.config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if app.config['MAIL_USERNAME']:
+            smtp.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+        smtp.send_message(message)
+
+# Image uploads
+# Uploads are stored under the SHA-256 of their bytes, so identical files are
+# kept once and every stored name is immutable. Resized WebP variants plus a
+# JPEG/PNG fallback are written next to the original by the process_image
+# job, together with a small JSON manifest the templates read to build srcset.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_VARIANTS = (('thumb', 320), ('card', 640), ('full', 1600))  # name, max width
+HASHED_UPLOAD_RE = re.compile(r'^[0-9a-f]{32}(-[a-z]+)?\.(jpg|png|gif|webp|json)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def store_upload(file):
+    """Copy an uploaded file to UPLOAD_FOLDER in chunks and return its content-hash name."""
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    extension = 'jpg' if extension == 'jpeg' else extension
+    folder = app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f'{digest.hexdigest()[:32]}.{extension}'
+        if os.path.exists(os.path.join(folder, filename)):
+            os.remove(tmp_path)  # same bytes already stored
+        else:
+            os.replace(tmp_path, os.path.join(folder, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename
+
+def image_stem(filename):
+    return filename.rsplit('.', 1)[0]
+
+def save_image_atomic(image, path, image_format):
+    """Encode ``image`` next to ``path`` and move it into place, without metadata."""
+    quality = app.config['IMAGE_QUALITY']
+    options = {
+        'webp': {'format': 'WEBP', 'quality': quality, 'method': 4},
+        'jpg': {'format': 'JPEG', 'quality': quality, 'optimize': True, 'progressive': True},
+        'png': {'format': 'PNG', 'optimize': True},
+    }[image_format]
+    tmp_path = f'{path}.{uuid.uuid4().hex}.part'
+    image.save(tmp_path, **options)
+    os.replace(tmp_path, path)
+
+def generate_image_variants(filename):
+    """Write the resized variants of an upload and return its manifest.
+
+    EXIF orientation is applied and then all metadata (EXIF, GPS, ICC,
+    comments) is dropped. Images are never upscaled: variants wider than the
+    original are skipped. Safe to run twice; an existing manifest is returned.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    stem = image_stem(filename)
+    manifest_path = os.path.join(folder, f'{stem}.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    from PIL import Image, ImageOps
+    with Image.open(os.path.join(folder, filename)) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = source.mode in ('RGBA', 'LA', 'PA') or 'transparency' in source.info
+        image = source.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}
+    fallback = 'png' if has_alpha else 'jpg'
+
+    variants = {}
+    for name, max_width in IMAGE_VARIANTS:
+        width = min(max_width, image.width)
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for image_format in ('webp', fallback):
+            save_image_atomic(resized, os.path.join(folder, f'{stem}-{name}.{image_format}'), image_format)
+        variants[name] = [width, height]
+        if width == image.width:
+            break
+
+    manifest = {'width': image.width, 'height': image.height, 'fallback': fallback, 'variants': variants}
+    tmp_path = f'{manifest_path}.{uuid.uuid4().hex}.part'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+class ResponsiveImage:
+    """URLs of an upload and, once processed, of its variants for srcset."""
+
+    def __init__(self, filename, manifest=None):
+        self.filename = filename
+        self.manifest = manifest
+
+    @property
+    def has_variants(self):
+        return self.manifest is not None
+
+    @property
+    def fallback(self):
+        return self.manifest['fallback']
+
+    @property
+    def original_url(self):
+        return url_for('media', filename=self.filename)
+
+    def _variants(self, largest):
+        names = [name for name, _ in IMAGE_VARIANTS]
+        allowed = names[:names.index(largest) + 1]
+        return [(name, size) for name, size in self.manifest['variants'].items() if name in allowed]
+
+    def url(self, largest='full', image_format=None):
+        name, _ = self._variants(largest)[-1]
+        return url_for('media', filename=f'{image_stem(self.filename)}-{name}.{image_format or self.fallback}')
+
+    def srcset(self, image_format, largest='full'):
+        return ', '.join(
+            f"{url_for('media', filename=f'{image_stem(self.filename)}-{name}.{image_format}')} {size[0]}w"
+            for name, size in self._variants(largest))
+
+    def size(self, largest='full'):
+        return self._variants(largest)[-1][1]
+
+_image_manifests = {}
+
+def image_version(filename):
+    """ETag part that changes once an upload's variants are ready."""
+    return '+srcset' if filename and image_variants(filename).has_variants else ''
+
+@app.template_global()
+def image_variants(filename):
+    """ResponsiveImage for a stored upload; processed manifests are memoized per process."""
+    manifest = _image_manifests.get(filename)
+    if manifest is None and HASHED_UPLOAD_RE.match(filename):
+        manifest_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{image_stem(filename)}.json')
+        try:
+            with open(manifest_path) as f:
+                manifest = _image_manifests[filename] = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+    return ResponsiveImage(filename, manifest)
+
+def delete_unused_images(filenames):
+    """Remove uploads (and their variants) that no post references any more."""
+    filenames = {name for name in filenames if name}
+    if not filenames:
+        return
+    in_use = {name for (name,) in db.session.query(Post.featured_image).filter(Post.featured_image.in_(filenames))}
+    folder = app.config['UPLOAD_FOLDER']
+    for filename in filenames - in_use:
+        stem = image_stem(filename)
+        paths = [filename]
+        if HASHED_UPLOAD_RE.match(filename):
+            paths.append(f'{stem}.json')
+            paths.extend(f'{stem}-{name}.{ext}' for name, _ in IMAGE_VARIANTS for ext in ('webp', 'jpg', 'png'))
+        for path in paths:
+            try:
+                os.remove(os.path.join(folder, path))
+            except OSError:
+                pass
+        _image_manifests.pop(filename, None)
+
+# Job handlers
+@job_handler('process_image')
+def process_image_job(filename, post_id=None):
+    if not module_available('PIL'):
+        return
+    generate_image_variants(filename)
+    if post_id is not None:
+        page_cache.invalidate(f'post:{post_id}')  # cached pages still point at the original
+
+@job_handler('delete_unused_images')
+def delete_unused_images_job(filenames):
+    delete_unused_images(filenames)
+
+@job_handler('send_reply_email', max_attempts=8)
+def send_reply_email_job(reply_id):
+    reply = db.session.get(Reply, reply_id)
+    if reply is None or reply.sent_at is not None:
+        return  # deleted, or already delivered by an earlier attempt
+    contact = reply.contact
+    send_mail(contact.email, f'Re: {contact.subject}', reply.message)
+    reply.sent_at = datetime.utcnow()
+    db.session.commit()
+
+# Static assets
+# `flask assets-build` downloads the third-party CSS, JS and fonts the
+# templates use into assets/vendor/ (commit it for offline builds), joins them
+# with our own files under static/ into the bundles below, minifies them and
+# writes content-hashed copies plus .gz/.br variants to static/dist/. Until a
+# build exists, asset_urls() falls back to the CDN and unbundled source URLs.
+ASSET_VENDOR_DIR = os.path.join(app.root_path, 'assets', 'vendor')
+ASSET_DIST_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MANIFEST = os.path.join(ASSET_DIST_DIR, 'manifest.json')
+VENDOR_ASSETS = {
+    'bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'fontawesome.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+    'inter.css': 'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap',
+    'quill.snow.css': 'https://cdn.quilljs.com/1.3.6/quill.snow.css',
+    'quill.min.js': 'https://cdn.quilljs.com/1.3.6/quill.min.js',
+}
+ASSET_BUNDLES = {
+    'main.css': ('bootstrap.min.css', 'fontawesome.min.css', 'inter.css', 'css/site.css'),
+    'main.js': ('bootstrap.bundle.min.js', 'js/inbox-badge.js', 'js/bulk-select.js'),
+    'editor.css': ('quill.snow.css', 'css/editor.css'),
+    'editor.js': ('quill.min.js', 'js/post-editor.js'),
+    'dashboard.css': ('css/dashboard.css',),
+    'dashboard.js': ('js/dashboard.js',),
+}
+COMPRESSIBLE_ASSETS = ('.css', '.js', '.svg', '.ttf', '.eot')
+# Google Fonts only serves woff2 to browsers it recognises
+VENDOR_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^)\'"]+)\1\s*\)')
+CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.DOTALL)
+SOURCE_MAP_RE = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.MULTILINE)
+
+def load_asset_manifest():
+    try:
+        with open(ASSET_MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+asset_manifest = load_asset_manifest()
+
+def static_url(filename):
+    """URL of a static file, or of its fingerprinted build output when one exists."""
+    built = asset_manifest.get(filename)
+    if built is not None:
+        return url_for('built_asset', filename=built)
+    return url_for('static', filename=filename)
+
+def asset_urls(bundle):
+    """The URLs to load for ``bundle``: the built file, or each source when not built."""
+    if bundle in asset_manifest:
+        return [static_url(bundle)]
+    return [VENDOR_ASSETS.get(source) or url_for('static', filename=source) for source in ASSET_BUNDLES[bundle]]
+
+def fetch_url(url):
+    import urllib.request
+    req = urllib.request.Request(url, headers={'User-Agent': VENDOR_USER_AGENT})
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return response.read()
+
+def fetch_vendor_assets(force=False):
+    """Download missing vendor files; stylesheets have the files they reference saved under fonts/."""
+    fetched = []
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(ASSET_VENDOR_DIR, name)
+        if os.path.exists(path) and not force:
+            continue
+        data = fetch_url(url)
+        if name.endswith('.css'):
+            def localize(match, base=url):
+                target = match.group(2)
+                if target.startswith('data:'):
+                    return match.group(0)
+                source = urllib.parse.urljoin(base, target)
+                local = os.path.basename(urllib.parse.urlsplit(source).path)
+                local_path = os.path.join(ASSET_VENDOR_DIR, 'fonts', local)
+                if force or not os.path.exists(local_path):
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    with open(local_path, 'wb') as f:
+                        f.write(fetch_url(source))
+                return f'url(fonts/{local})'
+            data = CSS_URL_RE.sub(localize, data.decode('utf-8')).encode('utf-8')
+        os.makedirs(ASSET_VENDOR_DIR, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        fetched.append(name)
+    return fetched
+
+def asset_source_path(source):
+    if source in VENDOR_ASSETS:
+        return os.path.join(ASSET_VENDOR_DIR, source)
+    return os.path.join(app.static_folder, source)
+
+def minify_css(text):
+    """Drop comments (except /*! licences) and the whitespace around CSS punctuation."""
+    text = CSS_COMMENT_RE.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return re.sub(r':\s+', ':', text).replace(';}', '}').strip()
+
+def minify_js(text):
+    """Conservative JS minification: indentation, blank lines and whole-line // comments."""
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+def write_asset(relative_path, data, written):
+    """Write ``data`` under a content-hashed name (plus compressed copies) and return that name."""
+    stem, ext = os.path.splitext(relative_path)
+    hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:16]}{ext}'
+    path = os.path.join(ASSET_DIST_DIR, hashed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    variants = [('', data)]
+    if ext in COMPRESSIBLE_ASSETS:
+        variants.append(('.gz', gzip.compress(data, 9, mtime=0)))
+        if module_available('brotli'):
+            import brotli
+            variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, content in variants:
+        if suffix and len(content) >= len(data):
+            continue
+        if not os.path.exists(path + suffix):
+            with open(path + suffix, 'wb') as f:
+                f.write(content)
+        written.add(hashed + suffix)
+    return hashed
+
+def bundle_stylesheet(source, text, manifest, written):
+    """Copy files a stylesheet references into the build and point its url()s at them."""
+    directory = os.path.dirname(asset_source_path(source))
+    def rewrite(match):
+        target = match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        relative = urllib.parse.urlsplit(target).path
+        path = os.path.normpath(os.path.join(directory, relative))
+        with open(path, 'rb') as f:
+            data = f.read()
+        logical = f'fonts/{os.path.basename(path)}'
+        manifest[logical] = write_asset(logical, data, written)
+        return f'url({manifest[logical]})'
+    return CSS_URL_RE.sub(rewrite, text)
+
+def build_assets():
+    """Build every bundle into ASSET_DIST_DIR and return the new manifest."""
+    manifest, written = {}, set()
+    for bundle, sources in ASSET_BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(asset_source_path(source), encoding='utf-8') as f:
+                text = SOURCE_MAP_RE.sub('', f.read())
+            if bundle.endswith('.css'):
+                text = bundle_stylesheet(source, text, manifest, written)
+                parts.append(text if '.min.' in source else minify_css(text))
+            else:
+                parts.append(text if '.min.' in source else minify_js(text))
+        separator = '\n' if bundle.endswith('.css') else ';\n'
+        manifest[bundle] = write_asset(bundle, separator.join(parts).encode('utf-8'), written)
+
+    # Keep the previous build's files so pages cached before this deploy still load
+    keep = written | {name + suffix for name in load_asset_manifest().values() for suffix in ('', '.gz', '.br')}
+    for root, _, files in os.walk(ASSET_DIST_DIR):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), ASSET_DIST_DIR).replace(os.sep, '/')
+            if relative != 'manifest.json' and relative not in keep:
+                os.remove(os.path.join(root, name))
+    fd, tmp_path = tempfile.mkstemp(dir=ASSET_DIST_DIR)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, ASSET_MANIFEST)
+    asset_manifest.clear()
+    asset_manifest.update(manifest)
+    template_version.cache_clear()
+    return manifest
+
+# Sanitizer allow-list; any change here bumps RENDER_VERSION and re-renders stored posts
+ALLOWED_TAGS = ['p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 
+               'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'a', 'img', 'span', 'div']
+ALLOWED_ATTRIBUTES = {
+    'a': ['href'], 
+    'img': ['src', 'alt', 'title'],
+    'span': ['style', 'class'],
+    'div': ['style', 'class'],
+    'p': ['style', 'class'],
+    'h1': ['style', 'class'],
+    'h2': ['style', 'class'],
+    'h3': ['style', 'class'],
+    'h4': ['style', 'class'],
+    'h5': ['style', 'class'],
+    'h6': ['style', 'class']
+}
+
+def sanitize_html(html_content):
+    """Sanitize HTML content for security."""
+    import bleach
+    return bleach.clean(html_content, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+
+# Post rendering
+RENDERER_REVISION = 1  # bump when render_post_content() output changes
+RENDER_VERSION = hashlib.sha1(json.dumps(
+    [RENDERER_REVISION, ALLOWED_TAGS, ALLOWED_ATTRIBUTES], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+CONTENT_FORMATS = ('html', 'markdown')
+WORDS_PER_MINUTE = 200
+AUTO_EXCERPT_LENGTH = 200
+HEADING_RE = re.compile(r'<h([1-4])([^>]*)>(.*?)</h\1>', re.IGNORECASE | re.DOTALL)
+
+def html_to_text(html_content):
+    """Strip all markup and return plain text with collapsed whitespace."""
+    import bleach
+    text = bleach.clean(html_content or '', tags=[], strip=True)
+    return ' '.join(unescape(text).split())
+
+def add_heading_anchors(html_content):
+    """Give h1-h4 headings stable ids and return (html, table_of_contents)."""
+    toc = []
+    seen = set()
+
+    def replace(match):
+        level, attrs, inner = match.group(1), match.group(2), match.group(3)
+        title = html_to_text(inner)
+        if not title:
+            return match.group(0)
+        anchor = base = create_slug(title) or 'section'
+        counter = 2
+        while anchor in seen:
+            anchor = f'{base}-{counter}'
+            counter += 1
+        seen.add(anchor)
+        toc.append({'level': int(level), 'id': anchor, 'title': title})
+        return f'<h{level} id="{anchor}"{attrs}>{inner}</h{level}>'
+
+    return HEADING_RE.sub(replace, html_content), toc
+
+def truncate_text(text, length):
+    """Cut text at a word boundary no longer than ``length`` characters."""
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(' ', 1)[0].rstrip(',.;:') + '...'
+
+def render_post_content(content, content_format='html'):
+    """Convert, sanitize and analyse post content once so views can serve it as-is.
+
+    Returns the values of the cached render columns of ``Post``.
+    """
+    source = content or ''
+    if content_format == 'markdown':
+        import markdown
+        source = markdown.markdown(source, extensions=['fenced_code', 'sane_lists'])
+    rendered_html, toc = add_heading_anchors(sanitize_html(source))
+    text = html_to_text(rendered_html)
+    word_count = len(text.split())
+    return {
+        'rendered_html': rendered_html,
+        'toc': json.dumps(toc),
+        'word_count': word_count,
+        'reading_time': max(1, round(word_count / WORDS_PER_MINUTE)),
+        'auto_excerpt': truncate_text(text, AUTO_EXCERPT_LENGTH),
+        'render_version': RENDER_VERSION,
+    }
+
+def apply_rendered_content(post):
+    """Fill the render cache columns of a post being created or edited."""
+    for field, value in render_post_content(post.content, post.content_format).items():
+        setattr(post, field, value)
+
+def clean_post_content(content, content_format):
+    """Prepare submitted content for storage; Markdown is kept as source."""
+    if content_format == 'markdown':
+        return content
+    return sanitize_html(content)
+
+def ensure_rendered(post):
+    """Lazily re-render a post stored by an older renderer or allow-list.
+
+    Uses a Core UPDATE that keeps updated_at, so re-rendering does not look
+    like an edit to ETags, feeds or exports, and commits without expiring the
+    post, its author and tags so the page still renders within its budget.
+    """
+    if post.render_version == RENDER_VERSION:
+        return False
+    fields = render_post_content(post.content, post.content_format)
+    db.session.execute(db.update(Post).where(Post.id == post.id).values(updated_at=post.updated_at, **fields))
+    commit_keeping_loaded()
+    for field, value in fields.items():
+        set_committed_value(post, field, value)
+    return True
+
+# Page caching
+def private_directory(path):
+    """Create ``path`` for this user only, or check an existing one is; returns whether it is safe.
+
+    Cache files are trusted when read back, so a directory another local user
+    created or can write to must not be used.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            return False
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(path, 0o700)
+            info = os.lstat(path)
+    except OSError:
+        return False
+    return not stat.S_IMODE(info.st_mode) & 0o077
+
+class FileSystemCacheBackend:
+    """Shared page cache backend storing entries and tag versions as files.
+
+    Every worker pointed at the same directory sees the same entries, so an
+    invalidation made by one gunicorn worker is honoured by all of them.
+    The directory holds at most about ``max_entries`` entries: every tenth of
+    that many writes, a prune removes the oldest written ones past the cap.
+    """
+
+    def __init__(self, directory, max_entries=2000):
+        if not private_directory(directory) or not private_directory(os.path.join(directory, 'tags')):
+            raise RuntimeError(f'Page cache directory {directory} must belong to this user and be closed to others')
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _tag_path(self, tag):
+        return os.path.join(self.directory, 'tags', hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        # An entry file is a JSON line of everything but the body, then the body bytes
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                header, _, body = f.read().partition(b'\n')
+            entry = json.loads(header)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get('tags'), dict):
+            return None
+        entry['body'] = body
+        return entry
+
+    def set(self, key, entry):
+        header = json.dumps({name: value for name, value in entry.items() if name != 'body'}, separators=(',', ':'))
+        self._write(self._entry_path(key), header.encode('utf-8') + b'\n' + entry['body'])
+        with self._lock:
+            self._writes += 1
+            due = self._writes >= max(1, self.max_entries // 10)
+            if due:
+                self._writes = 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Remove the oldest written entries past ``max_entries``."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if item.is_file() and not item.name.endswith('.tmp'):
+                    try:
+                        entries.append((item.stat().st_mtime, item.path))
+                    except OSError:
+                        pass  # removed by another worker's prune
+        entries.sort()
+        removed = 0
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += removed
+
+    def expire(self, cutoff):
+        """Remove entries written before the ``cutoff`` timestamp and return how many.
+
+        Temporary files that interrupted writes left behind go as well.
+        """
+        removed = 0
+        with os.scandir(self.directory) as it:
+            for item in it:
+                try:
+                    if item.is_file() and item.stat().st_mtime < cutoff:
+                        os.remove(item.path)
+                        removed += not item.name.endswith('.tmp')
+                except OSError:
+                    pass  # removed by another worker
+        return removed
+
+    def __len__(self):
+        with os.scandir(self.directory) as it:
+            return sum(1 for item in it if item.is_file() and not item.name.endswith('.tmp'))
+
+    def delete(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def get_tag_version(self, tag):
+        try:
+            with open(self._tag_path(tag), 'rb') as f:
+                return f.read().decode('ascii')
+        except OSError:
+            return '0'
+
+    def bump_tag_version(self, tag):
+        self._write(self._tag_path(tag), uuid.uuid4().hex.encode('ascii'))
+
+
+class MemoryCacheBackend:
+    """Process-local page cache backend: an LRU of entries and the tag versions they are checked against.
+
+    Invalidations only reach the process that made them, so this backend is
+    for a single worker process; run several with PAGE_CACHE_DIR set.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._tag_versions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def expire(self, cutoff):
+        """Remove entries stored before the ``cutoff`` timestamp and return how many."""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry['stored_at'] < cutoff]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def get_tag_version(self, tag):
+        with self._lock:
+            return self._tag_versions.get(tag, 0)
+
+    def bump_tag_version(self, tag):
+        with self._lock:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+
+class PageCache:
+    """Size-capped LRU cache of rendered responses with tag-based invalidation.
+
+    Each entry remembers the version of every tag it was rendered with
+    (e.g. ``post:12``, ``author:3``, ``index``). Invalidating a tag bumps its
+    version, which makes every entry carrying that tag stale on its next read.
+    Entries and tag versions are kept in the same backend: process memory by
+    default, or files every worker shares, in front of which each process
+    keeps decoded copies. Entries older than ``max_age`` seconds are stale as
+    well (0 keeps them until invalidated), which bounds how long a page whose
+    invalidation was missed can be served. Stale entries are dropped when
+    read; expire() also removes those nobody reads again, and set() runs it
+    after a tenth of ``max_entries`` stores or ``max_age`` seconds.
+    """
+
+    EPOCH_TAG = '*'
+
+    def __init__(self, max_entries=256, backend=None, max_age=0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.shared = backend is not None
+        self.backend = backend if backend is not None else MemoryCacheBackend(max_entries)
+        self._entries = OrderedDict()  # local copies of shared entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+        self._stores_since_expiry = 0
+        self._expired_at = time.time()
+
+    def _tag_version(self, tag):
+        return self.backend.get_tag_version(tag)
+
+    def _is_fresh(self, entry):
+        if self.max_age and time.time() - entry.get('stored_at', 0) >= self.max_age:
+            return False
+        return all(self._tag_version(tag) == version for tag, version in entry['tags'].items())
+
+    def epoch(self):
+        """Return a token that changes whenever anything is invalidated."""
+        return self._tag_version(self.EPOCH_TAG)
+
+    def version(self, tag):
+        """Return a token that changes whenever ``tag`` is invalidated."""
+        return self._tag_version(tag)
+
+    def bump_version(self, tag):
+        """Change ``version(tag)`` for state kept outside the cache, without touching the epoch."""
+        self.backend.bump_tag_version(tag)
+
+    def get(self, key):
+        """Return a fresh entry for ``key`` or None."""
+        entry = None
+        if self.shared:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+        if entry is not None and not self._is_fresh(entry):
+            # Only this process's copy is known to be stale; another worker may have stored a fresh one
+            with self._lock:
+                self._entries.pop(key, None)
+            entry = None
+        from_backend = entry is None
+        if entry is None:
+            entry = self.backend.get(key)
+
+        if entry is not None and (not from_backend or self._is_fresh(entry)):
+            with self._lock:
+                self.hits += 1
+                if from_backend and self.shared:
+                    self._store_local(key, entry)
+            return entry
+
+        with self._lock:
+            self.misses += 1
+        if entry is not None:
+            self.backend.delete(key)  # the stored entry itself is stale
+        return None
+
+    def set(self, key, body, content_type, tags, epoch=None, headers=None):
+        """Store a rendered body unless an invalidation happened since ``epoch``."""
+        if epoch is not None and epoch != self.epoch():
+            return
+        entry = {
+            'body': body,
+            'content_type': content_type,
+            'headers': headers or {},
+            'tags': {tag: self._tag_version(tag) for tag in tags},
+            'stored_at': time.time(),
+        }
+        with self._lock:
+            if self.shared:
+                self._store_local(key, entry)
+            self.stores += 1
+            self._stores_since_expiry += 1
+            due = self.max_age and (self._stores_since_expiry >= max(1, self.max_entries // 10)
+                                    or entry['stored_at'] - self._expired_at >= self.max_age)
+            if due:
+                self._stores_since_expiry = 0
+                self._expired_at = entry['stored_at']
+        self.backend.set(key, entry)
+        if due:
+            self.expire()
+
+    def expire(self):
+        """Remove the entries stored more than ``max_age`` seconds ago, read or not."""
+        if not self.max_age:
+            return 0
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry['stored_at'] < cutoff]:
+                del self._entries[key]
+        removed = self.backend.expire(cutoff)
+        with self._lock:
+            self.expired += removed
+        return removed
+
+    def _store_local(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def share(self, backend):
+        """Keep entries and tag versions in ``backend`` from now on, dropping local copies."""
+        with self._lock:
+            self.backend = backend
+            self.shared = True
+            self._entries.clear()
+
+    def invalidate(self, *tags):
+        """Mark every entry rendered with any of ``tags`` as stale."""
+        for tag in (*tags, self.EPOCH_TAG):
+            self.backend.bump_tag_version(tag)
+        with self._lock:
+            self.invalidations += len(tags)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries) if self.shared else len(self.backend),
+                'max_entries': self.max_entries,
+                'max_age': self.max_age,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions if self.shared else self.backend.evictions,
+                'expired': self.expired,
+                'invalidations': self.invalidations,
+                'shared_backend': self.shared,
+            }
+
+
+def default_page_cache_dir():
+    """The directory used for PAGE_CACHE_DIR=auto (gunicorn.conf.py's default) and by a job runner without one.
+
+    It only depends on the user and where the app lives, so the Procfile's job
+    runner finds the same one and its invalidations reach the web workers'
+    pages. The first of /dev/shm, the temp directory and ~/.cache where it is
+    private to this user is used: another user may have created the name first.
+    """
+    name = f"blog-page-cache-{os.getuid()}-{hashlib.sha1(app.root_path.encode('utf-8')).hexdigest()[:12]}"
+    bases = ['/dev/shm'] if os.path.isdir('/dev/shm') else []
+    bases += [tempfile.gettempdir(), os.path.join(os.path.expanduser('~'), '.cache')]
+    for base in bases:
+        path = os.path.join(base, name)
+        if private_directory(path):
+            return path
+    return path  # FileSystemCacheBackend refuses it
+
+if app.config['PAGE_CACHE_DIR'] == 'auto':
+    app.config['PAGE_CACHE_DIR'] = default_page_cache_dir()
+
+page_cache = PageCache(
+    max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'],
+    max_age=app.config['PAGE_CACHE_MAX_AGE'],
+    backend=(FileSystemCacheBackend(app.config['PAGE_CACHE_DIR'], app.config['PAGE_CACHE_DIR_MAX_ENTRIES'])
+             if app.config['PAGE_CACHE_DIR'] else None)
+)
+
+def is_public_request():
+    """Only anonymous GET requests without pending flash messages see a shareable page."""
+    return (request.method in ('GET', 'HEAD')
+            and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+def is_page_cacheable():
+    return app.config['PAGE_CACHE_ENABLED'] and is_public_request()
+
+def tag_page(*tags):
+    """Record the invalidation tags of the page currently being rendered."""
+    if 'page_cache_tags' in g:
+        g.page_cache_tags.update(tags)
+
+# Query string arguments the cached views read; any others do not change the page
+PAGE_CACHE_ARGS = ('cursor', 'q')
+
+def page_cache_key():
+    """Cache key of the current anonymous page.
+
+    Only the arguments in PAGE_CACHE_ARGS are part of the key, so made-up
+    query strings share the page's entry instead of adding new ones. Cached
+    pages link with relative URLs, so the key holds SITE_URL rather than the
+    Host header clients send. Deploys that change templates or the renderer
+    start with fresh keys.
+    """
+    args = urllib.parse.urlencode([(name, request.args[name]) for name in PAGE_CACHE_ARGS if name in request.args])
+    return f"page:{template_version()}:{RENDER_VERSION}:{app.config['SITE_URL'] or ''}{request.path}?{args}"
+
+def cache_page(view):
+    """Serve anonymous responses of ``view`` from the page cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_page_cacheable():
+            return view(*args, **kwargs)
+
+        key = page_cache_key()
+        entry = page_cache.get(key)
+        if entry is not None:
+            response = app.response_class(entry['body'], content_type=entry['content_type'],
+                                          headers=entry['headers'])
+            response.headers['X-Cache'] = 'HIT'
+            return response.make_conditional(request)
+
+        epoch = page_cache.epoch()
+        g.page_cache_tags = set()
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+            page_cache.set(key, response.get_data(), response.content_type, g.page_cache_tags, epoch,
+                           headers=headers)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+# Conditional GET
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+@lru_cache(maxsize=None)
+def template_version():
+    """Hash the template sources and asset manifest so ETags change when a deploy changes the markup.
+
+    Computed on the first page that needs it rather than at import, so cold
+    starts do not read every template.
+    """
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(name.encode('utf-8'))
+                digest.update(f.read())
+    digest.update(json.dumps(asset_manifest, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+def page_etag(*parts):
+    """Build a strong ETag from the values that determine a rendered page."""
+    raw = ':'.join(str(part) for part in (template_version(), *parts))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def set_cache_headers(response, etag=None, last_modified=None):
+    """Attach validators and Cache-Control to a page response.
+
+    Anonymous pages may be stored by shared caches and served stale while
+    they revalidate; pages for logged-in users must stay private.
+    """
+    if is_public_request():
+        if etag:
+            response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = (
+            f"public, max-age={app.config['HTTP_CACHE_MAX_AGE']}, "
+            f"s-maxage={app.config['HTTP_CACHE_S_MAXAGE']}, "
+            f"stale-while-revalidate={app.config['HTTP_CACHE_STALE_WHILE_REVALIDATE']}"
+        )
+        response.vary.add('Cookie')
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag, last_modified):
+    """Return a 304 response if the client already holds this version of the page."""
+    if not is_public_request():
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return set_cache_headers(app.response_class(status=304), etag, last_modified)
+
+def post_changed(post_id, listing_changed=False, published=False, tag_ids=()):
+    """Invalidate caches derived from a post after a committed write.
+
+    ``listing_changed`` means the post entered or left the published list,
+    which shifts every index page. ``published`` means the post is or was
+    public, so the feeds and sitemap listing it are rebuilt. ``tag_ids`` are
+    the tags whose published listing gained or lost the post. Search result
+    pages are dropped on any change since any post may start or stop
+    matching a query.
+    """
+    posts_changed([post_id], listing_changed, [post_id] if published else (), tag_ids)
+
+def posts_changed(post_ids, listing_changed=False, published_ids=(), tag_ids=()):
+    """post_changed() for several posts at once; ``published_ids`` are those that are or were public."""
+    tags = [*(f'post:{post_id}' for post_id in post_ids), 'search']
+    if listing_changed:
+        tags.append('index')
+    if tag_ids:
+        tags.extend(['tags', 'related', *(f'tag:{tag_id}' for tag_id in sorted(tag_ids))])
+    page_cache.invalidate(*tags)
+    count_cache.invalidate('post-status')
+    if published_ids:
+        feeds_changed(*published_ids)
+
+# Eager loading and aggregate counts for list pages
+def post_page_query():
+    """Post query loading everything post.html displays."""
+    return Post.query.options(db.joinedload(Post.author), db.selectinload(Post.tags))
+
+def count_by(column, *criteria):
+    """Return {value: row count} for ``column`` using one grouped aggregate query."""
+    query = db.select(column, db.func.count()).where(*criteria).group_by(column)
+    return dict(db.session.execute(query).all())
+
+def compute_user_stats():
+    """Totals shown under the admin users table."""
+    total, admins = db.session.execute(
+        db.select(db.func.count(User.id), db.func.count(User.id).filter(User.is_admin.is_(True)))
+    ).one()
+    with_posts = db.session.execute(db.select(db.func.count(db.distinct(Post.user_id)))).scalar()
+    latest = db.session.execute(
+        db.select(User.username).order_by(User.created_at.desc(), User.id.desc()).limit(1)).scalar()
+    return {'total': total, 'admins': admins, 'with_posts': with_posts, 'latest': latest}
+
+# Keyset pagination
+class KeysetPage:
+    """One page of rows ordered newest first by (created_at, id)."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def pack_cursor(values):
+    """Serialize a list of JSON values into an opaque URL-safe token."""
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def unpack_cursor(token):
+    """Inverse of pack_cursor(); raises ValueError or TypeError on a bad token."""
+    return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+
+def encode_cursor(row, direction):
+    """Build an opaque cursor pointing just past ``row`` in ``direction``."""
+    return pack_cursor([direction, row.created_at.isoformat(), row.id])
+
+def decode_cursor(token):
+    """Return (direction, created_at, id) or None for a missing or malformed cursor."""
+    if not token:
+        return None
+    try:
+        direction, created_at, row_id = unpack_cursor(token)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+def keyset_paginate(query, model, cursor=None, per_page=20, total=None):
+    """Paginate ``query`` newest first without OFFSET or COUNT.
+
+    Seeks directly to the row after (or before) the cursor, so the cost of a
+    page does not depend on how deep it is. One extra row is fetched to know
+    whether another page exists.
+    """
+    key = db.tuple_(model.created_at, model.id)
+    position = decode_cursor(cursor)
+    if position and position[0] == 'prev':
+        query = query.filter(key > position[1:]).order_by(model.created_at.asc(), model.id.asc())
+    else:
+        if position:
+            query = query.filter(key < position[1:])
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if position and position[0] == 'prev':
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = position is not None, has_more
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], 'next') if rows and has_next else None,
+        prev_cursor=encode_cursor(rows[0], 'prev') if rows and has_prev else None,
+        total=total,
+    )
+
+class CountCache:
+    """Cache of expensive aggregate results, recomputed after ``ttl`` seconds.
+
+    Values are kept per process. A key's scope is the part before its first
+    colon (``inbox`` for ``inbox:summary``). Each value remembers the versions
+    of the page cache's ``counts`` tag and of its scope's ``counts:<scope>``
+    tag; invalidate(scope) bumps the latter and invalidate() the former, so
+    with a shared page cache backend an invalidation made by one worker drops
+    the same counts in every worker. Only those tags change, not the page
+    cache's epoch, so pages being rendered at the time are still stored.
+    """
+
+    TAG = 'counts'
+
+    @staticmethod
+    def scope(key):
+        return key.split(':', 1)[0]
+
+    def __init__(self, ttl, versions=None):
+        self.ttl = ttl
+        self.versions = versions
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _version(self, key):
+        if self.versions is None:
+            return None
+        return self.versions.version(self.TAG), self.versions.version(f'{self.TAG}:{self.scope(key)}')
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        version = self._version(key)
+        with self._lock:
+            cached = self._values.get(key)
+        if cached is not None and now - cached[0] < self.ttl and cached[1] == version:
+            return cached[2]
+        value = compute()
+        with self._lock:
+            self._values[key] = (now, version, value)
+        return value
+
+    def invalidate(self, scope=None):
+        """Drop the counts whose keys are in ``scope``, or every count without one."""
+        with self._lock:
+            for key in [key for key in self._values if scope is None or self.scope(key) == scope]:
+                del self._values[key]
+        if self.versions is not None:
+            self.versions.bump_version(self.TAG if scope is None else f'{self.TAG}:{scope}')
+
+count_cache = CountCache(app.config['APPROX_COUNT_TTL'], versions=page_cache)
+
+def approximate_total(key, query):
+    """Row count of ``query``, reused for APPROX_COUNT_TTL seconds."""
+    return count_cache.get(key, lambda: query.order_by(None).count())
+
+# Template fragment cache
+# Logged-in pages skip the page cache, yet most of what they render per row
+# (post rows, author boxes, message cards, the navbar) only changes when the
+# row does. `{% cache key %}...{% endcache %}` keeps the rendered fragment for
+# FRAGMENT_CACHE_TTL seconds (`{% cache key, ttl %}` overrides it) under its
+# template location plus ``key``. Keys carry what the fragment depends on,
+# such as ids, updated_at and the viewer's role, so an edit renders a new
+# entry in every process at once; the TTL and the LRU bound only retire old
+# ones. Never key a fragment on less than it shows: entries are shared
+# between all visitors.
+class FragmentCache:
+    """Process-local LRU of rendered template fragments with a per-entry TTL."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return render()
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and now < cached[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        body = render()
+        with self._lock:
+            self._entries[key] = (now + ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_TTL'], app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+
+class FragmentCacheExtension(Extension):
+    """The ``{% cache key[, ttl] %}...{% endcache %}`` tag backed by fragment_cache."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        location = nodes.Const(f'{parser.name}:{lineno}')
+        key = parser.parse_expression()
+        ttl = parser.parse_expression() if parser.stream.skip_if('comma') else nodes.Const(None)
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [location, key, ttl]), [], [], body).set_lineno(lineno)
+
+    def _render(self, location, key, ttl, caller):
+        return fragment_cache.get(f'{location}:{key!r}', caller, ttl)
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+# Full-text search
+# SQLite FTS5 index of published posts, one row per post with rowid = post.id.
+# It is created with the rest of the schema and written from the same
+# transactions that change posts, so it never drifts from the post table.
+SEARCH_TABLE = 'post_search'
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 3.0)  # bm25 weights for title, excerpt, body, tags
+SEARCH_MAX_TERMS = 8
+SEARCH_SNIPPET_TOKENS = 24
+SEARCH_MARK = ('\x02', '\x03')  # placeholder highlight markers, swapped for <mark> after escaping
+
+event.listen(db.metadata, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "title, excerpt, body, tags, tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')"
+).execute_if(dialect='sqlite'))
+
+SEARCH_INSERT = db.text(
+    f'INSERT INTO {SEARCH_TABLE} (rowid, title, excerpt, body, tags) '
+    'VALUES (:rowid, :title, :excerpt, :body, :tags)')
+SEARCH_DELETE = db.text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids').bindparams(
+    db.bindparam('ids', expanding=True))
+SEARCH_SNIPPETS = db.text(
+    f'SELECT rowid, highlight({SEARCH_TABLE}, 0, :mark_start, :mark_end) AS title, '
+    f'snippet({SEARCH_TABLE}, 2, :mark_start, :mark_end, \'...\', :tokens) AS snippet '
+    f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query AND rowid IN :ids'
+).bindparams(db.bindparam('ids', expanding=True))
+
+def search_supported():
+    """Full-text search needs SQLite FTS5; other databases fall back to title matching."""
+    return db.engine.dialect.name == 'sqlite'
+
+def search_document(post):
+    """Column values of the search index row for ``post``."""
+    return search_row(post.id, post.title, post.excerpt, post.rendered_html or post.content,
+                      [tag.name for tag in post.tags])
+
+def search_row(post_id, title, excerpt, html, tag_names):
+    return {
+        'rowid': post_id,
+        'title': title,
+        'excerpt': excerpt or '',
+        'body': html_to_text(html),
+        'tags': ' '.join(tag_names),
+    }
+
+def index_posts(posts):
+    """Replace the search rows of ``posts`` in the current transaction.
+
+    Only published posts are searchable; drafts and archived posts are removed.
+    """
+    if not search_supported() or not posts:
+        return
+    unindex_posts([post.id for post in posts])
+    documents = [search_document(post) for post in posts if post.status == 'published']
+    if documents:
+        db.session.execute(SEARCH_INSERT, documents)
+
+def unindex_posts(post_ids):
+    """Drop the search rows of deleted posts in the current transaction."""
+    if search_supported() and post_ids:
+        db.session.execute(SEARCH_DELETE, {'ids': list(post_ids)})
+
+def rebuild_search_index(batch_size=500):
+    """Re-create every search row from the post table and return how many were indexed.
+
+    Only the columns the index needs are selected, with Core queries rather
+    than Post and Tag entities, so schema migration 3 can run this against
+    a database that does not have the columns later migrations add yet.
+    """
+    db.session.execute(db.text(f'DELETE FROM {SEARCH_TABLE}'))
+    last_id = 0
+    indexed = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Post.id, Post.title, Post.excerpt, Post.rendered_html, Post.content)
+            .where(Post.status == 'published', Post.id > last_id).order_by(Post.id).limit(batch_size)).all()
+        if not rows:
+            break
+        tag_names = {row.id: [] for row in rows}
+        for post_id, name in db.session.execute(
+                db.select(post_tags.c.post_id, Tag.name).join(Tag, Tag.id == post_tags.c.tag_id)
+                .where(post_tags.c.post_id.in_(tag_names))):
+            tag_names[post_id].append(name)
+        db.session.execute(SEARCH_INSERT, [search_row(row.id, row.title, row.excerpt, row.rendered_html or row.content,
+                                                      tag_names[row.id]) for row in rows])
+        last_id = rows[-1].id
+        indexed += len(rows)
+    db.session.execute(db.text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+    return indexed
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 query in which every word must match.
+
+    Words are quoted so FTS5 operators in the input are taken literally; a
+    trailing ``*`` (``garden*``) asks for a prefix match.
+    """
+    terms = re.findall(r'(\w+)(\*?)', text.lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{word}"*' if star and len(word) >= 2 else f'"{word}"' for word, star in terms)
+
+def search_rank_statement(position, window=0):
+    """Best-first (bm25, rowid) keyset query for one page of matching rowids.
+
+    With a ``window`` only the newest ``window`` matches are scored, which
+    bounds the cost of very common terms; FTS5 yields them in rowid order
+    without looking at the rest. Older matches are never returned, on any
+    page; the ``truncated`` column tells whether there were any.
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    newest = f'ORDER BY rowid DESC LIMIT {int(window)}' if window else ''
+    truncated = (f'(SELECT count(*) FROM (SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query '
+                 f'LIMIT 1 OFFSET {int(window)}))' if window else '0')
+    condition, order = '', 'score ASC, rowid ASC'
+    if position and position[0] == 'prev':
+        condition, order = 'WHERE (score, rowid) < (:score, :rowid)', 'score DESC, rowid DESC'
+    elif position:
+        condition = 'WHERE (score, rowid) > (:score, :rowid)'
+    return db.text(
+        f'SELECT rowid, score, {truncated} AS truncated FROM (SELECT rowid, bm25({SEARCH_TABLE}, {weights}) AS score '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query {newest}) {condition} ORDER BY {order} LIMIT :limit')
+
+def decode_search_cursor(token):
+    """Return (direction, score, rowid) or None for a missing or malformed cursor."""
+    if not token:
+        return None
+    try:
+        direction, score, rowid = unpack_cursor(token)
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, float(score), int(rowid)
+    except (ValueError, TypeError):
+        return None
+
+def highlight_markup(text):
+    """Escape indexed text and turn the highlight placeholders into <mark> tags."""
+    start, end = SEARCH_MARK
+    return Markup(str(escape(text or '')).replace(start, '<mark>').replace(end, '</mark>'))
+
+class SearchHit:
+    """A matching post with its highlighted title and body snippet."""
+
+    def __init__(self, post, title, snippet, score):
+        self.post = post
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+
+def search_posts(text, cursor=None, per_page=10):
+    """Rank published posts matching ``text`` and return a KeysetPage of SearchHit.
+
+    Pages seek on (bm25 score, rowid) like keyset_paginate() does on dates,
+    and snippets are only computed for the rows on the page.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return KeysetPage([])
+    position = decode_search_cursor(cursor)
+    params = {'query': match, 'limit': per_page + 1}
+    if position:
+        params.update(score=position[1], rowid=position[2])
+    try:
+        statement = search_rank_statement(position, app.config['SEARCH_RANK_WINDOW'])
+        ranked = db.session.execute(statement, params).all()
+    except OperationalError:
+        db.session.rollback()  # FTS5 still rejects some inputs, e.g. a lone stop character
+        return KeysetPage([])
+
+    has_more = len(ranked) > per_page
+    ranked = ranked[:per_page]
+    if position and position[0] == 'prev':
+        ranked.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = position is not None, has_more
+
+    hits = []
+    if ranked:
+        ids = [row.rowid for row in ranked]
+        snippets = {row.rowid: row for row in db.session.execute(SEARCH_SNIPPETS, {
+            'query': match, 'ids': ids, 'mark_start': SEARCH_MARK[0], 'mark_end': SEARCH_MARK[1],
+            'tokens': SEARCH_SNIPPET_TOKENS})}
+        posts = {post.id: post for post in Post.query.options(db.joinedload(Post.author))
+                 .filter(Post.id.in_(ids), Post.status == 'published')}
+        for row in ranked:
+            if row.rowid in posts and row.rowid in snippets:
+                hits.append(SearchHit(posts[row.rowid], highlight_markup(snippets[row.rowid].title),
+                                      highlight_markup(snippets[row.rowid].snippet), row.score))
+
+    page = KeysetPage(
+        hits,
+        next_cursor=pack_cursor(['next', ranked[-1].score, ranked[-1].rowid]) if ranked and has_next else None,
+        prev_cursor=pack_cursor(['prev', ranked[0].score, ranked[0].rowid]) if ranked and has_prev else None,
+    )
+    # The template says when older matches were left out by SEARCH_RANK_WINDOW
+    page.ranked_window = app.config['SEARCH_RANK_WINDOW'] if ranked and ranked[0].truncated else None
+    return page
+
+def search_posts_by_title(text, cursor=None, per_page=10):
+    """Newest-first title match used where FTS5 is not available."""
+    terms = re.findall(r'\w+', text)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return KeysetPage([])
+    query = Post.query.options(db.joinedload(Post.author)).filter(
+        Post.status == 'published', *(Post.title.ilike(f'%{term}%') for term in terms))
+    page = keyset_paginate(query, Post, cursor, per_page=per_page)
+    page.items = [SearchHit(post, post.title, post.excerpt or post.auto_excerpt or '', None) for post in page.items]
+    return page
+
+# Tags
+# Tag.post_count is the number of published posts carrying the tag. It is
+# adjusted in the same transaction as every write that adds or removes a
+# published post from a tag, so the tag cloud reads it instead of grouping
+# post_tags on each view; `flask tags-recount` rebuilds it from scratch.
+TAG_NAME_RE = re.compile(r'[^\w-]+')
+
+def parse_tag_names(text):
+    """Normalized, de-duplicated tag names from a comma separated form field."""
+    names = []
+    for raw in (text or '').split(','):
+        name = TAG_NAME_RE.sub('-', raw.strip().lower()).strip('-')[:50]
+        if name and name not in names:
+            names.append(name)
+    return names[:app.config['MAX_TAGS_PER_POST']]
+
+def upsert_tags(names):
+    """Return the Tag rows for ``names``, creating the missing ones in one INSERT."""
+    if not names:
+        return []
+    insert = insert_ignoring_conflicts(Tag, ['name'])
+    if insert is not None:
+        db.session.execute(insert, [{'name': name} for name in names])
+    else:
+        existing = set(db.session.scalars(db.select(Tag.name).where(Tag.name.in_(names))))
+        missing = [{'name': name} for name in names if name not in existing]
+        if missing:
+            db.session.execute(db.insert(Tag), missing)
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))}
+    return [tags[name] for name in names]
+
+def adjust_tag_counts(deltas):
+    """Apply {tag_id: change} to Tag.post_count with one relative UPDATE per distinct change."""
+    by_delta = {}
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        db.session.execute(db.update(Tag).where(Tag.id.in_(tag_ids)).values(post_count=Tag.post_count + delta)
+                           .execution_options(synchronize_session=False))
+
+def retag_post(post, names, was_published):
+    """Give ``post`` exactly the tags ``names`` and keep the counts in step.
+
+    Returns the ids of the tags whose published listing gained or lost the
+    post, for post_changed().
+    """
+    before = {tag.id for tag in post.tags} if was_published else set()
+    post.tags = upsert_tags(names)
+    after = {tag.id for tag in post.tags} if post.status == 'published' else set()
+    adjust_tag_counts({**{tag_id: -1 for tag_id in before - after}, **{tag_id: 1 for tag_id in after - before}})
+    return before ^ after
+
+def recount_tags():
+    """Recompute every Tag.post_count from post_tags."""
+    published = (db.select(db.func.count()).select_from(post_tags)
+                 .join(Post, Post.id == post_tags.c.post_id)
+                 .where(post_tags.c.tag_id == Tag.id, Post.status == 'published').scalar_subquery())
+    db.session.execute(db.update(Tag).values(post_count=published).execution_options(synchronize_session=False))
+
+def tag_cloud():
+    """(name, post count, weight 1-5) of every tag with published posts, alphabetically."""
+    rows = db.session.execute(db.select(Tag.name, Tag.post_count).where(Tag.post_count > 0)
+                              .order_by(Tag.name)).all()
+    if not rows:
+        return []
+    low = math.log(min(count for _, count in rows))
+    spread = math.log(max(count for _, count in rows)) - low
+    return [(name, count, 1 + round(4 * (math.log(count) - low) / spread) if spread else 3)
+            for name, count in rows]
+
+class RelatedPostsIndex:
+    """Tag co-occurrence index behind the related posts of post pages.
+
+    One query over post_tags loads which published posts carry which tags.
+    A post's related posts are the others sharing most of its tags, newest
+    first among equals; each list is computed on first use and memoized.
+    The index is rebuilt after the page cache's ``related`` tag changes; with
+    a shared page cache backend (PAGE_CACHE_DIR) that tag is shared too, so
+    every worker drops its copy when tag membership changes in any of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._post_tags = {}
+        self._tag_posts = {}
+        self._rank = {}
+        self._related = {}
+        self.builds = 0
+
+    def _load(self):
+        version = page_cache.version('related')
+        with self._lock:
+            if version == self._version:
+                return
+        rows = db.session.execute(
+            db.select(post_tags.c.post_id, post_tags.c.tag_id).join(Post, Post.id == post_tags.c.post_id)
+            .where(Post.status == 'published').order_by(Post.created_at.desc(), Post.id.desc()))
+        post_tag_ids, tag_posts, rank = {}, {}, {}
+        for post_id, tag_id in rows:
+            rank.setdefault(post_id, len(rank))
+            post_tag_ids.setdefault(post_id, []).append(tag_id)
+            tag_posts.setdefault(tag_id, []).append(post_id)
+        with self._lock:
+            self._version = version
+            self._post_tags, self._tag_posts, self._rank = post_tag_ids, tag_posts, rank
+            self._related = {}
+            self.builds += 1
+
+    def related(self, post_id, limit):
+        """Ids of up to ``limit`` published posts related to ``post_id``, best first."""
+        self._load()
+        with self._lock:
+            cached = self._related.get((post_id, limit))
+            if cached is not None:
+                return cached
+            tag_ids, tag_posts, rank = self._post_tags.get(post_id, ()), self._tag_posts, self._rank
+        shared = {}
+        for tag_id in tag_ids:
+            for other in tag_posts[tag_id]:
+                shared[other] = shared.get(other, 0) + 1
+        shared.pop(post_id, None)
+        result = heapq.nsmallest(limit, shared, key=lambda other: (-shared[other], rank[other]))
+        with self._lock:
+            if tag_posts is self._tag_posts:
+                self._related[(post_id, limit)] = result
+        return result
+
+related_index = RelatedPostsIndex()
+
+def related_posts(post):
+    """Published posts sharing the most tags with ``post``, best first."""
+    ids = related_index.related(post.id, app.config['RELATED_POSTS'])
+    if not ids:
+        return []
+    posts = {p.id: p for p in Post.query.filter(Post.id.in_(ids), Post.status == 'published')}
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+# Feeds and sitemap
+# Crawlers and feed readers poll these far more often than posts change. Each
+# document is generated from a streamed query, kept in feed_cache as bytes with
+# its ETag and rebuilt only after a published post is added, edited or removed.
+# Past SITEMAP_CHUNK_SIZE posts /sitemap.xml turns into an index of
+# /sitemap-<n>.xml files, each covering one range of post ids, so a change
+# only rebuilds the index and the chunk holding that post.
+FEED_TITLE = 'Personal Blog'
+FEED_DESCRIPTION = 'Latest posts from Personal Blog'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# Shared feeds live in a subdirectory of PAGE_CACHE_DIR, so they keep their own
+# epoch, tag versions and size cap apart from the page cache's
+feed_cache = PageCache(
+    max_entries=64,
+    max_age=app.config['PAGE_CACHE_MAX_AGE'],
+    backend=(FileSystemCacheBackend(os.path.join(app.config['PAGE_CACHE_DIR'], 'feeds'),
+                                    app.config['PAGE_CACHE_DIR_MAX_ENTRIES'])
+             if app.config['PAGE_CACHE_DIR'] else None)
+)
+
+def site_url():
+    """Base URL for absolute links; SITE_URL wins so exports and proxies get the public host."""
+    return (app.config['SITE_URL'] or request.host_url).rstrip('/')
+
+def absolute_url(endpoint, **values):
+    return site_url() + url_for(endpoint, **values)
+
+def feed_date(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def sitemap_chunk_number(post_id):
+    return (post_id - 1) // app.config['SITEMAP_CHUNK_SIZE'] + 1
+
+def feeds_changed(*post_ids):
+    """Rebuild the feeds, the sitemap index and the chunks holding ``post_ids`` on their next request."""
+    chunks = {f'sitemap:{sitemap_chunk_number(post_id)}' for post_id in post_ids}
+    feed_cache.invalidate('feeds', 'sitemap', *sorted(chunks))
+
+def feed_entries():
+    """Newest published posts with their author, streamed from the database."""
+    query = (db.session.query(Post.title, Post.slug, Post.excerpt, Post.auto_excerpt, Post.created_at,
+                              Post.updated_at, User.first_name, User.last_name, User.username)
+             .join(User, Post.user_id == User.id).filter(Post.status == 'published')
+             .order_by(Post.created_at.desc(), Post.id.desc()).limit(app.config['FEED_ITEMS']))
+    for row in query.yield_per(100):
+        author = f'{row.first_name or ""} {row.last_name or ""}'.strip() or row.username
+        yield row, absolute_url('post', slug=row.slug), author, row.excerpt or row.auto_excerpt or ''
+
+def build_rss():
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield ('<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" '
+           'xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>')
+    yield (f'<title>{escape(FEED_TITLE)}</title><link>{escape(site_url())}/</link>'
+           f'<description>{escape(FEED_DESCRIPTION)}</description>'
+           f'<atom:link href="{escape(absolute_url("rss_feed"))}" rel="self" type="application/rss+xml"/>')
+    for row, link, author, summary in feed_entries():
+        yield (f'<item><title>{escape(row.title)}</title><link>{escape(link)}</link>'
+               f'<guid isPermaLink="true">{escape(link)}</guid>'
+               f'<pubDate>{format_datetime(row.created_at.replace(tzinfo=timezone.utc), usegmt=True)}</pubDate>'
+               f'<dc:creator>{escape(author)}</dc:creator><description>{escape(summary)}</description></item>')
+    yield '</channel></rss>\n'
+
+def build_atom():
+    updated = db.session.query(db.func.max(Post.updated_at)).filter(Post.status == 'published').scalar()
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield (f'<feed xmlns="http://www.w3.org/2005/Atom"><title>{escape(FEED_TITLE)}</title>'
+           f'<subtitle>{escape(FEED_DESCRIPTION)}</subtitle><id>{escape(site_url())}/</id>'
+           f'<updated>{feed_date(updated or datetime(1970, 1, 1))}</updated>'
+           f'<link href="{escape(site_url())}/"/><link href="{escape(absolute_url("atom_feed"))}" rel="self"/>')
+    for row, link, author, summary in feed_entries():
+        yield (f'<entry><title>{escape(row.title)}</title><link href="{escape(link)}"/><id>{escape(link)}</id>'
+               f'<published>{feed_date(row.created_at)}</published>'
+               f'<updated>{feed_date(row.updated_at or row.created_at)}</updated>'
+               f'<author><name>{escape(author)}</name></author><summary>{escape(summary)}</summary></entry>')
+    yield '</feed>\n'
+
+def sitemap_chunks():
+    """(chunk number, last modification) of every chunk holding a published post."""
+    chunk = ((Post.id - 1) // app.config['SITEMAP_CHUNK_SIZE']).label('chunk')
+    rows = (db.session.query(chunk, db.func.max(Post.updated_at)).filter(Post.status == 'published')
+            .group_by(chunk).order_by(chunk))
+    return [(int(number) + 1, updated) for number, updated in rows]
+
+def sitemap_urls(chunk=None):
+    """<url> elements for the static pages and the published posts of ``chunk`` (all when None)."""
+    if chunk in (None, 1):
+        yield f'<url><loc>{escape(site_url())}/</loc></url><url><loc>{escape(absolute_url("about"))}</loc></url>'
+    query = db.session.query(Post.slug, Post.updated_at).filter(Post.status == 'published').order_by(Post.id)
+    if chunk is not None:
+        size = app.config['SITEMAP_CHUNK_SIZE']
+        query = query.filter(Post.id > (chunk - 1) * size, Post.id <= chunk * size)
+    for slug, updated_at in query.yield_per(1000):
+        lastmod = f'<lastmod>{feed_date(updated_at)}</lastmod>' if updated_at else ''
+        yield f'<url><loc>{escape(absolute_url("post", slug=slug))}</loc>{lastmod}</url>'
+
+def build_urlset(chunk=None):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">'
+    yield from sitemap_urls(chunk)
+    yield '</urlset>\n'
+
+def build_sitemap():
+    chunks = sitemap_chunks()
+    if len(chunks) <= 1:
+        yield from build_urlset()
+        return
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">'
+    for number, updated in chunks:
+        lastmod = f'<lastmod>{feed_date(updated)}</lastmod>' if updated else ''
+        yield f'<sitemap><loc>{escape(absolute_url("sitemap_chunk", number=number))}</loc>{lastmod}</sitemap>'
+    yield '</sitemapindex>\n'
+
+def cached_document(name, content_type, tags, build):
+    """Serve a generated document from feed_cache, building it from ``build()`` on a miss."""
+    key = f'feed:{RENDER_VERSION}:{site_url()}:{name}'
+    enabled = app.config['PAGE_CACHE_ENABLED']
+    entry = feed_cache.get(key) if enabled else None
+    state = 'HIT'
+    if entry is None:
+        epoch = feed_cache.epoch()
+        body = b''.join(part.encode('utf-8') for part in build())
+        entry = {'body': body, 'headers': {'ETag': f'"{hashlib.sha1(body).hexdigest()}"'}}
+        if enabled:
+            feed_cache.set(key, body, content_type, tags, epoch, headers=entry['headers'])
+        state = 'MISS'
+    response = set_cache_headers(app.response_class(entry['body'], content_type=content_type,
+                                                    headers=entry['headers']))
+    response.headers['X-Cache'] = state
+    return response.make_conditional(request)
+
+# Admin data exports
+# CSV or JSON Lines dumps of users, posts and contacts with their replies.
+# Rows are streamed from a yield_per query (a server-side cursor where the
+# database has one), formatted one batch at a time, so memory stays flat
+# however large the table is. Rows come in id order: ?after=<id> resumes an
+# interrupted download after the last row received, and ?since/?until (ISO
+# dates or times, until exclusive) filter on created_at.
+DATA_EXPORT_BATCH_SIZE = 1000
+DATA_EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+DATA_EXPORTS = {
+    'users': (User, ('id', 'username', 'email', 'first_name', 'last_name', 'bio', 'is_admin', 'created_at')),
+    'posts': (Post, ('id', 'user_id', 'title', 'slug', 'status', 'excerpt', 'content_format', 'content',
+                     'featured_image', 'word_count', 'created_at', 'updated_at')),
+    'contacts': (Contact, ('id', 'first_name', 'last_name', 'email', 'subject', 'message', 'is_read', 'created_at')),
+}
+REPLY_EXPORT_COLUMNS = ('id', 'admin_id', 'message', 'created_at', 'sent_at')
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def parse_export_filters(args):
+    """(since, until, after) from the query string; aborts with 400 on malformed values."""
+    try:
+        since = datetime.fromisoformat(args['since']) if args.get('since') else None
+        until = datetime.fromisoformat(args['until']) if args.get('until') else None
+        after = int(args.get('after') or 0)
+    except ValueError:
+        abort(400)
+    return since, until, after
+
+def export_batches(kind, since=None, until=None, after=0):
+    """Yield lists of row dicts for ``kind``, DATA_EXPORT_BATCH_SIZE at a time."""
+    model, columns = DATA_EXPORTS[kind]
+    statement = db.select(*(getattr(model, column) for column in columns)).where(model.id > after)
+    if since:
+        statement = statement.where(model.created_at >= since)
+    if until:
+        statement = statement.where(model.created_at < until)
+    result = db.session.execute(statement.order_by(model.id).execution_options(yield_per=DATA_EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        rows = [row._asdict() for row in partition]
+        if kind == 'contacts':
+            replies = {row['id']: [] for row in rows}
+            reply_rows = db.session.execute(
+                db.select(Reply.contact_id, *(getattr(Reply, column) for column in REPLY_EXPORT_COLUMNS))
+                .where(Reply.contact_id.in_(replies)).order_by(Reply.contact_id, Reply.created_at, Reply.id))
+            for reply in reply_rows:
+                replies[reply.contact_id].append({column: getattr(reply, column) for column in REPLY_EXPORT_COLUMNS})
+            for row in rows:
+                row['replies'] = replies[row['id']]
+        yield rows
+
+def export_json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def export_csv_value(value):
+    if isinstance(value, list):
+        return json.dumps(value, default=export_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    # Spreadsheets evaluate cells starting like a formula; contact form input must stay text
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def format_export(batches, fmt, columns):
+    """Encode row batches as CSV (with a header row) or JSON Lines, one chunk per batch."""
+    if fmt == 'jsonl':
+        for rows in batches:
+            yield ''.join(json.dumps(row, default=export_json_default, ensure_ascii=False) + '\n' for row in rows)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([export_csv_value(value) for value in row.values()] for row in rows)
+        yield buffer.getvalue()
+
+# Inbox counters
+# The admin inbox reads stored numbers instead of scanning contact and reply:
+# Contact.reply_count and Contact.last_reply_at move with every reply, and the
+# unread_contacts tally with every message stored, read or deleted, each in
+# the same transaction as that change. `flask contacts-recount` rebuilds them.
+UNREAD_CONTACTS = 'unread_contacts'
+
+event.listen(Tally.__table__, 'after_create', DDL(
+    f"INSERT INTO tally (name, value) VALUES ('{UNREAD_CONTACTS}', 0)"))
+
+def adjust_tally(name, delta):
+    if delta:
+        db.session.execute(db.update(Tally).where(Tally.name == name).values(value=Tally.value + delta))
+
+def tally(name):
+    return db.session.scalar(db.select(Tally.value).where(Tally.name == name)) or 0
+
+def mark_contacts_read(*criteria):
+    """Mark the unread messages matching ``criteria`` read in one UPDATE and return how many changed."""
+    changed = db.session.execute(
+        db.update(Contact).where(Contact.is_read.is_not(True), *criteria).values(is_read=True)
+        .execution_options(synchronize_session=False)).rowcount
+    adjust_tally(UNREAD_CONTACTS, -changed)
+    return changed
+
+def commit_keeping_loaded():
+    """Commit without expiring the objects loaded so far, so rendering them does not reload them."""
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = True
+
+def add_contact_reply(contact, admin, message):
+    """Store a reply to ``contact`` and bump its reply counters."""
+    reply = Reply(contact_id=contact.id, admin_id=admin.id, message=message, created_at=datetime.utcnow())
+    db.session.add(reply)
+    db.session.flush()
+    db.session.execute(db.update(Contact).where(Contact.id == contact.id)
+                       .values(reply_count=Contact.reply_count + 1, last_reply_at=reply.created_at)
+                       .execution_options(synchronize_session=False))
+    return reply
+
+def recount_contact_replies(*criteria):
+    """Recompute Contact.reply_count and last_reply_at from reply for the contacts matching ``criteria``."""
+    replies = db.select(db.func.count()).where(Reply.contact_id == Contact.id).scalar_subquery()
+    latest = db.select(db.func.max(Reply.created_at)).where(Reply.contact_id == Contact.id).scalar_subquery()
+    db.session.execute(db.update(Contact).where(*criteria).values(reply_count=replies, last_reply_at=latest)
+                       .execution_options(synchronize_session=False))
+
+def recount_unread_contacts():
+    unread = db.session.scalar(db.select(db.func.count()).select_from(Contact).where(Contact.is_read.is_not(True)))
+    db.session.execute(db.update(Tally).where(Tally.name == UNREAD_CONTACTS).values(value=unread))
+
+def inbox_summary():
+    """Unread message count and the newest message time, cached for APPROX_COUNT_TTL seconds.
+
+    Both come from one statement: the inbox page renders the summary within
+    its query budget even when the cache is cold.
+    """
+    def compute():
+        unread = db.select(Tally.value).where(Tally.name == UNREAD_CONTACTS).scalar_subquery()
+        latest, unread = db.session.execute(db.select(db.func.max(Contact.created_at), unread)).one()
+        return {'unread': unread or 0, 'latest_at': latest.isoformat() if latest else None}
+    return count_cache.get('inbox:summary', compute)
+
+# Bulk writes
+# Deleting an account or a selection of rows runs set-based DELETE and UPDATE
+# statements over BULK_BATCH_SIZE ids at a time and commits after each batch,
+# so SQLite's write lock is released between batches rather than held while
+# every post of a prolific author is loaded and deleted one by one. What the
+# ORM cascades used to cover (tag links, replies) and the counters, search
+# rows and caches are kept in step batch by batch. Upload files are removed
+# by a job enqueued in the batch's transaction, so they only go once the rows
+# that referenced them are gone for good. A failure part way leaves earlier
+# batches done; running the action again finishes it.
+POST_STATUSES = ('draft', 'published', 'archived')
+
+def id_batches(model, columns, criteria):
+    """Yield rows (id, *columns) of ``model`` matching ``criteria`` in id order, BULK_BATCH_SIZE at a time.
+
+    Each batch starts after the last id of the one before, so the caller may
+    delete or change the rows it was given before asking for the next batch.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(db.select(model.id, *columns).where(model.id > last_id, *criteria)
+                                  .order_by(model.id).limit(app.config['BULK_BATCH_SIZE'])).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def delete_posts(*criteria):
+    """Delete the posts matching ``criteria`` batch by batch and return how many were deleted."""
+    deleted = 0
+    for rows in id_batches(Post, (Post.status, Post.featured_image), criteria):
+        post_ids = [row.id for row in rows]
+        published_ids = [row.id for row in rows if row.status == 'published']
+        tag_counts = count_by(post_tags.c.tag_id, post_tags.c.post_id.in_(published_ids)) if published_ids else {}
+        adjust_tag_counts({tag_id: -count for tag_id, count in tag_counts.items()})
+        db.session.execute(db.delete(post_tags).where(post_tags.c.post_id.in_(post_ids)))
+        db.session.execute(db.delete(Post).where(Post.id.in_(post_ids)).execution_options(synchronize_session=False))
+        unindex_posts(post_ids)
+        images = sorted({row.featured_image for row in rows if row.featured_image})
+        if images:
+            enqueue('delete_unused_images', {'filenames': images})
+        db.session.commit()
+        posts_changed(post_ids, bool(published_ids), published_ids, tag_counts)
+        deleted += len(post_ids)
+    return deleted
+
+def set_post_status(status, *criteria):
+    """Move the posts matching ``criteria`` to ``status`` batch by batch and return how many changed."""
+    changed = 0
+    for rows in id_batches(Post, (Post.status,), (Post.status != status, *criteria)):
+        post_ids = [row.id for row in rows]
+        # Publishing adds every post of the batch to its tags and the search index; otherwise only
+        # the posts that were published leave them
+        affected = post_ids if status == 'published' else [row.id for row in rows if row.status == 'published']
+        db.session.execute(db.update(Post).where(Post.id.in_(post_ids))
+                           .values(status=status, updated_at=datetime.utcnow())
+                           .execution_options(synchronize_session=False))
+        tag_counts = count_by(post_tags.c.tag_id, post_tags.c.post_id.in_(affected)) if affected else {}
+        sign = 1 if status == 'published' else -1
+        adjust_tag_counts({tag_id: sign * count for tag_id, count in tag_counts.items()})
+        if status == 'published':
+            index_posts(Post.query.options(db.selectinload(Post.tags)).filter(Post.id.in_(post_ids))
+                        .populate_existing().all())
+        else:
+            unindex_posts(affected)
+        db.session.commit()
+        posts_changed(post_ids, bool(affected), affected, tag_counts)
+        changed += len(post_ids)
+    return changed
+
+def delete_contacts(*criteria):
+    """Delete the messages matching ``criteria`` and their replies batch by batch; return how many."""
+    deleted = 0
+    for rows in id_batches(Contact, (Contact.is_read,), criteria):
+        contact_ids = [row.id for row in rows]
+        db.session.execute(db.delete(Reply).where(Reply.contact_id.in_(contact_ids)))
+        db.session.execute(db.delete(Contact).where(Contact.id.in_(contact_ids))
+                           .execution_options(synchronize_session=False))
+        adjust_tally(UNREAD_CONTACTS, -sum(1 for row in rows if not row.is_read))
+        db.session.commit()
+        deleted += len(contact_ids)
+    if deleted:
+        count_cache.invalidate('inbox')
+    return deleted
+
+def delete_users(*criteria):
+    """Delete the non-admin users matching ``criteria`` with their posts and replies; return how many."""
+    deleted = 0
+    not_admin = User.is_admin.is_not(True)
+    for rows in id_batches(User, (), (not_admin, *criteria)):
+        user_ids = [row.id for row in rows]
+        # Replies they wrote while they were admins
+        replied_ids = db.session.scalars(db.select(Reply.contact_id).where(Reply.admin_id.in_(user_ids))
+                                         .distinct()).all()
+        if replied_ids:
+            db.session.execute(db.delete(Reply).where(Reply.admin_id.in_(user_ids)))
+            recount_contact_replies(Contact.id.in_(replied_ids))
+            db.session.commit()
+        delete_posts(Post.user_id.in_(user_ids))
+        db.session.execute(db.delete(User).where(User.id.in_(user_ids), not_admin)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        # Core deletes skip the ORM events that normally evict users from the cache
+        user_cache.invalidate(*user_ids)
+        page_cache.invalidate(*(f'author:{user_id}' for user_id in user_ids))
+        deleted += len(user_ids)
+    if deleted:
+        count_cache.invalidate()
+    return deleted
+
+def selected_ids(field):
+    """The integer ids posted by the ``field`` checkboxes of a bulk action form."""
+    return [int(value) for value in request.form.getlist(field) if value.isdigit()]
 
-    def set_password(self, password):
-        """Hash and set user password."""
-        self.password_hash = generate_password_hash(password)
+# Contact form
+# A flood of posts to /contact must not turn into a write storm that holds
+# SQLite's single write lock away from every other route. Submissions are
+# charged to token buckets per client IP and per sender email before anything
+# touches the database, an identical message from the same sender within
+# CONTACT_DEDUP_SECONDS is accepted but not stored again, and with
+# CONTACT_BUFFER_SIZE > 0 accepted rows are written in batches by
+# ContactWriteBuffer instead of one transaction per post.
+CONTACT_RECENT_HASHES = 10000
 
-    def check_password(self, password):
-        """Verify user password."""
-        return check_password_hash(self.password_hash, password)
+contact_throttle = RateLimiter()
 
-    def __repr__(self):
-        return f'<User {self.username}>'
+def throttle_contact(email):
+    """Charge a submission to the client IP and the sender email; returns seconds to wait or 0.
 
-class Post(db.Model):
-    """Blog post model for content management."""
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    excerpt = db.Column(db.Text)
-    featured_image = db.Column(db.String(200))
-    slug = db.Column(db.String(200), unique=True, nullable=False)
-    status = db.Column(db.String(20), default='draft')  # draft, published, archived
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    tags = db.relationship('Tag', secondary='post_tags', backref='posts')
+    As for logins, the client IP is the one forwarded by the TRUSTED_PROXY_HOPS
+    proxies; without it the per-IP bucket is one global bucket for all visitors.
+    """
+    if not app.config['CONTACT_THROTTLE_ENABLED']:
+        return 0
+    return contact_throttle.acquire(
+        (f'ip:{request.remote_addr}', app.config['CONTACT_IP_BURST'], app.config['CONTACT_IP_PER_MINUTE']),
+        (f'email:{email.strip().lower()[:120]}', app.config['CONTACT_EMAIL_BURST'],
+         app.config['CONTACT_EMAIL_PER_MINUTE']))
 
-    def __repr__(self):
-        return f'<Post {self.title}>'
+def contact_hash(email, subject, message):
+    """SHA-256 of a submission, ignoring case of the email and differences in whitespace."""
+    normalized = '\0'.join((email.strip().lower(), ' '.join(subject.split()), ' '.join(message.split())))
+    return hashlib.sha256(normalized.encode()).hexdigest()
 
-class Tag(db.Model):
-    """Tag model for categorizing blog posts."""
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    description = db.Column(db.Text)
+class RecentHashes:
+    """Content hashes accepted by this process, so duplicates still in the write buffer are caught."""
 
-    def __repr__(self):
-        return f'<Tag {self.name}>'
+    def __init__(self, max_entries=CONTACT_RECENT_HASHES):
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
 
-# Association table for many-to-many relationship between posts and tags
-post_tags = db.Table('post_tags',
-    db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
-)
+    def seen(self, digest, window):
+        """True if ``digest`` was added in the last ``window`` seconds."""
+        with self._lock:
+            added = self._seen.get(digest)
+        return added is not None and time.monotonic() - added < window
 
-class Contact(db.Model):
-    """Contact form submission model."""
-    id = db.Column(db.Integer, primary_key=True)
-    first_name = db.Column(db.String(50), nullable=False)
-    last_name = db.Column(db.String(50), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
-    subject = db.Column(db.String(100), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_read = db.Column(db.Boolean, default=False)
-    replies = db.relationship('Reply', backref='contact', lazy=True, cascade='all, delete-orphan')
+    def add(self, digest):
+        with self._lock:
+            self._seen[digest] = time.monotonic()
+            self._seen.move_to_end(digest)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
 
-    def __repr__(self):
-        return f'<Contact {self.first_name} {self.last_name}>'
+recent_contact_hashes = RecentHashes()
 
-class Reply(db.Model):
-    """Admin reply to contact messages."""
-    id = db.Column(db.Integer, primary_key=True)
-    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=False)
-    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    admin = db.relationship('User', backref='replies')
+def is_duplicate_contact(digest):
+    """True if the same message was accepted within CONTACT_DEDUP_SECONDS, by this or another process."""
+    window = app.config['CONTACT_DEDUP_SECONDS']
+    if window <= 0:
+        return False
+    if recent_contact_hashes.seen(digest, window):
+        return True
+    cutoff = datetime.utcnow() - timedelta(seconds=window)
+    return db.session.query(db.select(Contact.id).where(
+        Contact.content_hash == digest, Contact.created_at >= cutoff).exists()).scalar()
 
-    def __repr__(self):
-        return f'<Reply {self.id} to Contact {self.contact_id}>'
+class ContactWriteBuffer:
+    """Write-behind buffer that inserts accepted submissions in batches (CONTACT_BUFFER_SIZE > 0).
 
-@login_manager.user_loader
-def load_user(user_id):
-    """Load user for Flask-Login."""
-    return User.query.get(int(user_id))
+    The request that fills the buffer writes it out with one multi-row
+    INSERT; a flusher thread writes partial batches every ``interval``
+    seconds and at interpreter exit. Rows still waiting when a process is
+    killed are lost, which is the price of not committing on every post.
+    A failed write puts the rows back for the next flush; rows that failed
+    ``max_attempts`` times are logged and dropped, so a long database outage
+    does not grow the buffer without bound.
+    """
 
-# Utility functions
-def allowed_file(filename):
-    """Check if uploaded file is allowed."""
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    def __init__(self, size, interval, max_attempts=5):
+        self.size = size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.dropped = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started_pid = None
+        self.stop = threading.Event()
 
+    def add(self, row):
+        """Queue ``row`` (Contact column values) and flush if the batch is full."""
+        self._start()
+        with self._lock:
+            self._rows.append((row, 0))
+            full = len(self._rows) >= self.size
+        if full:
+            self.flush()
 
+    def pending(self):
+        with self._lock:
+            return len(self._rows)
 
-def create_slug(title):
-    """Create URL-friendly slug from title."""
-    import re
-    slug = re.sub(r'[^\w\s-]', '', title.lower())
-    slug = re.sub(r'[-\s]+', '-', slug)
-    return slug
+    def flush(self):
+        """Insert every waiting row in one transaction and return how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                waiting, self._rows = self._rows, []
+            if not waiting:
+                return 0
+            rows = [row for row, _ in waiting]
+            # A separate app context gets its own session, leaving the caller's transaction alone
+            with app.app_context():
+                try:
+                    db.session.execute(db.insert(Contact), rows)
+                    adjust_tally(UNREAD_CONTACTS, len(rows))
+                    db.session.commit()
+                    count_cache.invalidate('inbox')
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Could not write %s buffered contact submissions; retrying', len(rows))
+                    retry = [(row, failures + 1) for row, failures in waiting if failures + 1 < self.max_attempts]
+                    dropped = len(waiting) - len(retry)
+                    if dropped:
+                        app.logger.error('Dropped %s buffered contact submissions after %s failed writes',
+                                         dropped, self.max_attempts)
+                    with self._lock:
+                        self._rows[:0] = retry
+                        self.dropped += dropped
+                    return 0
+            return len(rows)
 
-def sanitize_html(html_content):
-    """Sanitize HTML content for security."""
-    allowed_tags = ['p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 
-                   'ul', 'ol', 'li', 'blockquote', 'code', 'pre', 'a', 'img', 'span', 'div']
-    allowed_attrs = {
-        'a': ['href'], 
-        'img': ['src', 'alt', 'title'],
-        'span': ['style', 'class'],
-        'div': ['style', 'class'],
-        'p': ['style', 'class'],
-        'h1': ['style', 'class'],
-        'h2': ['style', 'class'],
-        'h3': ['style', 'class'],
-        'h4': ['style', 'class'],
-        'h5': ['style', 'class'],
-        'h6': ['style', 'class']
-    }
-    return bleach.clean(html_content, tags=allowed_tags, attributes=allowed_attrs)
+    def _start(self):
+        # Started on first use so forking servers do not inherit the thread
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            threading.Thread(target=self._run, name='contact-buffer', daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            self.flush()
+
+contact_buffer = ContactWriteBuffer(app.config['CONTACT_BUFFER_SIZE'], app.config['CONTACT_BUFFER_SECONDS'])
+
+def save_contact(first_name, last_name, email, subject, message, digest):
+    """Store an accepted submission, through the write buffer when it is enabled."""
+    row = {'first_name': first_name, 'last_name': last_name, 'email': email, 'subject': subject,
+           'message': message, 'content_hash': digest, 'created_at': datetime.utcnow(), 'is_read': False}
+    if contact_buffer.size > 0:
+        contact_buffer.add(row)
+    else:
+        db.session.add(Contact(**row))
+        adjust_tally(UNREAD_CONTACTS, 1)
+        db.session.commit()
+        count_cache.invalidate('inbox')
+    recent_contact_hashes.add(digest)
 
 # Routes
 @app.route('/')
+@cache_page
+@query_budget(3)
 def index():
     """Home page displaying published blog posts."""
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.filter_by(status='published').order_by(Post.created_at.desc()).paginate(
-        page=page, per_page=6, error_out=False)
-    return render_template('index.html', posts=posts)
+    cursor = request.args.get('cursor')
+    posts = keyset_paginate(Post.query.options(db.joinedload(Post.author)).filter_by(status='published'),
+                            Post, cursor, per_page=app.config['POSTS_PER_PAGE'])
+    last_modified = max((p.updated_at for p in posts.items if p.updated_at), default=None)
+    etag = page_etag('index', cursor, posts.has_prev, posts.has_next,
+                     *(f'{p.id}@{p.updated_at.isoformat() if p.updated_at else ""}{image_version(p.featured_image)}'
+                       for p in posts.items))
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    tag_page('index', *(f'post:{p.id}' for p in posts.items), *(f'author:{p.user_id}' for p in posts.items))
+    return set_cache_headers(make_response(render_template('index.html', posts=posts)), etag, last_modified)
 
 @app.route('/post/<slug>')
+@cache_page
+@query_budget(5)
 def post(slug):
     """Display individual blog post."""
     # Allow admins to view all posts, and users to view their own posts regardless of status
     if current_user.is_authenticated:
         if current_user.is_admin:
             # Admin can view all posts
-            post = Post.query.filter_by(slug=slug).first_or_404()
+            post = post_page_query().filter_by(slug=slug).first_or_404()
         else:
             # Regular users can view published posts or their own posts
-            post = Post.query.filter_by(slug=slug).first_or_404()
+            post = post_page_query().filter_by(slug=slug).first_or_404()
             if post.status != 'published' and post.user_id != current_user.id:
                 abort(404)  # User can't view other users' draft/archived posts
     else:
         # Non-authenticated users can only see published posts
-        post = Post.query.filter_by(slug=slug, status='published').first_or_404()
-    return render_template('post.html', post=post)
+        post = post_page_query().filter_by(slug=slug, status='published').first_or_404()
+    ensure_rendered(post)
+    related = related_posts(post)
+    etag = page_etag('post', post.id, post.render_version, post.updated_at.isoformat() if post.updated_at else '',
+                     image_version(post.featured_image),
+                     *(f'{p.id}@{p.updated_at.isoformat() if p.updated_at else ""}' for p in related))
+    # The related posts are part of the page, so their edits count as modifications too
+    last_modified = max((p.updated_at for p in (post, *related) if p.updated_at), default=None)
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    tag_page(f'post:{post.id}', f'author:{post.user_id}', *(f'tag:{tag.id}' for tag in post.tags),
+             *(f'post:{p.id}' for p in related))
+    return set_cache_headers(make_response(render_template('post.html', post=post, related=related)),
+                             etag, last_modified)
+
+@app.route('/media/<path:filename>')
+def media(filename):
+    """Serve an uploaded image; content-hash names never change so they are cached forever."""
+    if HASHED_UPLOAD_RE.match(filename):
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+
+@app.route('/static/dist/<path:filename>')
+def built_asset(filename):
+    """Serve a fingerprinted asset, precompressed with brotli or gzip when the client accepts it."""
+    if filename == 'manifest.json':
+        abort(404)
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(ASSET_DIST_DIR, filename + suffix)):
+            response = send_from_directory(ASSET_DIST_DIR, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = send_from_directory(ASSET_DIST_DIR, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/search')
+@cache_page
+@query_budget(3)
+def search():
+    """Full-text search over published posts."""
+    query = request.args.get('q', '').strip()[:200]
+    cursor = request.args.get('cursor')
+    find = search_posts if search_supported() else search_posts_by_title
+    results = find(query, cursor, per_page=app.config['SEARCH_RESULTS_PER_PAGE'])
+    tag_page('search')
+    return set_cache_headers(make_response(render_template('search.html', query=query, results=results)))
+
+@app.route('/tags')
+@cache_page
+@query_budget(1)
+def tag_index():
+    """Tag cloud of every tag with published posts."""
+    cloud = tag_cloud()
+    etag = page_etag('tags', *(f'{name}:{count}' for name, count, _ in cloud))
+    response = not_modified(etag, None)
+    if response is not None:
+        return response
+    tag_page('tags')
+    return set_cache_headers(make_response(render_template('tags.html', cloud=cloud)), etag)
+
+@app.route('/tag/<name>')
+@cache_page
+@query_budget(3)
+def tag_posts(name):
+    """Published posts carrying a tag, newest first."""
+    tag = Tag.query.filter_by(name=name).first_or_404()
+    cursor = request.args.get('cursor')
+    query = (Post.query.options(db.joinedload(Post.author)).join(post_tags, post_tags.c.post_id == Post.id)
+             .filter(post_tags.c.tag_id == tag.id, Post.status == 'published'))
+    posts = keyset_paginate(query, Post, cursor, per_page=app.config['POSTS_PER_PAGE'], total=tag.post_count)
+    last_modified = max((p.updated_at for p in posts.items if p.updated_at), default=None)
+    etag = page_etag('tag', tag.id, cursor, posts.has_prev, posts.has_next, tag.post_count,
+                     *(f'{p.id}@{p.updated_at.isoformat() if p.updated_at else ""}{image_version(p.featured_image)}'
+                       for p in posts.items))
+    response = not_modified(etag, last_modified)
+    if response is not None:
+        return response
+    tag_page(f'tag:{tag.id}', *(f'post:{p.id}' for p in posts.items), *(f'author:{p.user_id}' for p in posts.items))
+    return set_cache_headers(make_response(render_template('tag.html', tag=tag, posts=posts)), etag, last_modified)
+
+@app.route('/feed.xml')
+def rss_feed():
+    """RSS 2.0 feed of the newest published posts."""
+    return cached_document('rss', 'application/rss+xml; charset=utf-8', ['feeds'], build_rss)
+
+@app.route('/atom.xml')
+def atom_feed():
+    """Atom feed of the newest published posts."""
+    return cached_document('atom', 'application/atom+xml; charset=utf-8', ['feeds'], build_atom)
+
+@app.route('/sitemap.xml')
+def sitemap():
+    """Sitemap of the public pages, or an index of sitemap chunks for large blogs."""
+    return cached_document('sitemap', 'application/xml; charset=utf-8', ['sitemap'], build_sitemap)
+
+@app.route('/sitemap-<int:number>.xml')
+def sitemap_chunk(number):
+    """One chunk of the sitemap index; chunks past the last one are not found (chunk 1 always is)."""
+    if number < 1:
+        abort(404)
+
+    def build():
+        # Checked on a cache miss only; a 404 is never cached
+        last_id = db.session.query(db.func.max(Post.id)).filter(Post.status == 'published').scalar()
+        if number > (sitemap_chunk_number(last_id) if last_id else 1):
+            abort(404)
+        return build_urlset(number)
+
+    return cached_document(f'sitemap:{number}', 'application/xml; charset=utf-8', [f'sitemap:{number}'], build)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -222,13 +3300,26 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
+        retry_after = throttle_login(username)
+        if retry_after:
+            login_attempts.inc(result='throttled')
+            flash('Too many login attempts. Please wait a moment and try again.', 'error')
+            response = make_response(render_template('login.html'), 429)
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response
+
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
+            login_attempts.inc(result='success')
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
             flash('Successfully logged in!', 'success')
             return redirect(url_for('dashboard'))
         else:
+            login_attempts.inc(result='failure')
             flash('Invalid username or password.', 'error')
     
     return render_template('login.html')
@@ -274,16 +3365,24 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@query_budget(4)
 def dashboard():
     """User dashboard for managing posts."""
+    cursor = request.args.get('cursor')
     if current_user.is_admin:
         # Admin can see all posts from all users
-        all_posts = Post.query.order_by(Post.created_at.desc()).all()
-        return render_template('dashboard.html', posts=all_posts, is_admin=True)
+        query = Post.query.options(db.joinedload(Post.author))
+        scope = []
     else:
         # Regular users see only their own posts
-        user_posts = Post.query.filter_by(user_id=current_user.id).order_by(Post.created_at.desc()).all()
-        return render_template('dashboard.html', posts=user_posts, is_admin=False)
+        query = Post.query.filter_by(user_id=current_user.id)
+        scope = [Post.user_id == current_user.id]
+    page = keyset_paginate(query, Post, cursor, per_page=app.config['ADMIN_ROWS_PER_PAGE'])
+    status_counts = count_cache.get(
+        f"post-status:{'all' if current_user.is_admin else current_user.id}",
+        lambda: count_by(Post.status, *scope))
+    return render_template('dashboard.html', posts=page.items, page=page, is_admin=current_user.is_admin,
+                           status_counts=status_counts, total_posts=sum(status_counts.values()))
 
 @app.route('/post/new', methods=['GET', 'POST'])
 @login_required
@@ -294,6 +3393,9 @@ def new_post():
         content = request.form.get('content')
         excerpt = request.form.get('excerpt')
         status = request.form.get('status', 'draft')
+        content_format = request.form.get('content_format', 'html')
+        if content_format not in CONTENT_FORMATS:
+            content_format = 'html'
         
         if not title or not content:
             flash('Title and content are required.', 'error')
@@ -306,23 +3408,31 @@ def new_post():
         
         post = Post(
             title=title,
-            content=sanitize_html(content),
+            content=clean_post_content(content, content_format),
+            content_format=content_format,
             excerpt=excerpt,
             slug=slug,
             status=status,
             user_id=current_user.id
         )
+        apply_rendered_content(post)
         
         # Handle file upload
         if 'featured_image' in request.files:
             file = request.files['featured_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                post.featured_image = filename
+                post.featured_image = store_upload(file)
         
         db.session.add(post)
+        changed_tags = retag_post(post, parse_tag_names(request.form.get('tags')), was_published=False)
+        db.session.flush()
+        index_posts([post])
+        if post.featured_image:
+            enqueue('process_image', {'filename': post.featured_image, 'post_id': post.id},
+                    key=f'process_image:{post.featured_image}:{post.id}')
         db.session.commit()
+        published = post.status == 'published'
+        post_changed(post.id, listing_changed=published, published=published, tag_ids=changed_tags)
         
         flash('Post created successfully!', 'success')
         return redirect(url_for('dashboard'))
@@ -343,26 +3453,38 @@ def edit_post(post_id):
         content = request.form.get('content')
         excerpt = request.form.get('excerpt')
         status = request.form.get('status')
+        content_format = request.form.get('content_format', post.content_format)
+        if content_format not in CONTENT_FORMATS:
+            content_format = 'html'
         
         if not title or not content:
             flash('Title and content are required.', 'error')
             return render_template('edit_post.html', post=post)
         
+        was_published = post.status == 'published'
         post.title = title
-        post.content = sanitize_html(content)
+        post.content = clean_post_content(content, content_format)
+        post.content_format = content_format
         post.excerpt = excerpt
         post.status = status
         post.updated_at = datetime.utcnow()
+        apply_rendered_content(post)
+        changed_tags = retag_post(post, parse_tag_names(request.form.get('tags')), was_published)
         
         # Handle file upload
+        uploaded = None
         if 'featured_image' in request.files:
             file = request.files['featured_image']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                post.featured_image = filename
+                uploaded = post.featured_image = store_upload(file)
         
+        index_posts([post])
+        if uploaded:
+            enqueue('process_image', {'filename': uploaded, 'post_id': post.id},
+                    key=f'process_image:{uploaded}:{post.id}')
         db.session.commit()
+        post_changed(post.id, listing_changed=was_published != (post.status == 'published'),
+                     published=was_published or post.status == 'published', tag_ids=changed_tags)
         flash('Post updated successfully!', 'success')
         return redirect(url_for('dashboard'))
     
@@ -381,17 +3503,48 @@ def delete_post(post_id):
         # Store post title for flash message
         post_title = post.title
         
-        db.session.delete(post)
-        db.session.commit()
+        delete_posts(Post.id == post_id)
         
         flash(f'Post "{post_title}" deleted successfully!', 'success')
         return redirect(url_for('dashboard'))
         
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Deleting post %s failed', post_id)
         db.session.rollback()
         flash('Error deleting post. Please try again.', 'error')
         return redirect(url_for('dashboard'))
 
+@app.route('/dashboard/posts', methods=['POST'])
+@login_required
+def bulk_posts():
+    """Delete, publish, archive or unpublish the selected posts in batches."""
+    actions = {'delete': 'Deleted', 'published': 'Published', 'archived': 'Archived', 'draft': 'Moved to drafts'}
+    action = request.form.get('action')
+    if action not in actions:
+        abort(400)
+    post_ids = selected_ids('post_ids')
+    cursor = request.form.get('cursor') or None
+    if not post_ids:
+        flash('No posts selected.', 'info')
+        return redirect(url_for('dashboard', cursor=cursor))
+
+    # Authors act on their own posts only; other ids are silently left alone
+    criteria = [Post.id.in_(post_ids)]
+    if not current_user.is_admin:
+        criteria.append(Post.user_id == current_user.id)
+    try:
+        changed = delete_posts(*criteria) if action == 'delete' else set_post_status(action, *criteria)
+        flash(f"{actions[action]} {changed} post{'' if changed == 1 else 's'}.", 'success')
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Bulk %s of %d posts failed', action, len(post_ids))
+        db.session.rollback()
+        flash('Error updating posts. Please try again.', 'error')
+    return redirect(url_for('dashboard', cursor=cursor))
+
 @app.route('/about')
 def about():
     """About page."""
@@ -408,20 +3561,25 @@ def contact():
         message = request.form.get('message')
         
         if not all([first_name, last_name, email, subject, message]):
+            contact_submissions.inc(result='invalid')
             flash('All fields are required.', 'error')
             return render_template('contact.html')
-        
-        # Create new contact submission
-        contact = Contact(
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-            subject=subject,
-            message=message
-        )
-        
-        db.session.add(contact)
-        db.session.commit()
+
+        retry_after = throttle_contact(email)
+        if retry_after:
+            contact_submissions.inc(result='throttled')
+            flash('Too many messages. Please wait a moment and try again.', 'error')
+            response = make_response(render_template('contact.html'), 429)
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response
+
+        # A repeated message gets the same answer as the first, so resubmitting or a bot learns nothing
+        digest = contact_hash(email, subject, message)
+        if is_duplicate_contact(digest):
+            contact_submissions.inc(result='duplicate')
+        else:
+            save_contact(first_name, last_name, email, subject, message, digest)
+            contact_submissions.inc(result='accepted')
         
         flash('Thank you for your message! We will get back to you soon.', 'success')
         return redirect(url_for('contact'))
@@ -430,23 +3588,98 @@ def contact():
 
 @app.route('/admin/contacts')
 @login_required
+@query_budget(4)
 def admin_contacts():
     """Admin page to view contact form submissions."""
     if not current_user.is_admin:
         abort(403)
     
-    contacts = Contact.query.order_by(Contact.created_at.desc()).all()
-    return render_template('admin_contacts.html', contacts=contacts)
+    page = keyset_paginate(Contact.query, Contact, request.args.get('cursor'),
+                           per_page=app.config['ADMIN_ROWS_PER_PAGE'],
+                           total=approximate_total('contacts', Contact.query))
+    return render_template('admin_contacts.html', contacts=page.items, page=page, summary=inbox_summary())
+
+@app.route('/admin/contacts/mark-read', methods=['POST'])
+@login_required
+def mark_contacts_read_view():
+    """Mark the selected messages, or every message, read with one UPDATE."""
+    if not current_user.is_admin:
+        abort(403)
+
+    if request.form.get('all'):
+        changed = mark_contacts_read()
+    else:
+        contact_ids = selected_ids('contact_ids')
+        changed = mark_contacts_read(Contact.id.in_(contact_ids)) if contact_ids else 0
+    if changed:
+        db.session.commit()
+        count_cache.invalidate('inbox')
+    flash(f"Marked {changed} message{'' if changed == 1 else 's'} as read.", 'success')
+    return redirect(url_for('admin_contacts', cursor=request.form.get('cursor') or None))
+
+@app.route('/admin/contacts/delete', methods=['POST'])
+@login_required
+def delete_contacts_view():
+    """Delete the selected messages and their replies in batches."""
+    if not current_user.is_admin:
+        abort(403)
+
+    contact_ids = selected_ids('contact_ids')
+    try:
+        deleted = delete_contacts(Contact.id.in_(contact_ids)) if contact_ids else 0
+        flash(f"Deleted {deleted} message{'' if deleted == 1 else 's'}.", 'success')
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Deleting %d contact messages failed', len(contact_ids))
+        db.session.rollback()
+        flash('Error deleting contact messages. Please try again.', 'error')
+    return redirect(url_for('admin_contacts', cursor=request.form.get('cursor') or None))
+
+@app.route('/admin/inbox/summary')
+@login_required
+@query_budget(3)
+def inbox_summary_view():
+    """Unread count for the navbar badge; revalidated with an ETag on every page load."""
+    if not current_user.is_admin:
+        abort(403)
+
+    summary = inbox_summary()
+    response = jsonify(summary)
+    response.set_etag(page_etag('inbox', summary['unread'], summary['latest_at']))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 @app.route('/admin/users')
 @login_required
+@query_budget(6)
 def admin_users():
     """Admin page to view all users in the system."""
     if not current_user.is_admin:
         abort(403)
     
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('admin_users.html', users=users)
+    page = keyset_paginate(User.query, User, request.args.get('cursor'),
+                           per_page=app.config['ADMIN_ROWS_PER_PAGE'])
+    post_counts = count_by(Post.user_id, Post.user_id.in_([user.id for user in page.items]))
+    return render_template('admin_users.html', users=page.items, page=page, post_counts=post_counts,
+                           user_stats=count_cache.get('user-stats', compute_user_stats))
+
+@app.route('/admin/export/<kind>.<fmt>')
+@login_required
+def admin_export(kind, fmt):
+    """Stream users, posts or contacts as CSV or JSON Lines."""
+    if not current_user.is_admin:
+        abort(403)
+    if kind not in DATA_EXPORTS or fmt not in DATA_EXPORT_FORMATS:
+        abort(404)
+    since, until, after = parse_export_filters(request.args)
+    columns = DATA_EXPORTS[kind][1] + (('replies',) if kind == 'contacts' else ())
+    body = format_export(export_batches(kind, since, until, after), fmt, columns)
+    response = app.response_class(stream_with_context(body), mimetype=DATA_EXPORT_FORMATS[fmt])
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
 
 @app.route('/admin/users/<int:user_id>/delete', methods=['POST'])
 @login_required
@@ -462,42 +3695,57 @@ def delete_user(user_id):
         return redirect(url_for('admin_users'))
 
     try:
-        # Delete replies authored by this user (as admin replies)
-        Reply.query.filter_by(admin_id=user.id).delete(synchronize_session=False)
-
-        # Delete user's posts (and optionally their uploaded images)
-        user_posts = Post.query.filter_by(user_id=user.id).all()
-        for post in user_posts:
-            if post.featured_image:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], post.featured_image)
-                try:
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-                except Exception:
-                    pass
-            db.session.delete(post)
-
-        # Finally delete the user
-        db.session.delete(user)
-        db.session.commit()
-
+        # Replies, posts (a job removes their images unless another post shares them), then the user
+        delete_users(User.id == user.id)
         flash('User and all related data deleted successfully.', 'success')
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Deleting user %s failed', user_id)
         db.session.rollback()
         flash('Error deleting user. Please try again.', 'error')
 
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/users/delete', methods=['POST'])
+@login_required
+def delete_users_view():
+    """Delete the selected non-admin users and their related data in batches."""
+    if not current_user.is_admin:
+        abort(403)
+
+    user_ids = selected_ids('user_ids')
+    try:
+        # Admins are never deleted, even when selected
+        deleted = delete_users(User.id.in_(user_ids)) if user_ids else 0
+        flash(f"Deleted {deleted} user{'' if deleted == 1 else 's'} and their related data.", 'success')
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Deleting %d users failed', len(user_ids))
+        db.session.rollback()
+        flash('Error deleting users. Please try again.', 'error')
+    return redirect(url_for('admin_users', cursor=request.form.get('cursor') or None))
+
 @app.route('/admin/contact/<int:contact_id>')
 @login_required
+@query_budget(6)
 def view_contact(contact_id):
     """View individual contact message."""
     if not current_user.is_admin:
         abort(403)
 
-    contact = Contact.query.get_or_404(contact_id)
-    contact.is_read = True
-    db.session.commit()
+    # Only an unread message costs a write; mark it before loading so the
+    # commit does not expire the eagerly loaded replies. A NULL is_read, left
+    # by rows older than the column's default, is unread as in mark_contacts_read()
+    row = db.session.execute(db.select(Contact.is_read).where(Contact.id == contact_id)).first()
+    if row is None:
+        abort(404)
+    if not row.is_read and mark_contacts_read(Contact.id == contact_id):
+        commit_keeping_loaded()  # the template reads current_user
+        count_cache.invalidate('inbox')
+    contact = (Contact.query.options(db.selectinload(Contact.replies).joinedload(Reply.admin))
+               .get_or_404(contact_id))
 
     return render_template('view_contact.html', contact=contact)
 
@@ -516,17 +3764,11 @@ def reply_contact(contact_id):
             flash('Reply message is required.', 'error')
             return render_template('reply_contact.html', contact=contact)
         
-        # Create and store the reply
-        reply = Reply(
-            contact_id=contact.id,
-            admin_id=current_user.id,
-            message=reply_message
-        )
-        
-        db.session.add(reply)
+        reply = add_contact_reply(contact, current_user, reply_message)
+        enqueue('send_reply_email', {'reply_id': reply.id}, key=f'send_reply_email:{reply.id}')
         db.session.commit()
         
-        flash(f'Reply sent to {contact.email}!', 'success')
+        flash(f'Reply saved and queued for delivery to {contact.email}.', 'success')
         return redirect(url_for('view_contact', contact_id=contact_id))
     
     return render_template('reply_contact.html', contact=contact)
@@ -545,25 +3787,110 @@ def delete_contact(contact_id):
         contact_email = contact.email
         contact_subject = contact.subject
         
-        # Delete the contact (this will also delete associated replies due to cascade)
-        db.session.delete(contact)
-        db.session.commit()
+        # Delete the contact with its replies
+        delete_contacts(Contact.id == contact_id)
         
         flash(f'Contact message "{contact_subject}" from {contact_email} deleted successfully!', 'success')
         return redirect(url_for('admin_contacts'))
         
-    except Exception as e:
+    except HTTPException:
+        raise
+    except Exception:
+        app.logger.exception('Deleting contact message %s failed', contact_id)
         db.session.rollback()
         flash('Error deleting contact message. Please try again.', 'error')
         return redirect(url_for('admin_contacts'))
 
+@app.route('/admin/cache-stats')
+@login_required
+def cache_stats():
+    """Admin endpoint exposing page cache hit/miss counters."""
+    if not current_user.is_admin:
+        abort(403)
+
+    return jsonify(page_cache.stats())
+
+@app.route('/admin/jobs')
+@login_required
+@query_budget(3)
+def admin_jobs():
+    """Admin page listing background jobs, newest first."""
+    if not current_user.is_admin:
+        abort(403)
+
+    status = request.args.get('status')
+    query = Job.query.filter_by(status=status) if status else Job.query
+    page = keyset_paginate(query, Job, request.args.get('cursor'), per_page=app.config['ADMIN_ROWS_PER_PAGE'])
+    return render_template('admin_jobs.html', jobs=page.items, page=page, status=status,
+                           status_counts=count_by(Job.status))
+
+@app.route('/admin/jobs/<int:job_id>/retry', methods=['POST'])
+@login_required
+def retry_job(job_id):
+    """Queue a failed job again with a fresh set of attempts."""
+    if not current_user.is_admin:
+        abort(403)
+
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'failed':
+        flash('Only failed jobs can be retried.', 'error')
+    else:
+        job.status = 'queued'
+        job.attempts = 0
+        job.run_at = datetime.utcnow()
+        job.finished_at = None
+        db.session.commit()
+        job_workers.start()
+        flash(f'Job {job.id} ({job.kind}) queued again.', 'success')
+    return redirect(url_for('admin_jobs', status=request.args.get('status')))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for admins, or for scrapers sending the METRICS_TOKEN bearer token."""
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/db-stats')
+@login_required
+def db_stats():
+    """Admin endpoint exposing connection pool metrics."""
+    if not current_user.is_admin:
+        abort(403)
+
+    pool = db.engine.pool
+    stats = {
+        'dialect': db.engine.dialect.name,
+        'pool_class': type(pool).__name__,
+        'pool_status': pool.status(),
+        **pool_stats.snapshot(),
+    }
+    for attribute in ('size', 'checkedin', 'overflow'):
+        if hasattr(pool, attribute):
+            stats[f'pool_{attribute}'] = getattr(pool, attribute)()
+    if db.engine.dialect.name == 'sqlite':
+        stats['sqlite_pragmas'] = {
+            name: db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+            for name in app.config['SQLITE_PRAGMAS']
+        }
+    return jsonify(stats)
+
 @app.route('/my-messages')
 @login_required
+@query_budget(3)
 def my_messages():
     """User's own contact messages and replies."""
     # Get all contact messages from this user's email
-    user_messages = Contact.query.filter_by(email=current_user.email).order_by(Contact.created_at.desc()).all()
-    return render_template('my_messages.html', messages=user_messages)
+    query = (Contact.query.options(db.selectinload(Contact.replies).joinedload(Reply.admin))
+             .filter_by(email=current_user.email))
+    page = keyset_paginate(query, Contact, request.args.get('cursor'), per_page=app.config['ADMIN_ROWS_PER_PAGE'])
+    return render_template('my_messages.html', messages=page.items, page=page)
 
 # Error handlers
 @app.errorhandler(404)
@@ -579,41 +3906,545 @@ def internal_error(error):
 def forbidden_error(error):
     return render_template('errors/403.html'), 403
 
-# Initialize database and create admin user
-def init_db():
+# Static export
+# `flask export DIR` writes the public pages as HTML files for a static host
+# with clean URLs (/post/<slug> is post/<slug>.html, index pages are
+# page/<n>.html, tag pages tag/<name>.html and tag/<name>/page/<n>.html).
+# Pages are requested through the app as an anonymous visitor, so they match
+# what the dynamic site serves. DIR/export-manifest.json keeps
+# each file's ETag and version: later runs skip posts whose version is
+# unchanged, send conditional requests for every other page, and delete files
+# of pages that no longer exist.
+EXPORT_MANIFEST = 'export-manifest.json'
+EXPORT_SOURCES = []
+
+# path is requested from the app and written to output; pages with an unchanged
+# version are not requested at all; links maps URLs in the page to static URLs
+ExportPage = namedtuple('ExportPage', 'path output version links', defaults=(None, None))
+
+def export_source(func):
+    """Register a generator of ExportPage items for `flask export`."""
+    EXPORT_SOURCES.append(func)
+    return func
+
+def listing_export_pages(query, endpoint, output, **values):
+    """Pages of a post listing, following the same keyset cursors as its Older/Newer links.
+
+    ``output`` is the file of the first page; page n is written next to it
+    as <output without .html>/page/<n>.html (index.html uses page/<n>.html).
+    """
+    per_page = app.config['POSTS_PER_PAGE']
+    rows = query.with_entities(Post.created_at, Post.id).order_by(Post.created_at.desc(), Post.id.desc())
+    pages, current = [], []
+    for row in rows.yield_per(1000):
+        current.append(row)
+        if len(current) == per_page:
+            pages.append(current)
+            current = []
+    if current or not pages:
+        pages.append(current)
+
+    first_path = url_for(endpoint, **values)
+    prefix = '' if output == 'index.html' else output[:-len('.html')] + '/'
+
+    def static_path(number):
+        return first_path if number == 1 else f"{first_path.rstrip('/')}/page/{number}"
+
+    for number, items in enumerate(pages, start=1):
+        links = {}
+        if number < len(pages):
+            links[url_for(endpoint, cursor=encode_cursor(items[-1], 'next'), **values)] = static_path(number + 1)
+        if number > 1:
+            links[url_for(endpoint, cursor=encode_cursor(items[0], 'prev'), **values)] = static_path(number - 1)
+        path = first_path if number == 1 else url_for(endpoint, cursor=encode_cursor(pages[number - 2][-1], 'next'),
+                                                      **values)
+        yield ExportPage(path, output if number == 1 else f'{prefix}page/{number}.html', links=links)
+
+@export_source
+def export_index_pages():
+    """Every home page."""
+    yield from listing_export_pages(Post.query.filter_by(status='published'), 'index', 'index.html')
+
+@export_source
+def export_post_pages():
+    rows = (db.session.query(Post.slug, Post.updated_at, Post.featured_image).filter_by(status='published')
+            .order_by(Post.id).yield_per(1000))
+    for slug, updated_at, featured_image in rows:
+        version = f"{updated_at.isoformat() if updated_at else ''}:{image_version(featured_image)}"
+        yield ExportPage(url_for('post', slug=slug), f'post/{slug}.html', version)
+
+@export_source
+def export_static_pages():
+    yield ExportPage(url_for('about'), 'about.html')
+
+@export_source
+def export_tag_pages():
+    """The tag cloud and every page of every tag with published posts."""
+    yield ExportPage(url_for('tag_index'), 'tags.html')
+    tags = db.session.execute(db.select(Tag.id, Tag.name).where(Tag.post_count > 0).order_by(Tag.name)).all()
+    for tag_id, name in tags:
+        query = (Post.query.join(post_tags, post_tags.c.post_id == Post.id)
+                 .filter(post_tags.c.tag_id == tag_id, Post.status == 'published'))
+        yield from listing_export_pages(query, 'tag_posts', f'tag/{name}.html', name=name)
+
+@export_source
+def export_feeds():
+    """Feeds and sitemap files; set SITE_URL so their links point at the public host."""
+    yield ExportPage(url_for('rss_feed'), 'feed.xml')
+    yield ExportPage(url_for('atom_feed'), 'atom.xml')
+    yield ExportPage(url_for('sitemap'), 'sitemap.xml')
+    chunks = sitemap_chunks()
+    if len(chunks) > 1:
+        for number, _ in chunks:
+            yield ExportPage(url_for('sitemap_chunk', number=number), f'sitemap-{number}.xml')
+
+def init_export_worker():
+    # Forked workers must not reuse the parent's pooled connections
+    db.engine.dispose(close=False)
+    app.config['PAGE_CACHE_ENABLED'] = False
+
+def export_page(directory, page, etag):
+    """Render one page into ``directory``; returns (output, etag, written)."""
+    headers = {'If-None-Match': etag} if etag else {}
+    response = app.test_client().get(page.path, headers=headers)
+    if response.status_code == 304:
+        return page.output, etag, False
+    if response.status_code != 200:
+        raise RuntimeError(f'{page.path} returned {response.status_code}')
+    body = response.get_data(as_text=True)
+    for url, static_path in (page.links or {}).items():
+        body = body.replace(f'href="{url}"', f'href="{static_path}"')
+    path = os.path.join(directory, page.output)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return page.output, response.headers.get('ETag'), True
+
+def export_worker_task(args):
+    with app.app_context():
+        return export_page(*args)
+
+def copy_missing_files(source, destination):
+    """Copy files that ``destination`` lacks; both asset builds and uploads use immutable names."""
+    copied = 0
+    for root, _, files in os.walk(source):
+        for name in files:
+            if name.startswith('.'):
+                continue
+            target = os.path.join(destination, os.path.relpath(os.path.join(root, name), source))
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(os.path.join(root, name), target)
+                copied += 1
+    return copied
+
+def copy_asset_sources(destination):
+    """Copy the source files of bundles that were never built, which pages then link one by one.
+
+    Unlike built bundles, sources keep their names when edited, so a copy
+    whose content differs is replaced too. Vendor files stay on their CDN.
+    """
+    copied = 0
+    for bundle, sources in ASSET_BUNDLES.items():
+        if bundle in asset_manifest:
+            continue
+        for source in sources:
+            if source in VENDOR_ASSETS:
+                continue
+            path = os.path.join(app.static_folder, source)
+            target = os.path.join(destination, source)
+            if not os.path.exists(target) or not filecmp.cmp(path, target, shallow=False):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copy2(path, target)
+                copied += 1
+    return copied
+
+def export_site(directory, workers=1, full=False):
+    """Export every registered page into ``directory``; returns (written, unchanged, removed)."""
+    manifest_path = os.path.join(directory, EXPORT_MANIFEST)
     try:
+        with open(manifest_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    # A template or renderer change alters every page, so post versions cannot be trusted
+    if full or previous.get('template_version') != template_version() or previous.get('render_version') != RENDER_VERSION:
+        previous = {}
+    old_files = previous.get('files', {})
+
+    files, tasks = {}, []
+    with app.test_request_context():
+        for source in EXPORT_SOURCES:
+            for page in source():
+                old = old_files.get(page.output, {})
+                if page.version is not None and old.get('version') == page.version:
+                    files[page.output] = old
+                    continue
+                files[page.output] = {'version': page.version}
+                tasks.append((directory, page, old.get('etag')))
+    unchanged = len(files) - len(tasks)
+
+    if workers > 1 and len(tasks) > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        db.session.remove()
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_export_worker) as pool:
+            results = list(pool.map(export_worker_task, tasks, chunksize=max(1, min(64, len(tasks) // (workers * 4)))))
+    else:
+        page_cache_enabled = app.config['PAGE_CACHE_ENABLED']
+        app.config['PAGE_CACHE_ENABLED'] = False
+        try:
+            results = [export_worker_task(task) for task in tasks]
+        finally:
+            app.config['PAGE_CACHE_ENABLED'] = page_cache_enabled
+    written = 0
+    for output, etag, changed in results:
+        files[output]['etag'] = etag
+        written += changed
+    unchanged += len(results) - written
+
+    removed = 0
+    for output in old_files.keys() - files.keys():
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(directory, output))
+            removed += 1
+
+    copy_missing_files(ASSET_DIST_DIR, os.path.join(directory, 'static', 'dist'))
+    copy_asset_sources(os.path.join(directory, 'static'))
+    copy_missing_files(app.config['UPLOAD_FOLDER'], os.path.join(directory, 'media'))
+    os.makedirs(directory, exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump({'template_version': template_version(), 'render_version': RENDER_VERSION, 'files': files}, f)
+    return written, unchanged, removed
+
+# Command line tools
+@app.cli.command('render-posts')
+@click.option('--batch-size', default=200, show_default=True, help='Posts rendered per transaction.')
+@click.option('--force', is_flag=True, help='Re-render posts that are already current.')
+def render_posts_command(batch_size, force):
+    """Re-render stored posts in batches after a renderer or allow-list change."""
+    last_id = 0
+    rendered = 0
+    while True:
+        query = Post.query.filter(Post.id > last_id)
+        if not force:
+            query = query.filter(db.or_(Post.render_version.is_(None), Post.render_version != RENDER_VERSION))
+        batch = query.order_by(Post.id).limit(batch_size).all()
+        if not batch:
+            break
+        for post in batch:
+            fields = render_post_content(post.content, post.content_format)
+            db.session.execute(db.update(Post).where(Post.id == post.id).values(updated_at=post.updated_at, **fields))
+        db.session.commit()
+        page_cache.invalidate(*(f'post:{post.id}' for post in batch))
+        last_id = batch[-1].id
+        rendered += len(batch)
+        db.session.expunge_all()
+        click.echo(f'Rendered {rendered} posts (last id {last_id})')
+    click.echo(f'Done: {rendered} posts rendered with version {RENDER_VERSION}.')
+
+@app.cli.command('search-reindex')
+@click.option('--batch-size', default=500, show_default=True, help='Posts read per query.')
+def search_reindex_command(batch_size):
+    """Rebuild the full-text search index from the post table."""
+    if not search_supported():
+        click.echo('Full-text search needs SQLite FTS5; nothing to rebuild on this database.')
+        return
+    indexed = rebuild_search_index(batch_size)
+    db.session.commit()
+    page_cache.invalidate('search')
+    click.echo(f'Indexed {indexed} published posts.')
+
+@app.cli.command('tags-recount')
+def tags_recount_command():
+    """Recompute the published post count of every tag."""
+    recount_tags()
+    db.session.commit()
+    tag_ids = db.session.scalars(db.select(Tag.id)).all()
+    page_cache.invalidate('tags', 'related', *(f'tag:{tag_id}' for tag_id in tag_ids))
+    click.echo(f'Recounted {len(tag_ids)} tags.')
+
+@app.cli.command('contacts-recount')
+def contacts_recount_command():
+    """Recompute contact reply counts, last reply times and the unread message count."""
+    recount_contact_replies()
+    recount_unread_contacts()
+    db.session.commit()
+    count_cache.invalidate('inbox')
+    click.echo(f'{tally(UNREAD_CONTACTS)} unread messages.')
+
+@app.cli.command('assets-build')
+@click.option('--refetch', is_flag=True, help='Download vendor files again even if assets/vendor has them.')
+def assets_build_command(refetch):
+    """Vendor third-party assets, then bundle, minify, fingerprint and precompress them into static/dist."""
+    for name in fetch_vendor_assets(force=refetch):
+        click.echo(f'Downloaded {name}')
+    manifest = build_assets()
+    for bundle in ASSET_BUNDLES:
+        path = os.path.join(ASSET_DIST_DIR, manifest[bundle])
+        sizes = [f'{os.path.getsize(path)} bytes'] + [
+            f'{suffix[1:]} {os.path.getsize(path + suffix)}' for suffix in ('.gz', '.br') if os.path.exists(path + suffix)]
+        click.echo(f"{bundle} -> {manifest[bundle]} ({', '.join(sizes)})")
+    if not module_available('brotli'):
+        click.echo('Brotli is not installed; only gzip variants were written.')
+
+@app.cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False), default='export')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Rendering processes.')
+@click.option('--full', is_flag=True, help='Ignore the previous export and render every page.')
+def export_command(directory, workers, full):
+    """Write the public pages as static HTML for a static host."""
+    started = time.perf_counter()
+    written, unchanged, removed = export_site(directory, workers, full)
+    click.echo(f'Exported to {directory} in {time.perf_counter() - started:.1f}s: '
+               f'{written} written, {unchanged} unchanged, {removed} removed.')
+
+@app.cli.command('process-images')
+@click.option('--batch-size', default=100, show_default=True, help='Posts read per query.')
+def process_images_command(batch_size):
+    """Move featured images to content-hash names and create any missing variants."""
+    if not module_available('PIL'):
+        click.echo('Pillow is not installed; image variants are disabled.')
+        return
+    folder = app.config['UPLOAD_FOLDER']
+    last_id = 0
+    processed = 0
+    while True:
+        batch = (Post.query.filter(Post.featured_image.isnot(None), Post.id > last_id)
+                 .order_by(Post.id).limit(batch_size).all())
+        if not batch:
+            break
+        for post in batch:
+            filename = post.featured_image
+            if not HASHED_UPLOAD_RE.match(filename):
+                path = os.path.join(folder, filename)
+                if not allowed_file(filename) or not os.path.exists(path):
+                    click.echo(f'Skipping post {post.id}: {filename} is missing or not an image')
+                    continue
+                # Older uploads keep their file: names were not unique, other posts may share it
+                with open(path, 'rb') as f:
+                    filename = store_upload(FileStorage(f, filename=filename))
+                db.session.execute(db.update(Post).where(Post.id == post.id)
+                                   .values(featured_image=filename, updated_at=post.updated_at))
+            try:
+                generate_image_variants(filename)
+            except Exception as e:
+                click.echo(f'Skipping post {post.id}: {e}')
+                continue
+            processed += 1
+        db.session.commit()
+        page_cache.invalidate(*(f'post:{post.id}' for post in batch))
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    click.echo(f'Processed images of {processed} posts.')
+
+@app.cli.command('worker')
+@click.option('--threads', default=1, show_default=True, help='Jobs run concurrently by this process.')
+@click.option('--poll-interval', type=float, default=None, help='Seconds between polls when idle.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due now and exit.')
+def worker_command(threads, poll_interval, once):
+    """Run background jobs from the job table."""
+    if app.config['AUTO_MIGRATE']:
+        ensure_bootstrapped()
+    if not app.config['PAGE_CACHE_DIR']:
+        # Image jobs invalidate the pages of their posts in the web workers' directory
+        page_cache.share(FileSystemCacheBackend(default_page_cache_dir(), app.config['PAGE_CACHE_DIR_MAX_ENTRIES']))
+    base_name = f'{socket.gethostname()}:{os.getpid()}'
+    if once:
         with app.app_context():
-            db.create_all()
+            requeue_stale_jobs()
+        click.echo(f'Ran {work_off(base_name)} job(s).')
+        return
+    stop = threading.Event()
+    workers = [threading.Thread(target=run_worker, args=(f'{base_name}:{n}', stop, poll_interval),
+                                name=f'job-worker-{n}') for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    click.echo(f'Job worker started with {threads} thread(s); Ctrl+C to stop.')
+    try:
+        while any(thread.is_alive() for thread in workers):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        click.echo('Stopping after the running jobs finish...')
+        stop.set()
+        for thread in workers:
+            thread.join()
 
-            # Create admin user only if explicit secrets are provided via environment
-            default_admin_username = os.environ.get('ADMIN_USERNAME')
-            default_admin_email = os.environ.get('ADMIN_EMAIL')
-            default_admin_password = os.environ.get('ADMIN_PASSWORD')
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables, apply pending schema migrations and create the ADMIN_* account."""
+    applied = upgrade_schema()
+    create_admin_from_env()
+    click.echo(f'Applied {len(applied)} migration(s); schema is at version {max(MIGRATIONS)}.')
 
-            if not all([default_admin_username, default_admin_email, default_admin_password]):
-                print("ADMIN_* environment variables not set. Skipping default admin creation.")
-                return
+# Schema migrations
+MIGRATIONS = {}
 
-            admin = User.query.filter_by(username=default_admin_username).first()
-            if not admin:
-                admin = User(
-                    username=default_admin_username,
-                    email=default_admin_email,
-                    first_name='Admin',
-                    last_name='User',
-                    is_admin=True
-                )
-                admin.set_password(default_admin_password)
-                db.session.add(admin)
-                db.session.commit()
-                print("Admin user created from environment variables")
-            else:
-                print("Admin user already exists")
-    except Exception as e:
-        print(f"Database initialization error: {e}")
+def migration(version, description):
+    """Register a schema migration; versions are applied once, in ascending order."""
+    def decorator(func):
+        MIGRATIONS[version] = (description, func)
+        return func
+    return decorator
+
+def add_column_if_missing(column):
+    """ALTER TABLE ... ADD COLUMN for a model column the database does not have yet."""
+    table = column.table
+    existing = {c['name'] for c in db.inspect(db.session.connection()).get_columns(table.name)}
+    if column.name in existing:
+        return
+    preparer = db.engine.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    db.session.execute(db.text(
+        f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}'))
+
+def create_indexes_if_missing(*names):
+    """CREATE INDEX for the named model indexes the database does not have yet.
+
+    Migrations name their indexes explicitly: the models keep gaining indexes
+    on columns that only a later migration adds.
+    """
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(db.session.connection(), checkfirst=True)
+
+@migration(1, 'Add render cache columns to post')
+def add_post_render_columns():
+    for name in ('content_format', 'rendered_html', 'render_version', 'word_count',
+                 'reading_time', 'auto_excerpt', 'toc'):
+        add_column_if_missing(Post.__table__.c[name])
+
+@migration(2, 'Add indexes for hot filter and ordering columns')
+def add_hot_path_indexes():
+    create_indexes_if_missing('ix_post_published_recent', 'ix_post_user_recent', 'ix_post_recent',
+                              'ix_post_tags_tag_id', 'ix_contact_email_recent', 'ix_contact_recent',
+                              'ix_reply_contact_id', 'ix_reply_admin_id', 'ix_user_recent')
+
+@migration(3, 'Build full-text search index for posts')
+def build_post_search_index():
+    # The FTS5 table itself comes from create_all(); fill it from existing posts
+    if search_supported():
+        rebuild_search_index()
+
+@migration(4, 'Add job queue and reply delivery time')
+def add_job_queue():
+    # The job table and its indexes come from create_all()
+    add_column_if_missing(Reply.__table__.c.sent_at)
+
+@migration(5, 'Add denormalized published post counts to tag')
+def add_tag_post_counts():
+    add_column_if_missing(Tag.__table__.c.post_count)
+    recount_tags()
+
+@migration(6, 'Add content hash to contact for duplicate detection')
+def add_contact_content_hash():
+    # Existing messages keep a NULL hash and are never treated as duplicates
+    add_column_if_missing(Contact.__table__.c.content_hash)
+    create_indexes_if_missing('ix_contact_content_hash')
+
+@migration(7, 'Add inbox counters: contact reply count, last reply time and unread tally')
+def add_inbox_counters():
+    # The tally table and its unread_contacts row come from create_all()
+    add_column_if_missing(Contact.__table__.c.reply_count)
+    add_column_if_missing(Contact.__table__.c.last_reply_at)
+    recount_contact_replies()
+    recount_unread_contacts()
+
+@migration(8, 'Add updated_at to user for template fragment cache keys')
+def add_user_updated_at():
+    add_column_if_missing(User.__table__.c.updated_at)
+    db.session.execute(db.update(User).values(updated_at=User.created_at).execution_options(synchronize_session=False))
+
+def upgrade_schema():
+    """Bring the database schema up to date in place and return the applied versions.
+
+    A brand new database gets the full schema from ``db.create_all()`` and is
+    stamped with every version; an existing one runs only the migrations it
+    has not recorded yet, each in its own transaction.
+    """
+    fresh = not db.inspect(db.engine).has_table('post')
+    db.create_all()
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    newly_applied = []
+    for version in sorted(MIGRATIONS):
+        if version in applied:
+            continue
+        description, apply = MIGRATIONS[version]
+        if not fresh:
+            apply()
+        db.session.add(SchemaMigration(version=version, description=description))
+        db.session.commit()
+        newly_applied.append(version)
+        if not fresh:
+            click.echo(f"Applied schema migration {version}: {description}")
+    return newly_applied
+
+def create_admin_from_env():
+    """Create the admin account named by the ADMIN_* environment variables if it does not exist."""
+    default_admin_username = os.environ.get('ADMIN_USERNAME')
+    default_admin_email = os.environ.get('ADMIN_EMAIL')
+    default_admin_password = os.environ.get('ADMIN_PASSWORD')
+
+    if not all([default_admin_username, default_admin_email, default_admin_password]):
+        click.echo("ADMIN_* environment variables not set. Skipping default admin creation.")
+        return
+
+    admin = User.query.filter_by(username=default_admin_username).first()
+    if not admin:
+        admin = User(
+            username=default_admin_username,
+            email=default_admin_email,
+            first_name='Admin',
+            last_name='User',
+            is_admin=True
+        )
+        admin.set_password(default_admin_password)
+        db.session.add(admin)
+        db.session.commit()
+        click.echo("Admin user created from environment variables")
+    else:
+        click.echo("Admin user already exists")
+
+# Bootstrap
+# Importing the module no longer touches the database, so gunicorn workers and
+# serverless cold starts do not each run create_all() and an admin lookup.
+# Deploys run `flask db-upgrade`; with AUTO_MIGRATE on, the first request of a
+# process also checks the recorded schema version (one query) and bootstraps
+# a database that is missing migrations, such as a brand new one.
+_bootstrap_lock = threading.Lock()
+_bootstrapped = False
+
+def schema_is_current():
+    """Whether the database has recorded the newest migration."""
+    try:
+        latest = db.session.scalar(db.select(db.func.max(SchemaMigration.version)))
+    except DatabaseError:
+        db.session.rollback()  # no schema_migration table yet
+        return False
+    return latest == max(MIGRATIONS)
+
+def ensure_bootstrapped():
+    """Upgrade the schema and create the ADMIN_* account once per process if migrations are missing."""
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        # A context of its own keeps these queries out of the request's counts and budget
+        with app.app_context():
+            if not schema_is_current():
+                upgrade_schema()
+                create_admin_from_env()
+        _bootstrapped = True
 
-# Initialize the database
-init_db()
+@app.before_request
+def bootstrap_on_first_request():
+    if app.config['AUTO_MIGRATE']:
+        ensure_bootstrapped()
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000))) 
\ No newline at end of file
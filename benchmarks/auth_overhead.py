@@ -0,0 +1,115 @@
+"""
+Cost of authentication.
+
+Uses a throwaway SQLite database and the Flask test client to measure:
+
+- the overhead Flask-Login adds to every request of a logged-in user, with
+  the user cache disabled (a query per request) and enabled;
+- the time to verify one password for several werkzeug hash methods, the
+  candidates for PASSWORD_HASH_METHOD;
+- a burst of failed logins for an existing user from one client, with and
+  without the login throttle rejecting attempts before they are hashed.
+
+Usage:
+    python benchmarks/auth_overhead.py [--requests 2000] [--burst 100]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HASH_METHODS = ('pbkdf2:sha256:600000', 'pbkdf2:sha256:1000000', 'scrypt:16384:8:1', 'scrypt:32768:8:1')
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def load_app(database):
+    os.environ.update({'DATABASE_URL': f'sqlite:///{database}', 'SERVER_TIMING_ENABLED': 'true',
+                       'SLOW_REQUEST_MS': '0'})
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.CRITICAL)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as blog
+        with blog.app.app_context():
+            blog.upgrade_schema()
+            blog.create_admin_from_env()
+    return blog
+
+
+def measure(client, path, requests):
+    timings, queries = [], []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(int(QUERIES_RE.search(response.headers['Server-Timing']).group(1)))
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)], statistics.fmean(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per authenticated-overhead row.')
+    parser.add_argument('--burst', type=int, default=100, help='Failed logins in the throttle burst.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blog = load_app(os.path.join(tmp, 'bench.db'))
+        app = blog.app
+
+        @app.route('/bench/whoami')
+        @blog.login_required
+        def whoami():
+            return blog.current_user.username
+
+        with app.app_context():
+            user = blog.User(username='bench', email='bench@example.com', first_name='Bench', last_name='User')
+            user.set_password('password')
+            blog.db.session.add(user)
+            blog.db.session.commit()
+
+        anonymous = app.test_client()
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'password'})
+
+        print(f"{'request':<40}{'median ms':>11}{'p95 ms':>9}{'queries':>9}")
+        cached_ttl = app.config['USER_CACHE_TTL'] or 30
+        rows = [('anonymous (/about)', anonymous, '/about', 0),
+                ('logged in, USER_CACHE_TTL=0', client, '/bench/whoami', 0),
+                (f'logged in, USER_CACHE_TTL={cached_ttl}', client, '/bench/whoami', cached_ttl)]
+        for label, session, path, ttl in rows:
+            blog.user_cache.ttl = ttl
+            blog.user_cache.invalidate()
+            median, p95, queries = measure(session, path, args.requests)
+            print(f'{label:<40}{median:>11.3f}{p95:>9.3f}{queries:>9.2f}')
+
+        print(f"\n{'PASSWORD_HASH_METHOD':<40}{'verify ms':>11}")
+        for method in HASH_METHODS:
+            hashed = blog.generate_password_hash('password', method=method)
+            timings = []
+            for _ in range(5):
+                started = time.perf_counter()
+                blog.check_password_hash(hashed, 'password')
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f'{method:<40}{statistics.median(timings):>11.1f}')
+
+        print(f"\n{'failed login burst':<40}{'total s':>11}{'429s':>9}")
+        for enabled in (False, True):
+            app.config['LOGIN_THROTTLE_ENABLED'] = enabled
+            attacker = app.test_client()
+            started = time.perf_counter()
+            throttled = sum(attacker.post('/login', data={'username': 'bench', 'password': f'guess{i}'}).status_code
+                            == 429 for i in range(args.burst))
+            label = f"{args.burst} attempts, throttle {'on' if enabled else 'off'}"
+            print(f'{label:<40}{time.perf_counter() - started:>11.2f}{throttled:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Write latency of other requests while a prolific user is deleted.
+
+Seeds a throwaway SQLite database with seed_data.py and deletes the non-admin
+user with the most posts through delete_users(), while a writer thread
+inserts a contact message and commits every few milliseconds on its own
+connection, as the contact form would. Each row starts from a fresh copy of
+the seeded database:
+
+- one transaction: BULK_BATCH_SIZE larger than the user's post count, so all
+  posts, tag links and search rows go in a single transaction, as
+  delete_user did before (though with set-based statements rather than its
+  per-row ORM deletes, so the real difference was larger);
+- batches of N: the default set-based batches, committed one by one.
+
+Reports the deletion time and the latency of the concurrent writes; the
+longest write is roughly the longest time the deletion held the write lock.
+
+Usage:
+    python benchmarks/bulk_delete.py [--posts 50000] [--batch-size 500] [--write-interval 0.005]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def writer(path, interval, stop, latencies):
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    n = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("INSERT INTO contact (first_name, last_name, email, subject, message, created_at, is_read, "
+                     "reply_count) VALUES ('Bench', 'Writer', 'writer@example.com', 'Write', ?, "
+                     "datetime('now'), 0, 0)", (f'message {n}',))
+        conn.execute('COMMIT')
+        latencies.append((time.perf_counter() - started) * 1000)
+        n += 1
+        stop.wait(interval)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=50000, help='Posts in the seeded database.')
+    parser.add_argument('--batch-size', type=int, default=500, help='BULK_BATCH_SIZE of the batched row.')
+    parser.add_argument('--write-interval', type=float, default=0.005, help='Seconds between concurrent writes.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        pristine = os.path.join(tmp, 'pristine.db')
+        os.environ.update({'DATABASE_URL': f'sqlite:///{database}', 'PAGE_CACHE_ENABLED': 'false'})
+        sys.path.insert(0, ROOT)
+        logging.disable(logging.CRITICAL)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import seed_data
+            import app as blog
+            with blog.app.app_context():
+                blog.upgrade_schema()
+                with blog.db.engine.begin() as conn:
+                    seed_data.seed(conn, users=50, posts=args.posts, contacts=0, tags=100, seed_value=42)
+                blog.recount_tags()
+                blog.db.session.commit()
+                user_id, posts = blog.db.session.execute(
+                    blog.db.select(blog.Post.user_id, blog.db.func.count()).join(blog.User)
+                    .where(blog.User.is_admin.is_(False)).group_by(blog.Post.user_id)
+                    .order_by(blog.db.func.count().desc()).limit(1)).one()
+                blog.db.engine.dispose()
+        with contextlib.closing(sqlite3.connect(database)) as conn:
+            conn.execute('VACUUM INTO ?', (pristine,))  # a consistent copy, WAL included
+        with contextlib.closing(sqlite3.connect(pristine)) as conn:
+            conn.execute('PRAGMA journal_mode = WAL')  # as the app runs it; VACUUM INTO writes a rollback journal db
+
+        print(f'Deleting user {user_id} with {posts} of {args.posts} posts, '
+              f'a concurrent write every {args.write_interval * 1000:g} ms')
+        print(f"\n{'deletion':<18}{'seconds':>9}{'writes':>8}{'write p50 ms':>14}{'p95 ms':>9}{'max ms':>9}")
+        for label, batch_size in (('one transaction', posts + 1), (f'batches of {args.batch_size}', args.batch_size)):
+            for suffix in ('-wal', '-shm'):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(database + suffix)
+            shutil.copy(pristine, database)
+            blog.app.config['BULK_BATCH_SIZE'] = batch_size
+            stop = threading.Event()
+            latencies = []
+            thread = threading.Thread(target=writer, args=(database, args.write_interval, stop, latencies))
+            thread.start()
+            time.sleep(0.2)
+            started = time.perf_counter()
+            with blog.app.app_context():
+                deleted = blog.delete_users(blog.User.id == user_id)
+                blog.db.session.remove()
+                blog.db.engine.dispose()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            thread.join()
+            assert deleted == 1
+            latencies.sort()
+            print(f'{label:<18}{elapsed:>9.2f}{len(latencies):>8}{statistics.median(latencies):>14.1f}'
+                  f'{latencies[int(len(latencies) * 0.95)]:>9.1f}{latencies[-1]:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Cold start: time from a new process to its first response.
+
+Every gunicorn worker and every serverless cold start imports app.py and
+serves a first request before it is warm. This starts a fresh Python
+process per run that imports the app and fetches / through the Flask test
+client, and reports the median import time, first request time and wall
+time of the whole process (interpreter start and exit included):
+
+- warm: a seeded database and a populated Jinja bytecode cache, the usual
+  restart of a worker;
+- cold templates: an empty JINJA_CACHE_DIR each run, as on a new host or
+  container, so every template used is compiled;
+- fresh database: an empty database each run, so the first request also
+  creates the schema and the ADMIN_* account (including its password hash).
+
+Save a run with ``--save-baseline`` and check later runs against it with
+``--compare``: the exit status is 1 when a scenario's median wall time grew
+by more than ``--threshold``.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 10] [--save-baseline base.json] \
+        [--compare base.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD = f'''
+import time
+started = time.perf_counter()
+import contextlib, io, json, logging, sys
+sys.path.insert(0, {ROOT!r})
+logging.disable(logging.CRITICAL)
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    imported = time.perf_counter()
+    response = app.app.test_client().get("/")
+finished = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({{"import_ms": (imported - started) * 1000, "first_ms": (finished - imported) * 1000}}))
+'''
+ADMIN = {'ADMIN_USERNAME': 'admin', 'ADMIN_EMAIL': 'admin@example.com', 'ADMIN_PASSWORD': 'password'}
+
+
+def seed(env):
+    subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'seed_data.py'), '--users', '20',
+                    '--posts', '500', '--contacts', '0', '--tags', '30'],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def start_process(env):
+    """Run one cold process and return its import, first request and wall times in ms."""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, check=True, capture_output=True,
+                            text=True).stdout
+    wall = (time.perf_counter() - started) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['wall_ms'] = wall
+    return result
+
+
+def run(name, tmp, base_env, runs):
+    samples = []
+    for n in range(runs):
+        env = dict(base_env)
+        if name == 'cold templates':
+            env['JINJA_CACHE_DIR'] = tempfile.mkdtemp(dir=tmp)
+        elif name == 'fresh database':
+            env.update(ADMIN, DATABASE_URL=f"sqlite:///{os.path.join(tmp, f'fresh-{n}.db')}")
+        samples.append(start_process(env))
+    return {key: round(statistics.median(s[key] for s in samples), 1) for key in ('import_ms', 'first_ms', 'wall_ms')}
+
+
+def compare(results, baseline, threshold):
+    """Print regressions against a saved run and return how many there are."""
+    regressions = 0
+    for name, result in results.items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        if result['wall_ms'] > before['wall_ms'] * (1 + threshold):
+            regressions += 1
+            print(f"REGRESSION {name}: wall {before['wall_ms']:.0f} -> {result['wall_ms']:.0f} ms "
+                  f"(import {before['import_ms']:.0f} -> {result['import_ms']:.0f} ms, "
+                  f"first request {before['first_ms']:.0f} -> {result['first_ms']:.0f} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Processes started per scenario.')
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative growth of the wall time.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   JINJA_CACHE_DIR=os.path.join(tmp, 'jinja'), SLOW_REQUEST_MS='0')
+        for name in ('ADMIN_USERNAME', 'ADMIN_EMAIL', 'ADMIN_PASSWORD'):
+            env.pop(name, None)
+        seed(env)
+        start_process(env)  # fills the bytecode cache for the warm rows
+
+        print(f'{args.runs} processes per scenario, medians')
+        print(f"\n{'scenario':<18}{'import ms':>11}{'first request ms':>18}{'wall ms':>10}")
+        results = {}
+        for name in ('warm', 'cold templates', 'fresh database'):
+            result = results[name] = run(name, tmp, env, args.runs)
+            print(f"{name:<18}{result['import_ms']:>11.1f}{result['first_ms']:>18.1f}{result['wall_ms']:>10.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'runs': args.runs, 'scenarios': results}, f, indent=2)
+        print(f'\nSaved baseline to {args.save_baseline}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
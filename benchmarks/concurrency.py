@@ -0,0 +1,196 @@
+"""
+Throughput of gunicorn worker classes while some clients are slow.
+
+Starts gunicorn with gunicorn.conf.py against a throwaway seeded SQLite
+database, once with sync workers and once with gthread workers (same number
+of processes), and measures fast anonymous GETs of the home page and posts
+while other connections misbehave:
+
+- none: only the fast clients;
+- slow-client: connections that send their request headers a few bytes at
+  a time over --slow-seconds;
+- slow-upload: contact form posts whose body trickles in over --slow-seconds.
+
+A sync worker is blocked for the whole trickle, so a few slow connections
+take the pool away from everyone else; a gthread worker only loses one of its
+threads. Fast responses are checked for status 200, so errors caused by
+threads sharing sessions or connections would show up in the errors column.
+The page cache is off so every fast request renders and queries.
+
+Usage:
+    python benchmarks/concurrency.py [--duration 10] [--fast-clients 8] [--slow-clients 4] \
+        [--slow-seconds 4] [--workers 2] [--threads 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('none', 'slow-client', 'slow-upload')
+TRICKLE_STEPS = 40
+
+
+def prepare_database(path):
+    """Seed a small blog and return a sample of published slugs."""
+    os.environ.update({'DATABASE_URL': f'sqlite:///{path}', 'PAGE_CACHE_ENABLED': 'false'})
+    with contextlib.redirect_stdout(io.StringIO()):
+        import seed_data
+        from app import app, db, Post, recount_tags, upgrade_schema
+        with app.app_context():
+            upgrade_schema()
+            with db.engine.begin() as conn:
+                seed_data.seed(conn, users=20, posts=2000, contacts=0, tags=30, seed_value=42)
+            recount_tags()
+            db.session.commit()
+            return db.session.scalars(db.select(Post.slug).filter_by(status='published').limit(200)).all()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(worker_class, workers, threads):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads), GUNICORN_TIMEOUT='120',
+               GUNICORN_CMD_ARGS='--log-level warning', SLOW_REQUEST_MS='0')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit('gunicorn exited during startup.')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('gunicorn did not start listening within 30 seconds.')
+
+
+def trickle(sock, data, seconds, stop):
+    step = max(1, -(-len(data) // TRICKLE_STEPS))
+    for start in range(0, len(data), step):
+        if stop.is_set():
+            return False
+        sock.sendall(data[start:start + step])
+        time.sleep(seconds / TRICKLE_STEPS)
+    return True
+
+
+def slow_client(port, mode, seconds, stop, completed):
+    """Keep one misbehaving connection open at a time until ``stop``."""
+    body = urllib.parse.urlencode({'firstName': 'Slow', 'lastName': 'Client', 'email': 'slow@example.com',
+                                   'subject': 'Slow upload', 'message': 'x' * 32 * 1024}).encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=seconds + 60) as sock:
+                if mode == 'slow-client':
+                    request = (f'GET /about HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                               f'User-Agent: slow-client {"x" * 400}\r\n\r\n').encode()
+                    finished = trickle(sock, request, seconds, stop)
+                else:
+                    sock.sendall((f'POST /contact HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                                  f'Content-Type: application/x-www-form-urlencoded\r\n'
+                                  f'Content-Length: {len(body)}\r\n\r\n').encode())
+                    finished = trickle(sock, body, seconds, stop)
+                if finished:
+                    while sock.recv(65536):
+                        pass
+                    completed.append(1)
+        except OSError:
+            pass
+
+
+def fast_client(base_url, slugs, index, stop, latencies, errors):
+    rng = random.Random(index)
+    while not stop.is_set():
+        path = '/' if rng.random() < 0.3 else f'/post/{rng.choice(slugs)}'
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=60) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        if stop.is_set():
+            return
+        latencies.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors.append(path)
+
+
+def run(port, slugs, mode, args):
+    stop = threading.Event()
+    latencies, errors, completed = [], [], []
+    threads = [threading.Thread(target=slow_client, args=(port, mode, args.slow_seconds, stop, completed))
+               for _ in range(args.slow_clients if mode != 'none' else 0)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)  # let the slow connections occupy their workers first
+    threads += [threading.Thread(target=fast_client,
+                                 args=(f'http://127.0.0.1:{port}', slugs, i, stop, latencies, errors))
+                for i in range(args.fast_clients)]
+    for thread in threads[-args.fast_clients:]:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'rps': len(latencies) / args.duration,
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        'errors': len(errors),
+        'slow': len(completed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds measured per row.')
+    parser.add_argument('--fast-clients', type=int, default=8)
+    parser.add_argument('--slow-clients', type=int, default=4)
+    parser.add_argument('--slow-seconds', type=float, default=4, help='How long each slow request trickles.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn processes for both worker classes.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        slugs = prepare_database(os.path.join(tmp, 'bench.db'))
+        print(f'{args.fast_clients} fast clients, {args.slow_clients} slow clients of {args.slow_seconds:g}s, '
+              f'{args.workers} workers, {args.duration:g}s per row')
+        print(f"\n{'worker class':<22}{'slow mode':<14}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+              f"{'slow done':>11}")
+        for worker_class, threads in (('sync', 1), ('gthread', args.threads)):
+            process, port = start_gunicorn(worker_class, args.workers, threads)
+            label = worker_class if worker_class == 'sync' else f'gthread x{threads}'
+            try:
+                for mode in MODES:
+                    result = run(port, slugs, mode, args)
+                    print(f"{label:<22}{mode:<14}{result['rps']:>9.1f}{result['p50']:>9.1f}{result['p95']:>9.1f}"
+                          f"{result['errors']:>8}{result['slow']:>11}")
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Home page latency while /contact is flooded.
+
+Starts gunicorn with gunicorn.conf.py against a throwaway seeded SQLite
+database and measures anonymous GETs of / from a few reader threads while
+flood threads post the contact form at --flood-rate posts a second in total
+(0 is as fast as they can), from one client IP, cycling through a small set
+of sender emails and spam messages. Each row restarts gunicorn with
+different contact form settings:
+
+- no flood: readers only, for reference;
+- unprotected: no rate limits, no dedup, one INSERT and commit per post
+  (what /contact did before);
+- rate limited: the default per-IP and per-email token buckets and dedup;
+- buffered: no rate limits or dedup (a flood from many addresses the limiter
+  cannot tell apart), but accepted posts are written by the write-behind
+  buffer in batches of --buffer-size.
+
+Reports reader latency and throughput, flood requests per second by
+response (302 accepted or deduplicated, 429 throttled) and how many contact
+rows were stored. The page cache is off so every read queries the database.
+
+Usage:
+    python benchmarks/contact_flood.py [--duration 10] [--readers 4] [--flooders 16] \
+        [--flood-rate 200] [--workers 2] [--threads 4] [--buffer-size 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNPROTECTED = {'CONTACT_THROTTLE_ENABLED': 'false', 'CONTACT_DEDUP_SECONDS': '0', 'CONTACT_BUFFER_SIZE': '0'}
+
+
+def prepare_database(path):
+    """Seed a small blog without contact messages."""
+    os.environ.update({'DATABASE_URL': f'sqlite:///{path}', 'PAGE_CACHE_ENABLED': 'false'})
+    with contextlib.redirect_stdout(io.StringIO()):
+        import seed_data
+        from app import app, db, upgrade_schema
+        with app.app_context():
+            upgrade_schema()
+            with db.engine.begin() as conn:
+                seed_data.seed(conn, users=20, posts=2000, contacts=0, tags=30, seed_value=42)
+
+
+def contact_rows(path):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        return conn.execute('SELECT count(*) FROM contact').fetchone()[0]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(settings, workers, threads):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), GUNICORN_CMD_ARGS='--log-level warning', SLOW_REQUEST_MS='0',
+               **settings)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit('gunicorn exited during startup.')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('gunicorn did not start listening within 30 seconds.')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def flooder(base_url, label, index, interval, stop, statuses):
+    rng = random.Random(index)
+    opener = urllib.request.build_opener(NoRedirect)
+    # Messages differ between rows so dedup does not match rows stored by an earlier one
+    spam = [f'Cheap followers, offer {n} ({label})! Visit our site today.' for n in range(5)]
+    next_post = time.monotonic() + rng.random() * interval
+    while not stop.is_set():
+        if interval:
+            stop.wait(max(0.0, next_post - time.monotonic()))
+            next_post += interval
+        body = urllib.parse.urlencode({
+            'firstName': 'Spam', 'lastName': 'Bot', 'email': f'bot{rng.randrange(50)}@example.com',
+            'subject': 'Great offer', 'message': rng.choice(spam)}).encode()
+        try:
+            with opener.open(base_url + '/contact', data=body, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            status = error.code
+        except OSError:
+            status = 'error'
+        if not stop.is_set():
+            statuses.append(status)
+
+
+def reader(base_url, stop, latencies, errors):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=60) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        if stop.is_set():
+            return
+        latencies.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors.append(1)
+
+
+def run(base_url, label, flooders, args):
+    stop = threading.Event()
+    latencies, errors, statuses = [], [], []
+    interval = flooders / args.flood_rate if args.flood_rate else 0
+    threads = [threading.Thread(target=flooder, args=(base_url, label, i, interval, stop, statuses))
+               for i in range(flooders)]
+    threads += [threading.Thread(target=reader, args=(base_url, stop, latencies, errors))
+                for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'rps': len(latencies) / args.duration,
+        'p50': statistics.median(latencies) if latencies else 0.0,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        'errors': len(errors),
+        'flood': Counter(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds measured per row.')
+    parser.add_argument('--readers', type=int, default=4, help='Threads fetching the home page.')
+    parser.add_argument('--flooders', type=int, default=16, help='Threads posting the contact form.')
+    parser.add_argument('--flood-rate', type=float, default=200, help='Contact posts per second, 0 for no limit.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    parser.add_argument('--buffer-size', type=int, default=50, help='CONTACT_BUFFER_SIZE of the buffered row.')
+    args = parser.parse_args()
+
+    rows = [
+        ('no flood', 0, {}),
+        ('unprotected', args.flooders, UNPROTECTED),
+        ('rate limited', args.flooders, {}),
+        ('buffered', args.flooders, dict(UNPROTECTED, CONTACT_BUFFER_SIZE=str(args.buffer_size))),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        prepare_database(database)
+        rate = f'{args.flood_rate:g}/s' if args.flood_rate else 'unlimited'
+        print(f'{args.readers} readers, {args.flooders} flooders ({rate}), {args.workers} workers x '
+              f'{args.threads} threads, {args.duration:g}s per row')
+        print(f"\n{'contact settings':<18}{'GET / req/s':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+              f"{'posts/s':>9}{'302':>8}{'429':>8}{'rows':>8}")
+        for label, flooders, settings in rows:
+            before = contact_rows(database)
+            process, base_url = start_gunicorn(settings, args.workers, args.threads)
+            try:
+                result = run(base_url, label, flooders, args)
+            finally:
+                # A graceful stop lets buffered workers write what they still hold
+                process.terminate()
+                process.wait(timeout=60)
+            flood = result['flood']
+            print(f"{label:<18}{result['rps']:>12.1f}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                  f"{result['errors']:>8}{sum(flood.values()) / args.duration:>9.1f}{flood[302]:>8}{flood[429]:>8}"
+                  f"{contact_rows(database) - before:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Dashboard render time for an author with thousands of posts.
+
+Seeds a throwaway SQLite database with seed_data.py, in which the long tail
+of authors gives the most prolific non-admin user thousands of posts, and
+walks every page of /dashboard through the Flask test client twice: once as
+that author and once as the admin, who sees all posts with an author column.
+Each scenario runs in a fresh process so caches start empty:
+
+- no caching: FRAGMENT_CACHE_TTL=0 and the time formatting helpers
+  unwrapped from their lru_cache, as the templates rendered before;
+- memoized times: format_local_time and get_local_time memoized, no
+  fragment cache;
+- fragments: the default, memoized times and cached dashboard rows;
+- fragments, large: the same with room for every row in the cache. The
+  admin's walk renders more rows than the default FRAGMENT_CACHE_MAX_ENTRIES
+  holds, so with the default its second pass misses like the first.
+
+Reports the median and total time per page for each pass; the first pass
+fills the caches, the second is what a returning user sees.
+
+Usage:
+    python benchmarks/dashboard_render.py [--posts 20000] [--per-page 100]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = {
+    'no caching': {'FRAGMENT_CACHE_TTL': '0', 'UNWRAP_TIMES': '1'},
+    'memoized times': {'FRAGMENT_CACHE_TTL': '0'},
+    'fragments': {},
+    'fragments, large': {'FRAGMENT_CACHE_MAX_ENTRIES': '50000'},
+}
+CHILD = f'''
+import contextlib, io, json, logging, os, re, sys, time
+sys.path.insert(0, {ROOT!r})
+logging.disable(logging.CRITICAL)
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as blog
+if os.environ.get("UNWRAP_TIMES"):
+    blog.format_local_time = blog.format_local_time.__wrapped__
+    blog.get_local_time = blog.get_local_time.__wrapped__
+with blog.app.app_context():
+    author = blog.db.session.execute(
+        blog.db.select(blog.User.id, blog.db.func.count()).join(blog.Post).where(blog.User.is_admin.is_(False))
+        .group_by(blog.User.id).order_by(blog.db.func.count().desc()).limit(1)).one()
+    admin = blog.User.query.filter_by(username="bench1").one().id
+results = {{"posts": author[1]}}
+for viewer, user_id in (("author", author[0]), ("admin", admin)):
+    client = blog.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    passes = []
+    for _ in range(2):
+        timings, url = [], "/dashboard"
+        while url:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+            older = re.search(r'href="(/dashboard\\?cursor=[^"]+)"[^>]*>\\s*Older', response.get_data(as_text=True))
+            url = older.group(1).replace("&amp;", "&") if older else None
+        passes.append(timings)
+    results[viewer] = passes
+print(json.dumps(results))
+'''
+
+
+def seed(env, posts):
+    subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'seed_data.py'), '--users', '50',
+                    '--posts', str(posts), '--contacts', '0', '--tags', '30'],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=20000, help='Posts in the seeded database.')
+    parser.add_argument('--per-page', type=int, default=100, help='ADMIN_ROWS_PER_PAGE of the dashboard.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   JINJA_CACHE_DIR=os.path.join(tmp, 'jinja'), ADMIN_ROWS_PER_PAGE=str(args.per_page),
+                   SLOW_REQUEST_MS='0')
+        seed(env, args.posts)
+        header = False
+        for name, settings in SCENARIOS.items():
+            output = subprocess.run([sys.executable, '-c', CHILD], env=dict(env, **settings), check=True,
+                                    capture_output=True, text=True).stdout
+            results = json.loads(output.strip().splitlines()[-1])
+            if not header:
+                print(f"Author with {results['posts']} of {args.posts} posts, {args.per_page} rows per page")
+                print(f"\n{'scenario':<18}{'viewer':<8}{'pages':>7}{'1st p50 ms':>12}{'1st total s':>13}"
+                      f"{'2nd p50 ms':>12}{'2nd total s':>13}")
+                header = True
+            for viewer in ('author', 'admin'):
+                first, second = results[viewer]
+                print(f'{name:<18}{viewer:<8}{len(first):>7}{statistics.median(first):>12.1f}'
+                      f'{sum(first) / 1000:>13.2f}{statistics.median(second):>12.1f}{sum(second) / 1000:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
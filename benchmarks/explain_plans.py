@@ -0,0 +1,153 @@
+"""
+Query plan benchmark for the hot list queries.
+
+Builds a throwaway SQLite database with synthetic rows, then prints the
+``EXPLAIN QUERY PLAN`` output and median latency of each hot query twice:
+without the secondary indexes (the schema before migration 2) and after
+creating them the same way the migration does.
+
+Usage:
+    python benchmarks/explain_plans.py [--posts 20000] [--contacts 20000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select, tuple_  # noqa: E402
+
+from app import db, Contact, Post, Reply, User, post_tags  # noqa: E402
+
+INDEXED_TABLES = (Post.__table__, post_tags, Contact.__table__, Reply.__table__, User.__table__)
+
+
+def seed(conn, users, posts, contacts, seed_value=42):
+    """Bulk insert synthetic rows with Core executemany."""
+    rng = random.Random(seed_value)
+    start = datetime(2020, 1, 1)
+    conn.execute(insert(User.__table__), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+         'first_name': 'User', 'last_name': str(i), 'is_admin': i == 1,
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(1, users + 1)
+    ])
+    conn.execute(insert(Post.__table__), [
+        {'id': i, 'title': f'Post {i}', 'content': '<p>Lorem ipsum</p>', 'slug': f'post-{i}',
+         'status': rng.choice(('published', 'published', 'published', 'draft', 'archived')),
+         'user_id': rng.randint(1, users), 'created_at': start + timedelta(minutes=rng.randint(0, 10 ** 6)),
+         'updated_at': start}
+        for i in range(1, posts + 1)
+    ])
+    conn.execute(insert(Contact.__table__), [
+        {'id': i, 'first_name': 'Visitor', 'last_name': str(i), 'email': f'user{rng.randint(1, users)}@example.com',
+         'subject': 'Hello', 'message': 'Message body', 'is_read': rng.random() < 0.5,
+         'created_at': start + timedelta(minutes=rng.randint(0, 10 ** 6))}
+        for i in range(1, contacts + 1)
+    ])
+    conn.execute(insert(Reply.__table__), [
+        {'contact_id': rng.randint(1, contacts), 'admin_id': 1, 'message': 'Reply',
+         'created_at': start + timedelta(minutes=rng.randint(0, 10 ** 6))}
+        for _ in range(contacts // 2)
+    ])
+
+
+def hot_queries(page_size=25):
+    """The statements issued by the list views, keyed by a short name."""
+    recent_post = (Post.created_at.desc(), Post.id.desc())
+    recent_contact = (Contact.created_at.desc(), Contact.id.desc())
+    cursor = (datetime(2020, 12, 1), 10 ** 9)
+    first_page_ids = range(1, page_size + 1)
+    return {
+        'index first page': select(Post).where(Post.status == 'published').order_by(*recent_post).limit(7),
+        'index deep page': (select(Post).where(Post.status == 'published')
+                            .where(tuple_(Post.created_at, Post.id) < cursor).order_by(*recent_post).limit(7)),
+        'dashboard (user)': select(Post).where(Post.user_id == 2).order_by(*recent_post).limit(page_size + 1),
+        'dashboard (admin)': select(Post).order_by(*recent_post).limit(page_size + 1),
+        'post counts by status': (select(Post.status, func.count()).where(Post.user_id == 2)
+                                  .group_by(Post.status)),
+        'admin users': select(User).order_by(User.created_at.desc(), User.id.desc()).limit(page_size + 1),
+        'post counts per user': (select(Post.user_id, func.count()).where(Post.user_id.in_(first_page_ids))
+                                 .group_by(Post.user_id)),
+        'admin contacts': select(Contact).order_by(*recent_contact).limit(page_size + 1),
+        'reply counts per contact': (select(Reply.contact_id, func.count())
+                                     .where(Reply.contact_id.in_(first_page_ids)).group_by(Reply.contact_id)),
+        'my messages': (select(Contact).where(Contact.email == 'user2@example.com')
+                        .order_by(*recent_contact).limit(page_size + 1)),
+    }
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(
+        value.isoformat(' ') if isinstance(value, datetime) else value
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled.string}', params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def median_ms(conn, statement, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def report(conn, title, repeat):
+    print(f'\n=== {title} ===')
+    results = {}
+    for name, statement in hot_queries().items():
+        results[name] = median_ms(conn, statement, repeat)
+        print(f'\n{name}: {results[name]:.2f} ms')
+        for detail in explain(conn, statement):
+            print(f'    {detail}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--contacts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with engine.begin() as conn:
+            db.metadata.create_all(conn)
+            # Start from the pre-migration schema: no secondary indexes
+            for table in INDEXED_TABLES:
+                for index in table.indexes:
+                    index.drop(conn)
+            seed(conn, args.users, args.posts, args.contacts)
+
+        with engine.connect() as conn:
+            before = report(conn, 'Before migration 2 (no secondary indexes)', args.repeat)
+
+        with engine.begin() as conn:
+            for table in INDEXED_TABLES:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+        with engine.connect() as conn:
+            after = report(conn, 'After migration 2', args.repeat)
+
+        print('\n=== Summary (median ms) ===')
+        print(f"{'query':<28}{'before':>10}{'after':>10}{'speedup':>10}")
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            print(f'{name:<28}{before[name]:>10.2f}{after[name]:>10.2f}{speedup:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Memory use of the streaming admin exports.
+
+Seeds throwaway SQLite databases of increasing size with seed_data.py and
+downloads /admin/export/contacts (with replies) and /admin/export/posts as
+CSV and JSON Lines through the Flask test client without buffering the
+body. Reports rows, bytes, time and the peak Python heap allocation during
+each download (tracemalloc); the peak should stay flat as the table grows.
+
+Usage:
+    python benchmarks/export_memory.py [--sizes 10000 100000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(database, contacts):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}')
+    subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'seed_data.py'), '--users', '100',
+                    '--posts', str(contacts // 10), '--contacts', str(contacts)],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def measure(database):
+    """Peak heap and size of each export of ``database``, run in a child process for a clean heap."""
+    code = f'''
+import contextlib, io, json, logging, os, sys, time, tracemalloc
+os.environ["DATABASE_URL"] = "sqlite:///{database}"
+sys.path.insert(0, {ROOT!r})
+logging.disable(logging.CRITICAL)
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as blog
+client = blog.app.test_client()
+with blog.app.app_context():
+    admin = blog.User.query.filter_by(username="bench1").one()
+with client.session_transaction() as session:
+    session["_user_id"] = str(admin.id)
+    session["_fresh"] = True
+results = []
+for path in ("/admin/export/contacts.csv", "/admin/export/contacts.jsonl", "/admin/export/posts.jsonl"):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    size = lines = 0
+    for chunk in response.response:
+        size += len(chunk)
+        lines += chunk.count(b"\\n") if isinstance(chunk, bytes) else chunk.count("\\n")
+    response.close()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results.append((path, lines, size, elapsed, peak))
+print(json.dumps(results))
+'''
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Contacts per database.')
+    args = parser.parse_args()
+
+    print(f"{'contacts':>9}  {'export':<30}{'lines':>9}{'MB':>8}{'seconds':>9}{'peak heap MB':>14}")
+    for contacts in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database = os.path.join(tmp, 'bench.db')
+            seed(database, contacts)
+            for path, lines, size, elapsed, peak in measure(database):
+                print(f'{contacts:>9}  {path:<30}{lines:>9}{size / 1e6:>8.1f}{elapsed:>9.2f}{peak / 1e6:>14.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Load test for the main routes.
+
+Drives the real views against a database filled by ``seed_data.py``, either
+in-process through the Flask test client or over HTTP against a local
+gunicorn, and reports latency percentiles, throughput and queries per
+request for each scenario. Query counts come from the Server-Timing header,
+which is switched on for the run.
+
+Save a run with ``--save-baseline`` and check later runs against it with
+``--compare``: the exit status is 1 when a scenario's p95 latency grew by
+more than ``--threshold`` or it issues more queries than before.
+
+The contact scenario adds messages to the database, so reseed before
+recording a new baseline.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/run_load.py \
+        [--target testclient|gunicorn] [--requests 200] [--concurrency 1] [--workers 2] \
+        [--scenario index ...] [--save-baseline base.json] [--compare base.json] [--threshold 0.2]
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func, select  # noqa: E402
+
+PASSWORD = 'password'
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+# login is None for anonymous scenarios, 'admin' for bench1 and 'author' for a prolific non-admin;
+# fresh scenarios use a new cookie jar per request (a logged-in client would just be redirected)
+Scenario = namedtuple('Scenario', 'name method login expected request fresh', defaults=(False,))
+
+
+def build_scenarios(sample):
+    def form_contact(rng):
+        n = rng.randrange(1, sample['users'] + 1)
+        return {'firstName': 'Load', 'lastName': 'Test', 'email': f'bench{n}@example.com',
+                'subject': 'Load test', 'message': f'Message {rng.random()}'}
+
+    def form_login(rng):
+        return {'username': f"bench{rng.randrange(2, sample['users'] + 1)}", 'password': PASSWORD}
+
+    return [
+        Scenario('index', 'GET', None, 200, lambda rng: ('/', None)),
+        Scenario('post', 'GET', None, 200, lambda rng: (f"/post/{rng.choice(sample['slugs'])}", None)),
+        Scenario('dashboard', 'GET', 'author', 200, lambda rng: ('/dashboard', None)),
+        Scenario('admin_contacts', 'GET', 'admin', 200, lambda rng: ('/admin/contacts', None)),
+        Scenario('my_messages', 'GET', 'author', 200, lambda rng: ('/my-messages', None)),
+        Scenario('contact', 'POST', None, 302, lambda rng: ('/contact', form_contact(rng))),
+        Scenario('login', 'POST', None, 302, lambda rng: ('/login', form_login(rng)), fresh=True),
+    ]
+
+
+def sample_data():
+    """Published slugs and the users the scenarios log in as."""
+    with app.app_context():
+        slugs = db.session.scalars(select(Post.slug).filter_by(status='published')
+                                   .order_by(Post.id).limit(500)).all()
+        users = db.session.scalar(select(func.count(User.id)).where(User.username.like('bench%')))
+        # The author with the most posts gives the dashboard realistic work
+        author = db.session.execute(
+            select(User.username).join(Post, Post.user_id == User.id)
+            .where(User.username.like('bench%'), User.is_admin.is_(False))
+            .group_by(User.id).order_by(func.count(Post.id).desc()).limit(1)).scalar()
+        contacts = db.session.scalar(select(func.count(Contact.id)))
+    if not slugs or not author:
+        sys.exit('No seeded data found; run benchmarks/seed_data.py first.')
+    return {'slugs': slugs, 'users': users, 'contacts': contacts, 'accounts': {'admin': 'bench1', 'author': author}}
+
+
+# Clients: one per worker thread, each with its own session cookie
+class AppClientSession:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            NoRedirect, urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get('Server-Timing', '')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, threads):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning'],
+        cwd=ROOT, env=dict(os.environ))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit('gunicorn exited during startup.')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit('gunicorn did not start listening within 30 seconds.')
+
+
+# Running scenarios
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(scenario, make_session, accounts, requests, concurrency, warmup, seed_value):
+    latencies, queries, errors = [], [], [0]
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker(index):
+        rng = random.Random(f'{seed_value}:{scenario.name}:{index}')
+        session = make_session()
+        if scenario.login:
+            session.request('POST', '/login', {'username': accounts[scenario.login], 'password': PASSWORD})
+        for _ in range(warmup):
+            session.request(scenario.method, *scenario.request(rng))
+        ready.wait()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            path, data = scenario.request(rng)
+            if scenario.fresh:
+                session = make_session()
+            started = time.perf_counter()
+            status, timing = session.request(scenario.method, path, data)
+            elapsed = time.perf_counter() - started
+            match = QUERIES_RE.search(timing)
+            with lock:
+                latencies.append(elapsed * 1000)
+                if match:
+                    queries.append(int(match.group(1)))
+                if status != scenario.expected:
+                    errors[0] += 1
+
+    ready = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'queries': round(statistics.fmean(queries), 2) if queries else None,
+        'errors': errors[0],
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print regressions against a saved run and return how many there are."""
+    regressions = 0
+    for name, result in results.items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        problems = []
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            problems.append(f"p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        # Means, so allow for the odd cache miss before calling it an extra query
+        if result['queries'] is not None and before['queries'] is not None \
+                and result['queries'] > before['queries'] + 0.5:
+            problems.append(f"queries {before['queries']} -> {result['queries']}")
+        if result['errors'] > before['errors']:
+            problems.append(f"errors {before['errors']} -> {result['errors']}")
+        if problems:
+            regressions += 1
+            print(f'REGRESSION {name}: ' + ', '.join(problems))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=('testclient', 'gunicorn'), default='testclient')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Client threads per scenario.')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per client thread.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker.')
+    parser.add_argument('--scenario', action='append', help='Only run these scenarios (repeatable).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative p95 growth.')
+    args = parser.parse_args()
+
+    # Settings the app reads at import, so the app is imported here rather than at module level
+    global app, db, Contact, Post, User
+    os.environ['SERVER_TIMING_ENABLED'] = 'true'
+    os.environ.setdefault('SLOW_REQUEST_MS', '0')
+    os.environ.setdefault('LOGIN_THROTTLE_ENABLED', 'false')  # the login scenario is one client hammering /login
+    os.environ.setdefault('CONTACT_THROTTLE_ENABLED', 'false')  # and the contact scenario one client posting
+    from app import app, db, Contact, Post, User
+
+    sample = sample_data()
+    scenarios = [s for s in build_scenarios(sample) if not args.scenario or s.name in args.scenario]
+    print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI']} ({len(sample['slugs'])} sampled posts, "
+          f"{sample['users']} users, {sample['contacts']} contacts), target: {args.target}")
+
+    server = None
+    if args.target == 'gunicorn':
+        server, base_url = start_gunicorn(args.workers, args.threads)
+        make_session = lambda: HTTPSession(base_url)  # noqa: E731
+    else:
+        make_session = AppClientSession
+
+    results = {}
+    try:
+        print(f"\n{'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mean ms':>9}{'req/s':>9}"
+              f"{'queries':>9}{'errors':>8}")
+        for scenario in scenarios:
+            result = run_scenario(scenario, make_session, sample['accounts'], args.requests,
+                                  args.concurrency, args.warmup, args.seed)
+            results[scenario.name] = result
+            queries = '-' if result['queries'] is None else f"{result['queries']:.1f}"
+            print(f"{scenario.name:<16}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{result['mean_ms']:>9.1f}{result['rps']:>9.1f}{queries:>9}{result['errors']:>8}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'target': args.target, 'concurrency': args.concurrency, 'scenarios': results}, f, indent=2)
+        print(f'\nSaved baseline to {args.save_baseline}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if (baseline['target'], baseline['concurrency']) != (args.target, args.concurrency):
+            print(f"Note: baseline was recorded with --target {baseline['target']} "
+                  f"--concurrency {baseline['concurrency']}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Full-text search benchmark.
+
+Builds a throwaway SQLite database with a synthetic corpus of published
+posts, indexes it into the FTS5 table the app uses, then compares the median
+latency of a naive ``LIKE '%term%'`` scan over the post body with the
+ranked FTS5 query plus snippet lookup that ``/search`` issues for one page.
+LIKE stops at the first page of unranked rows, so it is only cheap for
+terms that almost every post contains; ``--window 0`` shows the cost of
+scoring every match of such terms.
+
+Usage:
+    python benchmarks/search_fts.py [--posts 100000] [--words 150] [--repeat 10] [--window 2000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+
+from app import (app, db, Post, User, SEARCH_INSERT, SEARCH_MARK, SEARCH_SNIPPETS,  # noqa: E402
+                 SEARCH_SNIPPET_TOKENS, SEARCH_TABLE, build_match_query, search_rank_statement)
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vo', 'zi', 'pa', 'qu', 'de')
+QUERIES = ('common', 'rare', 'missing', 'prefix', 'two words')
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(conn, posts, words_per_post, seed_value=42):
+    """Insert posts whose words follow a Zipf-like distribution, and their search rows."""
+    rng = random.Random(seed_value)
+    words = vocabulary(5000, rng)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    start = datetime(2020, 1, 1)
+    conn.execute(insert(User.__table__), [{
+        'id': 1, 'username': 'author', 'email': 'author@example.com', 'password_hash': 'x',
+        'first_name': 'Author', 'last_name': 'One', 'created_at': start}])
+    for offset in range(0, posts, 5000):
+        post_rows, search_rows = [], []
+        for i in range(offset + 1, min(offset + 5000, posts) + 1):
+            body = ' '.join(rng.choices(words, weights, k=words_per_post))
+            title = ' '.join(rng.choices(words, weights, k=5))
+            post_rows.append({
+                'id': i, 'title': title, 'content': f'<p>{body}</p>', 'slug': f'post-{i}', 'status': 'published',
+                'user_id': 1, 'created_at': start + timedelta(minutes=i), 'updated_at': start})
+            search_rows.append({'rowid': i, 'title': title, 'excerpt': '', 'body': body, 'tags': ''})
+        conn.execute(insert(Post.__table__), post_rows)
+        conn.execute(SEARCH_INSERT, search_rows)
+    conn.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return {
+        'common': words[0],
+        'rare': words[-1],
+        'missing': 'notinthecorpus',
+        'prefix': f'{words[10][:3]}*',
+        'two words': f'{words[5]} {words[50]}',
+    }
+
+
+def like_page(conn, text, per_page):
+    """What a LIKE based search would do: scan every body, newest first."""
+    statement = select(Post.id, Post.title).where(Post.status == 'published')
+    for term in text.split():
+        statement = statement.where(Post.content.like(f"%{term.rstrip('*')}%"))
+    statement = statement.order_by(Post.created_at.desc(), Post.id.desc()).limit(per_page + 1)
+    return conn.execute(statement).all()
+
+
+def fts_page(conn, text, per_page, window):
+    """The two search index queries behind one /search results page."""
+    match = build_match_query(text)
+    ranked = conn.execute(search_rank_statement(None, window), {'query': match, 'limit': per_page + 1}).all()
+    ids = [row.rowid for row in ranked[:per_page]]
+    snippets = conn.execute(SEARCH_SNIPPETS, {
+        'query': match, 'ids': ids, 'mark_start': SEARCH_MARK[0], 'mark_end': SEARCH_MARK[1],
+        'tokens': SEARCH_SNIPPET_TOKENS}).all()
+    return ranked, snippets
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--words', type=int, default=150, help='Words per post body.')
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--window', type=int, default=app.config['SEARCH_RANK_WINDOW'],
+                        help='SEARCH_RANK_WINDOW; 0 ranks every match.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            db.metadata.create_all(conn)
+            terms = seed(conn, args.posts, args.words)
+        print(f'Seeded and indexed {args.posts} posts in {time.perf_counter() - started:.1f}s')
+
+        with engine.connect() as conn:
+            print(f"\n{'query':<12}{'terms':<24}{'matches':>9}{'LIKE ms':>10}{'FTS5 ms':>10}{'speedup':>10}")
+            for name in QUERIES:
+                text = terms[name]
+                matches = conn.exec_driver_sql(
+                    f'SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH ?',
+                    (build_match_query(text),)).scalar()
+                like = median_ms(lambda: like_page(conn, text, args.per_page), args.repeat)
+                fts = median_ms(lambda: fts_page(conn, text, args.per_page, args.window), args.repeat)
+                speedup = like / fts if fts else float('inf')
+                print(f'{name:<12}{text:<24}{matches:>9}{like:>10.2f}{fts:>10.2f}{speedup:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Synthetic data generator for load tests.
+
+Fills the database configured by DATABASE_URL (the same one the app uses)
+with users, posts, tags, contacts and replies using Core bulk inserts. The
+output only depends on ``--seed``, so two runs with the same arguments
+produce identical databases and benchmark numbers can be compared.
+
+Every generated user has the password ``password``; user ``bench1`` is an
+admin. Posts are stored already rendered and indexed for search, so
+benchmarks do not pay for lazy re-rendering.
+
+Usage:
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed_data.py \
+        [--users 10000] [--posts 200000] [--contacts 1000000] [--seed 42] [--reset]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import (app, db, Contact, Post, Reply, Tag, User, post_tags, SEARCH_INSERT,  # noqa: E402
+                 SEARCH_TABLE, html_to_text, recount_contact_replies, recount_tags, recount_unread_contacts,
+                 render_post_content, search_supported, upgrade_schema)
+
+BATCH_SIZE = 10000
+PASSWORD = 'password'
+START = datetime(2021, 1, 1)
+SPAN_MINUTES = 4 * 365 * 24 * 60
+WORDS = (
+    'performance database query index cache latency python flask template render server request response '
+    'design system network storage memory thread process worker queue deploy release feature review test '
+    'garden travel recipe coffee music photo mountain river city history science space ocean forest winter '
+    'summer morning evening weekend project idea lesson story guide notes update journey habit focus'
+).split()
+FIRST_NAMES = ('Alex', 'Sam', 'Priya', 'Wei', 'Maria', 'Omar', 'Lena', 'Kofi', 'Yuki', 'Ravi', 'Ana', 'Noah')
+LAST_NAMES = ('Smith', 'Garcia', 'Khan', 'Chen', 'Silva', 'Ivanova', 'Okafor', 'Tanaka', 'Patel', 'Muller')
+SUBJECTS = ('Question about a post', 'Collaboration', 'Feedback', 'Bug report', 'Hello', 'Guest post idea')
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def make_bodies(rng, count):
+    """A pool of rendered post bodies; posts reuse them so seeding stays fast."""
+    bodies = []
+    for i in range(count):
+        sections = []
+        for n in range(rng.randint(2, 5)):
+            paragraphs = ''.join(f'<p>{" ".join(sentence(rng, rng.randint(8, 20)) for _ in range(4))}</p>'
+                                 for _ in range(rng.randint(1, 3)))
+            sections.append(f'<h2>{sentence(rng, 3)[:-1]}</h2>{paragraphs}')
+        content = ''.join(sections)
+        bodies.append((content, render_post_content(content, 'html')))
+    return bodies
+
+
+def timestamp(rng):
+    return START + timedelta(minutes=rng.randrange(SPAN_MINUTES), seconds=rng.randrange(60))
+
+
+def chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(conn, statement, rows, label):
+    total = 0
+    for batch in chunks(rows):
+        conn.execute(statement, batch)
+        total += len(batch)
+    print(f'  {label}: {total}')
+    return total
+
+
+def seed(conn, users, posts, contacts, tags, seed_value):
+    rng = random.Random(seed_value)
+    first_user = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+    password_hash = generate_password_hash(PASSWORD)  # hashing is slow on purpose; share one hash
+    user_ids = range(first_user, first_user + users)
+
+    bulk_insert(conn, insert(User.__table__), ({
+        'id': user_id, 'username': f'bench{n}', 'email': f'bench{n}@example.com', 'password_hash': password_hash,
+        'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES), 'is_admin': n == 1,
+        'created_at': timestamp(rng),
+    } for n, user_id in enumerate(user_ids, start=1)), 'users')
+
+    bulk_insert(conn, insert(Tag.__table__), ({'id': i, 'name': f'{WORDS[i % len(WORDS)]}-{i}'}
+                                               for i in range(1, tags + 1)), 'tags')
+
+    bodies = make_bodies(rng, 64)
+    statuses = ('published',) * 8 + ('draft', 'archived')
+    # Authors follow a long tail: a few prolific writers, most users with a handful of posts
+    author_weights = [1 / (rank ** 0.8) for rank in range(1, users + 1)]
+    authors = rng.choices(list(user_ids), author_weights, k=posts)
+
+    def post_rows():
+        for post_id in range(1, posts + 1):
+            content, rendered = bodies[rng.randrange(len(bodies))]
+            title = f'{sentence(rng, rng.randint(3, 7))[:-1]} {post_id}'
+            created = timestamp(rng)
+            yield {
+                'id': post_id, 'title': title, 'content': content, 'excerpt': '', 'slug': f'post-{post_id}',
+                'status': rng.choice(statuses), 'user_id': authors[post_id - 1], 'created_at': created,
+                'updated_at': created + timedelta(days=rng.randrange(30)), 'content_format': 'html', **rendered,
+            }
+
+    searchable = []
+    for batch in chunks(post_rows()):
+        conn.execute(insert(Post.__table__), batch)
+        searchable.extend((row['id'], row['title'], row['rendered_html'])
+                          for row in batch if row['status'] == 'published')
+    print(f'  posts: {posts}')
+
+    bulk_insert(conn, insert(post_tags), ({'post_id': post_id, 'tag_id': tag_id}
+                                          for post_id in range(1, posts + 1)
+                                          for tag_id in rng.sample(range(1, tags + 1), rng.randint(0, 4))),
+                'post tags')
+
+    if search_supported():
+        texts = {}
+        bulk_insert(conn, SEARCH_INSERT, ({
+            'rowid': post_id, 'title': title, 'excerpt': '', 'tags': '',
+            'body': texts.setdefault(rendered_html, html_to_text(rendered_html)),
+        } for post_id, title, rendered_html in searchable), 'search rows')
+
+    # Most messages come from registered users so /my-messages has something to show
+    def contact_rows():
+        for contact_id in range(1, contacts + 1):
+            n = rng.randrange(1, users + 1) if rng.random() < 0.7 else users + rng.randrange(1, 50000)
+            yield {
+                'id': contact_id, 'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+                'email': f'bench{n}@example.com', 'subject': rng.choice(SUBJECTS), 'message': sentence(rng, 30),
+                'created_at': timestamp(rng), 'is_read': rng.random() < 0.6,
+            }
+    bulk_insert(conn, insert(Contact.__table__), contact_rows(), 'contacts')
+
+    bulk_insert(conn, insert(Reply.__table__), ({
+        'contact_id': contact_id, 'admin_id': first_user, 'message': sentence(rng, 20),
+        'created_at': timestamp(rng), 'sent_at': None,
+    } for contact_id in range(1, contacts + 1) if rng.random() < 0.3), 'replies')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=200000)
+    parser.add_argument('--contacts', type=int, default=1000000)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first.')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            if search_supported():
+                db.session.execute(text(f'DROP TABLE IF EXISTS {SEARCH_TABLE}'))
+                db.session.commit()
+        upgrade_schema()
+        if db.session.query(Post.id).first() or db.session.query(Contact.id).first():
+            sys.exit('The database already has posts or contacts; use --reset to start over.')
+        print(f"Seeding {app.config['SQLALCHEMY_DATABASE_URI']} with seed {args.seed}")
+        with db.engine.begin() as conn:
+            seed(conn, args.users, args.posts, args.contacts, args.tags, args.seed)
+        # The bulk inserts bypass the per-write tag and inbox counters
+        recount_tags()
+        recount_contact_replies()
+        recount_unread_contacts()
+        db.session.commit()
+        if search_supported():
+            with db.engine.begin() as conn:
+                conn.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('ANALYZE')  # planner statistics for the new volumes
+    print(f'Done in {time.perf_counter() - started:.1f}s. Log in as bench1 (admin) or benchN with '
+          f'password "{PASSWORD}".')
+
+
+if __name__ == '__main__':
+    main()
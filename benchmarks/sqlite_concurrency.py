@@ -0,0 +1,148 @@
+"""
+Read throughput of the app while other workers write.
+
+Starts reader and writer processes against a throwaway SQLite database,
+each importing the app the way a gunicorn worker does. Readers request the
+home page and post pages (page cache disabled so every hit reaches SQLite);
+writers submit the contact form. The run is repeated with the legacy
+rollback journal and with the default WAL pragmas, and reads/s, writes/s and
+failed requests are printed for each.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py [--readers 4] [--writers 2] [--seconds 5]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'rollback journal': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL'},
+    'WAL (default)': {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL'},
+}
+
+
+def load_app(env):
+    os.environ.update(env)
+    os.environ['PAGE_CACHE_ENABLED'] = 'false'
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.CRITICAL)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as blog
+    return blog
+
+
+def seed(env, posts):
+    blog = load_app(env)
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        blog.db.session.execute(blog.db.insert(blog.User), [{
+            'id': 1, 'username': 'author', 'email': 'author@example.com', 'password_hash': 'x',
+            'first_name': 'Bench', 'last_name': 'Author',
+        }])
+        start = datetime(2024, 1, 1)
+        blog.db.session.execute(blog.db.insert(blog.Post), [{
+            'title': f'Post {i}', 'content': '<p>Benchmark body</p>', 'rendered_html': '<p>Benchmark body</p>',
+            'render_version': blog.RENDER_VERSION, 'slug': f'post-{i}', 'status': 'published', 'user_id': 1,
+            'created_at': start + timedelta(minutes=i), 'updated_at': start,
+        } for i in range(posts)])
+        blog.db.session.commit()
+
+
+def wait_until(moment):
+    time.sleep(max(0.0, moment - time.time()))
+
+
+def reader(env, start_at, deadline, posts, results):
+    client = load_app(env).app.test_client()
+    wait_until(start_at)
+    ok = failed = 0
+    i = 0
+    while time.time() < deadline:
+        path = '/' if i % 2 == 0 else f'/post/post-{i % posts}'
+        i += 1
+        try:
+            status = client.get(path).status_code
+        except Exception:
+            status = 500
+        if status == 200:
+            ok += 1
+        else:
+            failed += 1
+    results.put(('read', ok, failed))
+
+
+def writer(env, start_at, deadline, results):
+    client = load_app(env).app.test_client()
+    wait_until(start_at)
+    ok = failed = 0
+    while time.time() < deadline:
+        try:
+            status = client.post('/contact', data={
+                'firstName': 'Load', 'lastName': 'Test', 'email': 'load@example.com',
+                'subject': 'Benchmark', 'message': f'Message {ok + failed}',
+            }).status_code
+        except Exception:
+            status = 500
+        if status == 302:
+            ok += 1
+        else:
+            failed += 1
+    results.put(('write', ok, failed))
+
+
+def run(mode_env, args, tmp):
+    env = dict(mode_env, DATABASE_URL=f"sqlite:///{os.path.join(tmp, mode_env['SQLITE_JOURNAL_MODE'] + '.db')}")
+    ctx = multiprocessing.get_context('spawn')
+    setup = ctx.Process(target=seed, args=(env, args.posts))
+    setup.start()
+    setup.join()
+
+    results = ctx.Queue()
+    start_at = time.time() + 3  # give every worker time to import the app first
+    deadline = start_at + args.seconds
+    processes = [ctx.Process(target=reader, args=(env, start_at, deadline, args.posts, results))
+                 for _ in range(args.readers)]
+    processes += [ctx.Process(target=writer, args=(env, start_at, deadline, results)) for _ in range(args.writers)]
+    for process in processes:
+        process.start()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for _ in processes:
+        kind, ok, failed = results.get()
+        totals[kind][0] += ok
+        totals[kind][1] += failed
+    for process in processes:
+        process.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--posts', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, ~{args.seconds:.0f}s per mode')
+    print(f"{'mode':<20}{'reads/s':>10}{'read errors':>13}{'writes/s':>10}{'write errors':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, mode_env in MODES.items():
+            totals = run(mode_env, args, tmp)
+            reads, read_errors = totals['read']
+            writes, write_errors = totals['write']
+            print(f'{name:<20}{reads / args.seconds:>10.1f}{read_errors:>13}'
+                  f'{writes / args.seconds:>10.1f}{write_errors:>14}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Gunicorn settings for the web process.
+
+The Procfile starts gunicorn with `-c gunicorn.conf.py`; pass the same flag
+when running it by hand, since gunicorn only reads `gunicorn.conf.py` from
+the working directory when no other config is given. Requests are served by
+gthread workers: every worker process runs `threads` requests at once, so a
+slow upload, a slow client or a slow query ties up one thread instead of a
+whole process.
+
+Within a worker the threads are safe: Flask-SQLAlchemy scopes the session to
+each request's app context, the engine's pool hands each thread its own
+connection, and the process-wide caches guard their state with locks.
+Across workers, only the page cache is kept coherent, through its shared
+file backend: cached pages, the related posts index and the cached counts
+(inbox summary, post totals) follow the tag versions stored there. With
+PAGE_CACHE_DIR unset, a private directory named after this checkout is
+used, the same one the Procfile's job runner falls back to, so an edit
+served by one worker, or an image processed by the job runner, is seen by
+all of them.
+Users, template fragments, rate limiters and the contact write buffer stay
+per process; their keys or short TTLs keep that correct.
+
+Every setting can be overridden with the environment variable read next to
+it; WEB_CONCURRENCY is the variable most hosts already set.
+"""
+
+import os
+
+
+def cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))  # honours cpusets of containers
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+cpus = cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Rendering, markdown and password hashing hold the GIL, so CPU work scales
+# with processes: one per core, at least two so a restarting worker never
+# leaves the site unserved. Sync workers get the classic 2 * cores + 1
+# because each of them can only wait on one request.
+if worker_class == 'sync':
+    workers = int(os.environ.get('WEB_CONCURRENCY', 2 * cpus + 1))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', max(2, cpus)))
+
+# The in-process page cache backend only sees its own worker's invalidations,
+# so the workers and the job runner share one on disk: "auto" makes the app
+# pick a directory of this user's named after the checkout, in memory-backed
+# /dev/shm when it can (see app.default_page_cache_dir()). Cache keys carry
+# the template and renderer versions, so it outlives restarts.
+if not os.environ.get('PAGE_CACHE_DIR'):
+    os.environ['PAGE_CACHE_DIR'] = 'auto'
+
+# Threads cover time spent waiting on clients and the database rather than
+# the CPU; four per worker absorbs slow clients without lock contention on
+# SQLite's single writer. The pool must hold a connection for every thread.
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+os.environ.setdefault('DB_POOL_SIZE', str(max(threads, 5)))
+
+# gunicorn's default of 1000 lets a worker whose threads are all stuck on slow
+# uploads keep accepting connections it cannot serve yet. Past this many, new
+# connections wait in the listen backlog for a worker with a free thread; the
+# headroom over `threads` holds idle keep-alive connections.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2 * threads))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers after this many requests (0 never does), with jitter so they do not restart together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Worker heartbeats are file writes; keep them off slow or overlay disks
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Importing the app is cheap and opens no connections; it is loaded in each
+# worker so the engine pool and background threads are never shared across fork()
+preload_app = False
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' logs requests to stdout
+errorlog = '-'
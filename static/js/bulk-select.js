@@ -0,0 +1,20 @@
+// Bulk action forms: a header checkbox selects every row on the page, and
+// destructive buttons ask for confirmation first
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-select-all]').forEach(toggle => {
+        const name = toggle.getAttribute('data-select-all');
+        toggle.addEventListener('change', function() {
+            document.querySelectorAll(`input[type="checkbox"][name="${name}"]`).forEach(box => {
+                box.checked = toggle.checked;
+            });
+        });
+    });
+
+    document.querySelectorAll('button[data-confirm]').forEach(button => {
+        button.addEventListener('click', function(e) {
+            if (!confirm(this.getAttribute('data-confirm'))) {
+                e.preventDefault();
+            }
+        });
+    });
+});
@@ -0,0 +1,46 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Handle delete button clicks
+    const deleteButtons = document.querySelectorAll('.delete-btn');
+
+    deleteButtons.forEach(button => {
+        button.addEventListener('click', function(e) {
+            e.preventDefault();
+
+            // Get post data
+            const postId = this.getAttribute('data-post-id');
+            const postTitle = this.getAttribute('data-post-title');
+
+            // Update modal content
+            document.getElementById('deletePostTitle').textContent = postTitle;
+            document.getElementById('deleteForm').action = `/post/${postId}/delete`;
+
+            // Show modal
+            const modal = new bootstrap.Modal(document.getElementById('deleteModal'));
+            modal.show();
+        });
+    });
+
+    // Handle delete confirmation
+    const confirmDeleteBtn = document.getElementById('confirmDelete');
+
+    confirmDeleteBtn.addEventListener('click', function(e) {
+        // Show loading state
+        const originalText = this.innerHTML;
+        this.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Deleting...';
+        this.disabled = true;
+        this.classList.add('btn-loading');
+
+        // Submit the form
+        setTimeout(() => {
+            document.getElementById('deleteForm').submit();
+        }, 100);
+    });
+
+    // Reset modal when hidden
+    document.getElementById('deleteModal').addEventListener('hidden.bs.modal', function() {
+        const confirmBtn = document.getElementById('confirmDelete');
+        confirmBtn.disabled = false;
+        confirmBtn.classList.remove('btn-loading');
+        confirmBtn.innerHTML = '<i class="fas fa-trash me-2"></i>Delete Post';
+    });
+});
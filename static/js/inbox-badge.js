@@ -0,0 +1,16 @@
+// Unread message count in the admin navbar, from the cached inbox summary
+document.addEventListener('DOMContentLoaded', function() {
+    const badge = document.querySelector('[data-inbox-badge]');
+    if (!badge) {
+        return;
+    }
+    fetch(badge.getAttribute('data-inbox-badge'), { credentials: 'same-origin' })
+        .then(response => response.ok ? response.json() : null)
+        .then(summary => {
+            if (summary && summary.unread > 0) {
+                badge.textContent = summary.unread > 99 ? '99+' : summary.unread;
+                badge.hidden = false;
+            }
+        })
+        .catch(() => {});
+});
@@ -0,0 +1,134 @@
+// Quill editor for the new post and edit post forms
+
+var quill;
+
+// Markdown posts are submitted as the editor's plain text
+function editorContent() {
+    if (document.getElementById('content_format').value === 'markdown') {
+        return quill.getText();
+    }
+    return quill.root.innerHTML;
+}
+
+function insertLink() {
+    const url = prompt('Enter URL:');
+    if (!url) {
+        return;
+    }
+    const range = quill.getSelection();
+    if (range && range.length > 0) {
+        quill.format('link', url);
+    } else {
+        // If no text is selected, insert a link
+        const linkText = prompt('Enter link text:') || url;
+        quill.insertText(range ? range.index : 0, linkText, 'link', url);
+    }
+}
+
+function insertImage() {
+    const fileInput = document.createElement('input');
+    fileInput.type = 'file';
+    fileInput.accept = 'image/*';
+    fileInput.style.display = 'none';
+    fileInput.addEventListener('change', function(e) {
+        const file = e.target.files[0];
+        if (file) {
+            const reader = new FileReader();
+            reader.onload = function(e) {
+                const range = quill.getSelection();
+                quill.insertEmbed(range ? range.index : 0, 'image', e.target.result);
+            };
+            reader.readAsDataURL(file);
+        }
+        document.body.removeChild(fileInput);
+    });
+    document.body.appendChild(fileInput);
+    fileInput.click();
+}
+
+function saveDraft() {
+    const button = document.getElementById('saveDraftBtn');
+    if (button.disabled) {
+        return; // Prevent double submission
+    }
+    button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Saving...';
+    button.disabled = true;
+    document.getElementById('status').value = 'draft';
+    document.getElementById('post-form').requestSubmit();
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const editor = document.getElementById('content');
+    const hidden = document.getElementById('content-hidden');
+
+    quill = new Quill('#content', {
+        theme: 'snow',
+        modules: {
+            toolbar: {
+                container: [
+                    [{ 'header': [1, 2, 3, 4, 5, 6, false] }],
+                    ['bold', 'italic', 'underline', 'strike'],
+                    [{ 'color': [] }, { 'background': [] }],
+                    [{ 'font': [] }, { 'size': [] }],
+                    [{ 'indent': '-1'}, { 'indent': '+1' }],
+                    [{ 'direction': 'rtl' }, { 'align': [] }],
+                    [{ 'list': 'ordered'}, { 'list': 'bullet' }],
+                    ['blockquote', 'code-block'],
+                    ['link', 'image'],
+                    ['clean']
+                ],
+                handlers: {
+                    'link': insertLink,
+                    'image': insertImage
+                }
+            }
+        },
+        placeholder: 'Write your blog post content here...'
+    });
+
+    // Set initial content when editing an existing post
+    const initialContent = editor.getAttribute('data-initial-content');
+    if (initialContent) {
+        if (document.getElementById('content_format').value === 'markdown') {
+            quill.setText(initialContent);
+        } else {
+            quill.root.innerHTML = initialContent;
+        }
+        hidden.value = initialContent;
+    }
+
+    // Copy the editor content into the submitted textarea
+    document.getElementById('post-form').addEventListener('submit', function() {
+        hidden.value = editorContent();
+    });
+
+    document.getElementById('saveDraftBtn').addEventListener('click', saveDraft);
+
+    // Live preview updates
+    const previewTitle = document.getElementById('preview-title');
+    document.getElementById('title').addEventListener('input', function() {
+        previewTitle.textContent = this.value || 'Post title will appear here';
+    });
+
+    const previewExcerpt = document.getElementById('preview-excerpt');
+    document.getElementById('excerpt').addEventListener('input', function() {
+        previewExcerpt.textContent = this.value || 'Post excerpt will appear here';
+    });
+
+    // Featured image preview
+    document.getElementById('featured_image').addEventListener('change', function() {
+        const file = this.files[0];
+        if (!file) {
+            return;
+        }
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            const image = document.createElement('img');
+            image.src = e.target.result;
+            image.className = 'img-fluid rounded';
+            image.style.maxHeight = '150px';
+            document.getElementById('preview-image').replaceChildren(image);
+        };
+        reader.readAsDataURL(file);
+    });
+});
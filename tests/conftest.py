@@ -0,0 +1,23 @@
+"""Test settings, applied before app.py is imported (it reads its configuration at import time)."""
+
+import os
+import tempfile
+
+TMP = tempfile.mkdtemp(prefix='blog-tests-')
+
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TMP, 'blog.db')}",
+    'JINJA_CACHE_DIR': os.path.join(TMP, 'jinja'),
+    'QUERY_BUDGET_ENFORCED': 'true',
+    # A page cache miss runs the view exactly as with the cache off; the
+    # per-process user and fragment caches are off so every request is cold
+    'PAGE_CACHE_ENABLED': 'false',
+    'USER_CACHE_TTL': '0',
+    'FRAGMENT_CACHE_TTL': '0',
+    'JOB_WORKER_THREADS': '0',
+    'CONTACT_THROTTLE_ENABLED': 'false',
+    'CONTACT_BUFFER_SIZE': '0',
+    'SLOW_REQUEST_MS': '0',
+})
+for name in ('ADMIN_USERNAME', 'ADMIN_EMAIL', 'ADMIN_PASSWORD', 'PAGE_CACHE_DIR', 'METRICS_TOKEN'):
+    os.environ.pop(name, None)
@@ -0,0 +1,88 @@
+"""Anonymous pages answer matching validators with a 304, and new ones once the post or its related posts change."""
+
+from datetime import timedelta
+
+import pytest
+
+import app as blog
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture(scope='module')
+def author():
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        user = blog.User(username='etags', email='etags@example.com', first_name='Etta', last_name='Tag')
+        user.set_password('password')
+        blog.db.session.add(user)
+        blog.db.session.commit()
+        user_id = user.id
+    client = login(blog.app.test_client(), user_id)
+    assert client.post('/post/new', data={'title': 'Validators', 'content': '<p>First draft</p>',
+                                          'status': 'published'}).status_code == 302
+    with blog.app.app_context():
+        post_id = blog.Post.query.filter_by(slug='validators').one().id
+    return client, post_id
+
+
+def test_matching_if_none_match_gets_a_304(author):
+    client = blog.app.test_client()
+    response = client.get('/post/validators')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'].startswith('public')
+
+    response = client.get('/post/validators', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.get_data() == b''
+    assert client.get('/post/validators', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_logged_in_pages_are_private_and_never_304(author):
+    writer, _ = author
+    etag = blog.app.test_client().get('/post/validators').headers['ETag']
+    response = writer.get('/post/validators', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_editing_a_post_changes_its_etag(author):
+    writer, post_id = author
+    client = blog.app.test_client()
+    etag = client.get('/post/validators').headers['ETag']
+    assert writer.post(f'/post/{post_id}/edit', data={'title': 'Validators', 'content': '<p>Second draft</p>',
+                                                       'status': 'published'}).status_code == 302
+    response = client.get('/post/validators', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Second draft' in response.get_data(as_text=True)
+
+
+def test_editing_a_related_post_moves_last_modified(author):
+    writer, _ = author
+    for title in ('Modified main', 'Modified related'):
+        assert writer.post('/post/new', data={'title': title, 'content': f'<p>{title}</p>', 'status': 'published',
+                                              'tags': 'last-modified'}).status_code == 302
+    blog.page_cache.invalidate('related')
+    client = blog.app.test_client()
+    response = client.get('/post/modified-main')
+    assert 'modified-related' in response.get_data(as_text=True)
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/post/modified-main', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    with blog.app.app_context():
+        related = blog.Post.query.filter_by(slug='modified-related').one()
+        blog.db.session.execute(blog.db.update(blog.Post).where(blog.Post.id == related.id)
+                                .values(updated_at=related.updated_at + timedelta(minutes=5)))
+        blog.db.session.commit()
+        blog.post_changed(related.id)
+    response = client.get('/post/modified-main', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    assert response.headers['Last-Modified'] != last_modified
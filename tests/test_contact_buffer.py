@@ -0,0 +1,40 @@
+"""The contact write buffer retries failed writes a bounded number of times, then drops the rows."""
+
+from datetime import datetime
+
+import app as blog
+
+
+def submission(n):
+    return {'first_name': 'Flo', 'last_name': 'Flood', 'email': 'flood@example.com', 'subject': f'Buffered {n}',
+            'message': 'Hello', 'content_hash': f'buffered-{n}', 'created_at': datetime.utcnow(), 'is_read': False}
+
+
+def test_rows_are_dropped_after_max_attempts_failed_writes(monkeypatch):
+    with blog.app.app_context():
+        blog.upgrade_schema()
+    buffer = blog.ContactWriteBuffer(size=100, interval=3600, max_attempts=3)
+    try:
+        def fail():
+            raise blog.OperationalError('INSERT', {}, Exception('database is locked'))
+
+        monkeypatch.setattr(blog.db.session, 'commit', fail)
+        buffer.add(submission(1))
+        assert buffer.flush() == 0
+        buffer.add(submission(2))
+        assert buffer.flush() == 0
+        assert buffer.pending() == 2
+        assert buffer.flush() == 0
+        assert (buffer.pending(), buffer.dropped) == (1, 1)  # the first row failed three times
+        monkeypatch.undo()
+
+        assert buffer.flush() == 1
+        assert buffer.pending() == 0
+        with blog.app.app_context():
+            stored = blog.Contact.query.filter_by(email='flood@example.com').all()
+            assert [contact.subject for contact in stored] == ['Buffered 2']
+            blog.db.session.delete(stored[0])
+            blog.adjust_tally(blog.UNREAD_CONTACTS, -1)
+            blog.db.session.commit()
+    finally:
+        buffer.stop.set()
@@ -0,0 +1,67 @@
+"""Admin CSV and JSON Lines exports keep spreadsheet formulas inert and resume after a given id."""
+
+import csv
+import io
+import json
+
+import pytest
+
+import app as blog
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture(scope='module')
+def exporter():
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        admin = blog.User(username='exporter', email='exporter@example.com', first_name='Eve', last_name='Exporter',
+                          is_admin=True)
+        admin.set_password('password')
+        blog.db.session.add(admin)
+        blog.db.session.commit()
+        admin_id = admin.id
+        start = blog.db.session.scalar(blog.db.select(blog.db.func.max(blog.Contact.id))) or 0
+        for subject in ('=HYPERLINK("http://evil.example","x")', '+1+1', '-2', '@SUM(A1)', '\tTab', 'Plain'):
+            blog.db.session.add(blog.Contact(first_name='Mallory', last_name='M', email='m@example.com',
+                                             subject=subject, message='hello'))
+        blog.db.session.commit()
+        ids = blog.db.session.scalars(blog.db.select(blog.Contact.id).where(blog.Contact.id > start)
+                                      .order_by(blog.Contact.id)).all()
+    yield login(blog.app.test_client(), admin_id), start, ids
+    with blog.app.app_context():  # other modules count the messages in the shared database
+        blog.db.session.execute(blog.db.delete(blog.Contact).where(blog.Contact.id.in_(ids)))
+        blog.db.session.execute(blog.db.delete(blog.User).where(blog.User.id == admin_id))
+        blog.db.session.commit()
+
+
+def export_rows(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_csv_cells_that_look_like_formulas_are_quoted_as_text(exporter):
+    client, start, _ = exporter
+    subjects = [row['subject'] for row in export_rows(client, f'/admin/export/contacts.csv?after={start}')]
+    assert subjects == ["'=HYPERLINK(\"http://evil.example\",\"x\")", "'+1+1", "'-2", "'@SUM(A1)", "'\tTab", 'Plain']
+
+
+def test_jsonl_values_are_not_escaped(exporter):
+    client, start, _ = exporter
+    response = client.get(f'/admin/export/contacts.jsonl?after={start}')
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows[0]['subject'] == '=HYPERLINK("http://evil.example","x")'
+
+
+def test_after_resumes_past_the_last_row_received(exporter):
+    client, start, ids = exporter
+    rows = export_rows(client, f'/admin/export/contacts.csv?after={ids[2]}')
+    assert [int(row['id']) for row in rows] == ids[3:]
+    assert export_rows(client, f'/admin/export/contacts.csv?after={ids[-1]}') == []
+    assert client.get('/admin/export/contacts.csv?after=abc').status_code == 400
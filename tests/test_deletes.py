@@ -0,0 +1,89 @@
+"""Deletes refuse what is not yours with a 403, and bulk actions report what they changed and keep tag counts."""
+
+import logging
+
+import app as blog
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def test_deleting_someone_elses_post_is_forbidden(caplog):
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        owner = blog.User(username='owner', email='owner@example.com', first_name='Olive', last_name='Owner')
+        other = blog.User(username='other', email='other@example.com', first_name='Otto', last_name='Other')
+        for user in (owner, other):
+            user.set_password('password')
+            blog.db.session.add(user)
+        blog.db.session.commit()
+        owner_id, other_id = owner.id, other.id
+    owner_client = login(blog.app.test_client(), owner_id)
+    assert owner_client.post('/post/new', data={'title': 'Mine', 'content': '<p>Mine</p>',
+                                                 'status': 'published'}).status_code == 302
+    with blog.app.app_context():
+        post_id = blog.Post.query.filter_by(user_id=owner_id).one().id
+
+    client = login(blog.app.test_client(), other_id)
+    with caplog.at_level(logging.ERROR):
+        assert client.post(f'/post/{post_id}/delete').status_code == 403
+        assert client.post('/post/999999/delete').status_code == 404
+    assert not [record for record in caplog.records if record.levelno >= logging.ERROR]
+    with blog.app.app_context():
+        assert blog.db.session.get(blog.Post, post_id) is not None
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def tag_count(name):
+    with blog.app.app_context():
+        tag = blog.Tag.query.filter_by(name=name).one()
+        published = blog.db.session.scalar(
+            blog.db.select(blog.db.func.count()).select_from(blog.post_tags).join(blog.Post)
+            .where(blog.post_tags.c.tag_id == tag.id, blog.Post.status == 'published'))
+        return tag.post_count, published
+
+
+def test_bulk_actions_report_what_changed_and_keep_tag_counts(monkeypatch):
+    monkeypatch.setitem(blog.app.config, 'BULK_BATCH_SIZE', 2)  # several batches per action
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        author = blog.User(username='bulk', email='bulk@example.com', first_name='Bo', last_name='Bulk')
+        author.set_password('password')
+        blog.db.session.add(author)
+        blog.db.session.commit()
+        author_id = author.id
+        other_post_id = blog.Post.query.filter(blog.Post.user_id != author_id).first().id
+    client = login(blog.app.test_client(), author_id)
+    for n, status in enumerate(('published', 'draft', 'draft', 'draft', 'published')):
+        assert client.post('/post/new', data={'title': f'Bulk {n}', 'content': f'<p>Bulk {n}</p>',
+                                              'status': status, 'tags': 'bulkcase'}).status_code == 302
+    flashes(client)
+    with blog.app.app_context():
+        post_ids = [post.id for post in blog.Post.query.filter_by(user_id=author_id).order_by(blog.Post.id)]
+    assert tag_count('bulkcase') == (2, 2)
+
+    # Already published posts and other authors' posts are not counted
+    client.post('/dashboard/posts', data={'action': 'published', 'post_ids': [*post_ids[:4], other_post_id]})
+    assert flashes(client) == ['Published 3 posts.']
+    assert tag_count('bulkcase') == (5, 5)
+
+    client.post('/dashboard/posts', data={'action': 'draft', 'post_ids': post_ids[:1]})
+    assert flashes(client) == ['Moved to drafts 1 post.']
+    assert tag_count('bulkcase') == (4, 4)
+
+    client.post('/dashboard/posts', data={'action': 'delete', 'post_ids': [*post_ids[:4], other_post_id]})
+    assert flashes(client) == ['Deleted 4 posts.']
+    assert tag_count('bulkcase') == (1, 1)
+    with blog.app.app_context():
+        assert blog.db.session.get(blog.Post, other_post_id) is not None
+        assert blog.delete_posts(blog.Post.user_id == author_id) == 1
+        assert blog.set_post_status('published', blog.Post.user_id == author_id) == 0
+    assert tag_count('bulkcase') == (0, 0)
@@ -0,0 +1,17 @@
+"""The static export holds every local file its pages link to."""
+
+import re
+
+import app as blog
+
+
+def test_exported_pages_find_their_stylesheets_and_scripts(tmp_path, monkeypatch):
+    monkeypatch.setattr(blog, 'asset_manifest', {})  # as before `flask assets-build` ran
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        blog.export_site(str(tmp_path))
+    html = (tmp_path / 'index.html').read_text()
+    linked = re.findall(r'(?:href|src)="(/static/[^"]+)"', html)
+    assert linked
+    for url in linked:
+        assert (tmp_path / url.lstrip('/')).is_file(), url
@@ -0,0 +1,24 @@
+"""Sitemap chunks exist up to the one holding the newest published post."""
+
+import app as blog
+
+
+def test_sitemap_chunks_past_the_last_one_are_not_found(monkeypatch):
+    monkeypatch.setitem(blog.app.config, 'SITEMAP_CHUNK_SIZE', 1)
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        user = blog.User(username='mapper', email='mapper@example.com', first_name='Map', last_name='Per')
+        user.set_password('password')
+        blog.db.session.add(user)
+        blog.db.session.flush()
+        post = blog.Post(title='Mapped', slug='mapped', content='<p>Mapped</p>', status='published', user_id=user.id)
+        blog.db.session.add(post)
+        blog.db.session.commit()
+        last = post.id
+    client = blog.app.test_client()
+    response = client.get(f'/sitemap-{last}.xml')
+    assert response.status_code == 200
+    assert '/post/mapped' in response.get_data(as_text=True)
+    assert client.get('/sitemap-1.xml').status_code == 200
+    assert client.get(f'/sitemap-{last + 1}.xml').status_code == 404
+    assert client.get('/sitemap-0.xml').status_code == 404
@@ -0,0 +1,86 @@
+"""Retries, idempotency keys and lock recovery of the database-backed job queue."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as blog
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    calls = []
+
+    def flaky(**payload):
+        calls.append(payload)
+        raise RuntimeError('mail server down')
+
+    monkeypatch.setitem(blog.JOB_HANDLERS, 'test_flaky', (flaky, 2))
+    monkeypatch.setitem(blog.JOB_HANDLERS, 'test_noop', (lambda **payload: None, 5))
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        yield calls
+        blog.db.session.execute(blog.db.delete(blog.Job).where(blog.Job.kind.in_(('test_flaky', 'test_noop'))))
+        blog.db.session.commit()
+
+
+def test_failed_job_is_retried_later_then_marked_failed(jobs):
+    job = blog.enqueue('test_flaky', {'reply_id': 1})
+    blog.db.session.commit()
+    job_id = job.id
+
+    job = blog.claim_job('test-worker')
+    assert job.id == job_id and job.status == 'running' and job.attempts == 1
+    assert blog.run_job(job) is False
+    assert job.status == 'queued'
+    assert job.run_at > datetime.utcnow()
+    assert job.locked_by is None
+    assert job.last_error == 'RuntimeError: mail server down'
+    assert blog.claim_job('test-worker') is None  # not due until its backoff has passed
+
+    job.run_at = datetime.utcnow() - timedelta(seconds=1)
+    blog.db.session.commit()
+    job = blog.claim_job('test-worker')
+    assert job.attempts == 2
+    assert blog.run_job(job) is False
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+    assert jobs == [{'reply_id': 1}, {'reply_id': 1}]
+    assert blog.claim_job('test-worker') is None
+
+
+def test_duplicate_idempotency_key_returns_the_existing_job(jobs):
+    first = blog.enqueue('test_noop', {'n': 1}, key='test_noop:1')
+    blog.db.session.commit()
+    second = blog.enqueue('test_noop', {'n': 2}, key='test_noop:1')
+    blog.db.session.commit()
+    assert second.id == first.id
+    assert blog.Job.query.filter_by(idempotency_key='test_noop:1').count() == 1
+
+
+def test_same_key_enqueued_at_once_yields_one_job(jobs):
+    # Nothing is flushed between the two calls, as when two requests enqueue the key together
+    with blog.db.session.no_autoflush:
+        first = blog.enqueue('test_noop', {'n': 1}, key='test_noop:race')
+        second = blog.enqueue('test_noop', {'n': 2}, key='test_noop:race')
+    blog.db.session.commit()
+    assert second.id == first.id
+    assert blog.Job.query.filter_by(idempotency_key='test_noop:race').count() == 1
+
+
+def test_jobs_of_dead_workers_are_requeued_until_out_of_attempts(jobs):
+    locked_at = datetime.utcnow() - timedelta(seconds=blog.app.config['JOB_LOCK_TIMEOUT'] + 60)
+    retry = blog.Job(kind='test_noop', status='running', attempts=1, max_attempts=5,
+                     locked_by='dead-worker', locked_at=locked_at)
+    exhausted = blog.Job(kind='test_noop', status='running', attempts=5, max_attempts=5,
+                         locked_by='dead-worker', locked_at=locked_at)
+    fresh = blog.Job(kind='test_noop', status='running', attempts=1, max_attempts=5,
+                     locked_by='live-worker', locked_at=datetime.utcnow())
+    blog.db.session.add_all([retry, exhausted, fresh])
+    blog.db.session.commit()
+    blog.requeue_stale_jobs()
+    for job in (retry, exhausted, fresh):
+        blog.db.session.refresh(job)
+    assert (retry.status, retry.locked_by) == ('queued', None)
+    assert exhausted.status == 'failed' and exhausted.last_error == 'worker lock expired'
+    assert (fresh.status, fresh.locked_by) == ('running', 'live-worker')
@@ -0,0 +1,104 @@
+"""Upgrading a database created before the schema migrations to the current schema."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The schema db.create_all() made before migrations existed, as deployed blogs still have it
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, email VARCHAR(120) NOT NULL,
+    password_hash VARCHAR(200) NOT NULL, first_name VARCHAR(50) NOT NULL, last_name VARCHAR(50) NOT NULL,
+    bio TEXT, profile_picture VARCHAR(200), is_admin BOOLEAN, created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (username), UNIQUE (email)
+);
+CREATE TABLE tag (
+    id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, description TEXT, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE TABLE contact (
+    id INTEGER NOT NULL, first_name VARCHAR(50) NOT NULL, last_name VARCHAR(50) NOT NULL,
+    email VARCHAR(120) NOT NULL, subject VARCHAR(100) NOT NULL, message TEXT NOT NULL, created_at DATETIME,
+    is_read BOOLEAN, PRIMARY KEY (id)
+);
+CREATE TABLE post (
+    id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, content TEXT NOT NULL, excerpt TEXT,
+    featured_image VARCHAR(200), slug VARCHAR(200) NOT NULL, status VARCHAR(20), created_at DATETIME,
+    updated_at DATETIME, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), UNIQUE (slug), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE reply (
+    id INTEGER NOT NULL, contact_id INTEGER NOT NULL, admin_id INTEGER NOT NULL, message TEXT NOT NULL,
+    created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(contact_id) REFERENCES contact (id), FOREIGN KEY(admin_id) REFERENCES user (id)
+);
+CREATE TABLE post_tags (
+    post_id INTEGER NOT NULL, tag_id INTEGER NOT NULL,
+    PRIMARY KEY (post_id, tag_id), FOREIGN KEY(post_id) REFERENCES post (id), FOREIGN KEY(tag_id) REFERENCES tag (id)
+);
+INSERT INTO user VALUES (1, 'alice', 'alice@example.com', 'x', 'Alice', 'Admin', NULL, NULL, 1, '2024-01-01 00:00:00');
+INSERT INTO user VALUES (2, 'bob', 'bob@example.com', 'x', 'Bob', 'Writer', NULL, NULL, 0, '2024-01-02 00:00:00');
+INSERT INTO tag VALUES (1, 'python', NULL);
+INSERT INTO post VALUES (1, 'Hello garden', '<p>Tomatoes and basil</p>', '', NULL, 'hello-garden', 'published',
+                         '2024-01-03 00:00:00', '2024-01-03 00:00:00', 2);
+INSERT INTO post VALUES (2, 'Draft', '<p>Not yet</p>', '', NULL, 'draft', 'draft',
+                         '2024-01-04 00:00:00', '2024-01-04 00:00:00', 2);
+INSERT INTO post_tags VALUES (1, 1);
+INSERT INTO post_tags VALUES (2, 1);
+INSERT INTO contact VALUES (1, 'Carol', 'Reader', 'carol@example.com', 'Hi', 'Nice blog', '2024-01-05 00:00:00', 1);
+INSERT INTO contact VALUES (2, 'Dan', 'Reader', 'dan@example.com', 'Hey', 'Question', '2024-01-06 00:00:00', 0);
+INSERT INTO reply VALUES (1, 1, 1, 'Thanks!', '2024-01-07 00:00:00');
+'''
+
+
+def baseline_database(tmp_path):
+    path = tmp_path / 'blog.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+    return path
+
+
+def app_env(path, **settings):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', QUERY_BUDGET_ENFORCED='false', **settings)
+    for name in ('ADMIN_USERNAME', 'ADMIN_EMAIL', 'ADMIN_PASSWORD'):
+        env.pop(name, None)
+    return env
+
+
+def test_db_upgrade_from_baseline_schema(tmp_path):
+    path = baseline_database(tmp_path)
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db-upgrade'], cwd=ROOT,
+                            env=app_env(path), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    with sqlite3.connect(path) as conn:
+        assert {v for (v,) in conn.execute('SELECT version FROM schema_migration')} == set(app.MIGRATIONS)
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        model_indexes = {index.name for table in app.db.metadata.tables.values() for index in table.indexes}
+        assert model_indexes <= indexes
+        assert conn.execute('SELECT rowid, tags FROM post_search').fetchall() == [(1, 'python')]
+        assert conn.execute('SELECT post_count FROM tag').fetchall() == [(1,)]
+        assert conn.execute('SELECT id, reply_count FROM contact ORDER BY id').fetchall() == [(1, 1), (2, 0)]
+        assert conn.execute("SELECT value FROM tally WHERE name = 'unread_contacts'").fetchall() == [(1,)]
+        assert conn.execute('SELECT count(*) FROM user WHERE updated_at = created_at').fetchone() == (2,)
+    conn.close()
+
+
+def test_first_request_bootstraps_baseline_schema(tmp_path):
+    path = baseline_database(tmp_path)
+    code = '''
+import app
+client = app.app.test_client()
+for url in ("/", "/post/hello-garden", "/search?q=tomatoes", "/tag/python"):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+assert b"Hello garden" in client.get("/search?q=tomatoes").data
+'''
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=app_env(path, AUTO_MIGRATE='true'),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,159 @@
+"""Tag invalidation and max age of the page cache and the counts kept with it, in process memory and shared between processes."""
+
+import os
+import pickle
+import runpy
+
+import pytest
+
+import app as blog
+
+
+def store(cache, key='page:/post/a', tags=('post:1',)):
+    cache.set(key, b'<html>', 'text/html', tags, cache.epoch())
+
+
+def test_invalidated_tag_makes_entry_stale():
+    cache = blog.PageCache(max_entries=8)
+    store(cache)
+    assert cache.get('page:/post/a')['body'] == b'<html>'
+    cache.invalidate('post:2')
+    assert cache.get('page:/post/a') is not None
+    cache.invalidate('post:1')
+    assert cache.get('page:/post/a') is None
+
+
+def test_entry_older_than_max_age_is_stale(monkeypatch):
+    cache = blog.PageCache(max_entries=8, max_age=60)
+    now = 1_000_000.0
+    monkeypatch.setattr(blog.time, 'time', lambda: now)
+    store(cache)
+    now += 59
+    assert cache.get('page:/post/a') is not None
+    now += 1
+    assert cache.get('page:/post/a') is None
+
+
+def test_invalidation_reaches_every_process_sharing_the_directory(tmp_path):
+    # Two caches over one directory stand in for two gunicorn workers
+    worker_a = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path)))
+    worker_b = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path)))
+    store(worker_a)
+    assert worker_a.get('page:/post/a') is not None
+    assert worker_b.get('page:/post/a') is not None
+    worker_b.invalidate('post:1')
+    assert worker_a.get('page:/post/a') is None
+
+
+def test_stale_local_copy_leaves_another_workers_fresh_entry(tmp_path):
+    worker_a = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path)))
+    worker_b = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path)))
+    store(worker_a)
+    assert worker_a.get('page:/post/a') is not None  # worker A now holds a local copy
+    worker_b.invalidate('post:1')
+    worker_b.set('page:/post/a', b'<new>', 'text/html', ('post:1',), worker_b.epoch())
+    assert worker_a.get('page:/post/a')['body'] == b'<new>'
+    assert worker_b.backend.get('page:/post/a')['body'] == b'<new>'
+
+
+def test_count_invalidation_reaches_every_process_sharing_the_directory(tmp_path):
+    worker_a = blog.CountCache(60, versions=blog.PageCache(backend=blog.FileSystemCacheBackend(str(tmp_path))))
+    worker_b = blog.CountCache(60, versions=blog.PageCache(backend=blog.FileSystemCacheBackend(str(tmp_path))))
+    assert worker_a.get('inbox:summary', lambda: 1) == 1
+    assert worker_a.get('inbox:summary', lambda: 2) == 1
+    worker_b.invalidate('inbox')
+    assert worker_a.get('inbox:summary', lambda: 2) == 2
+
+
+def test_count_invalidation_only_drops_its_scope(tmp_path):
+    counts = blog.CountCache(60, versions=blog.PageCache(backend=blog.FileSystemCacheBackend(str(tmp_path))))
+    other_worker = blog.CountCache(60, versions=blog.PageCache(backend=blog.FileSystemCacheBackend(str(tmp_path))))
+    for cache in (counts, other_worker):
+        cache.get('inbox:summary', lambda: 1)
+        cache.get('post-status:all', lambda: 1)
+    counts.invalidate('inbox')
+    for cache in (counts, other_worker):
+        assert cache.get('inbox:summary', lambda: 2) == 2
+        assert cache.get('post-status:all', lambda: 2) == 1
+    other_worker.invalidate()
+    assert counts.get('post-status:all', lambda: 3) == 3
+
+
+def test_count_invalidation_keeps_pages_being_rendered():
+    pages = blog.PageCache(max_entries=8)
+    counts = blog.CountCache(60, versions=pages)
+    epoch = pages.epoch()
+    counts.invalidate('inbox')
+    pages.set('page:/post/a', b'<html>', 'text/html', ('post:1',), epoch)
+    assert pages.get('page:/post/a') is not None
+
+
+def test_shared_directory_keeps_at_most_max_entries(tmp_path):
+    cache = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path), max_entries=10))
+    for n in range(25):
+        store(cache, key=f'page:/?cursor={n}')
+    assert len(cache.backend) <= 10
+    assert cache.backend.evictions >= 15
+    assert cache.backend.get('page:/?cursor=24') is not None
+
+
+def test_page_key_ignores_unused_arguments_and_host():
+    with blog.app.test_request_context('/?cursor=abc&utm=1', headers={'Host': 'spoofed.example'}):
+        spoofed = blog.page_cache_key()
+    with blog.app.test_request_context('/?cursor=abc'):
+        assert blog.page_cache_key() == spoofed
+    with blog.app.test_request_context('/?cursor=def'):
+        assert blog.page_cache_key() != spoofed
+
+
+def test_job_runner_shares_the_web_workers_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv('PAGE_CACHE_DIR', '')  # restored afterwards; gunicorn.conf.py fills it in
+    settings = runpy.run_path(os.path.join(blog.app.root_path, 'gunicorn.conf.py'))
+    assert os.environ['PAGE_CACHE_DIR'] == 'auto'  # resolved by the app to default_page_cache_dir()
+    assert 'on_exit' not in settings  # the job runner may still be using the directory
+    cache = blog.PageCache(max_entries=8)
+    monkeypatch.setattr(blog, 'page_cache', cache)
+    monkeypatch.setattr(blog, 'default_page_cache_dir', lambda: str(tmp_path))
+    result = blog.app.test_cli_runner().invoke(args=['worker', '--once'])
+    assert result.exit_code == 0, result.output
+    web_worker = blog.PageCache(max_entries=8, backend=blog.FileSystemCacheBackend(str(tmp_path)))
+    store(web_worker, tags=('post:7',))
+    cache.invalidate('post:7')
+    assert web_worker.get('page:/post/a') is None
+
+
+def test_entries_nobody_reads_are_expired(monkeypatch, tmp_path):
+    now = 1_000_000.0
+    monkeypatch.setattr(blog.time, 'time', lambda: now)
+    for backend in (None, blog.FileSystemCacheBackend(str(tmp_path))):
+        cache = blog.PageCache(max_entries=100, backend=backend, max_age=60)
+        store(cache, key='page:/old')
+        if backend is not None:
+            # Files carry the real clock's mtime; date the entry back to the patched one
+            os.utime(backend._entry_path('page:/old'), (now, now))
+        now += 61
+        store(cache, key='page:/new')
+        assert len(cache.backend) == 1
+        assert cache.stats()['expired'] == 1
+
+
+def test_cache_directory_must_be_private_to_this_user(tmp_path):
+    loose = tmp_path / 'loose'
+    loose.mkdir(mode=0o777)
+    loose.chmod(0o777)
+    assert blog.private_directory(str(loose))
+    assert loose.stat().st_mode & 0o777 == 0o700
+    (tmp_path / 'link').symlink_to(loose)
+    assert not blog.private_directory(str(tmp_path / 'link'))
+    with pytest.raises(RuntimeError):
+        blog.FileSystemCacheBackend(str(tmp_path / 'link'))
+
+
+def test_shared_entries_are_not_unpickled(tmp_path):
+    backend = blog.FileSystemCacheBackend(str(tmp_path))
+    cache = blog.PageCache(max_entries=8, backend=backend)
+    store(cache)
+    assert backend.get('page:/post/a')['body'] == b'<html>'
+    with open(backend._entry_path('page:/post/a'), 'wb') as f:
+        f.write(pickle.dumps({'body': b'<planted>', 'tags': {}}))
+    assert backend.get('page:/post/a') is None
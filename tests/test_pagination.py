@@ -0,0 +1,70 @@
+"""Keyset pagination walks forward and back with its cursors and treats a malformed cursor as the first page."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as blog
+
+
+@pytest.fixture(scope='module')
+def author_id():
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        user = blog.User(username='pager', email='pager@example.com', first_name='Paige', last_name='Pager')
+        user.set_password('password')
+        blog.db.session.add(user)
+        blog.db.session.flush()
+        start = datetime(2020, 1, 1)
+        for n in range(5):
+            blog.db.session.add(blog.Post(title=f'Page {n}', slug=f'pager-{n}', content='<p>Page</p>',
+                                          status='draft', user_id=user.id, created_at=start + timedelta(days=n)))
+        # Same created_at as 'Page 2': the id breaks the tie
+        blog.db.session.add(blog.Post(title='Page 2b', slug='pager-2b', content='<p>Page</p>', status='draft',
+                                      user_id=user.id, created_at=start + timedelta(days=2)))
+        blog.db.session.commit()
+        return user.id
+
+
+def page(author_id, cursor=None):
+    query = blog.Post.query.filter_by(user_id=author_id)
+    result = blog.keyset_paginate(query, blog.Post, cursor, per_page=2)
+    return [post.title for post in result], result
+
+
+def test_cursors_walk_forward_and_back(author_id):
+    with blog.app.app_context():
+        titles, first = page(author_id)
+        assert titles == ['Page 4', 'Page 3']
+        assert not first.has_prev and first.has_next
+
+        titles, second = page(author_id, first.next_cursor)
+        assert titles == ['Page 2b', 'Page 2']
+        assert second.has_prev and second.has_next
+
+        titles, third = page(author_id, second.next_cursor)
+        assert titles == ['Page 1', 'Page 0']
+        assert third.has_prev and not third.has_next
+
+        titles, back = page(author_id, third.prev_cursor)
+        assert titles == ['Page 2b', 'Page 2']
+        assert back.has_prev and back.has_next
+
+        titles, start = page(author_id, back.prev_cursor)
+        assert titles == ['Page 4', 'Page 3']
+        assert not start.has_prev and start.has_next
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    '!!!',
+    blog.pack_cursor(['sideways', '2020-01-03T00:00:00', 1]),
+    blog.pack_cursor(['next', 'yesterday', 1]),
+    blog.pack_cursor(['next', '2020-01-03T00:00:00']),
+], ids=['garbage', 'not base64', 'direction', 'date', 'too short'])
+def test_malformed_cursor_falls_back_to_the_first_page(author_id, cursor):
+    with blog.app.app_context():
+        titles, result = page(author_id, cursor)
+        assert titles == ['Page 4', 'Page 3']
+        assert not result.has_prev
+    assert blog.app.test_client().get('/', query_string={'cursor': cursor}).status_code == 200
@@ -0,0 +1,116 @@
+"""Every view with a @query_budget stays within it on cold caches, with QUERY_BUDGET_ENFORCED on."""
+
+import pytest
+
+import app as blog
+
+ADMIN_VIEWS = ('/dashboard', '/admin/contacts', '/admin/inbox/summary', '/admin/users', '/admin/contact/{contact}',
+               '/admin/jobs')
+WRITER_VIEWS = ('/dashboard', '/my-messages')
+PUBLIC_VIEWS = ('/', '/post/{slug}', '/search?q=garden', '/search?q=zzz', '/tags', '/tag/python')
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture(scope='module')
+def site():
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        admin = blog.User(username='admin', email='admin@example.com', first_name='Ada', last_name='Admin',
+                          is_admin=True)
+        writer = blog.User(username='writer', email='writer@example.com', first_name='Wes', last_name='Writer')
+        for user in (admin, writer):
+            user.set_password('password')
+            blog.db.session.add(user)
+        blog.db.session.commit()
+        ids = {'admin': admin.id, 'writer': writer.id}
+
+    writer_client = login(blog.app.test_client(), ids['writer'])
+    for n in range(3):
+        response = writer_client.post('/post/new', data={
+            'title': f'Garden notes {n}', 'content': f'<p>Tomatoes in the garden, week {n}</p>',
+            'status': 'published', 'tags': 'python, garden'})
+        assert response.status_code == 302
+    for n in range(2):
+        response = blog.app.test_client().post('/contact', data={
+            'firstName': 'Wes', 'lastName': 'Writer', 'email': 'writer@example.com', 'subject': f'Question {n}',
+            'message': f'How do you grow tomatoes? ({n})'})
+        assert response.status_code == 302
+    with blog.app.app_context():
+        ids['contact'], ids['unanswered'] = [contact.id for contact in blog.Contact.query.order_by(blog.Contact.id)]
+        ids['slug'] = blog.Post.query.order_by(blog.Post.id).first().slug
+    admin_client = login(blog.app.test_client(), ids['admin'])
+    assert admin_client.post(f"/admin/contact/{ids['contact']}/reply",
+                             data={'reply_message': 'Lots of sun.'}).status_code == 302
+    return ids
+
+
+def cases():
+    return [pytest.param(viewer, url, id=f'{viewer or "anonymous"} {url}')
+            for viewer, urls in (('admin', ADMIN_VIEWS), ('writer', WRITER_VIEWS), (None, PUBLIC_VIEWS))
+            for url in urls]
+
+
+def clear_caches():
+    blog.count_cache.invalidate()
+    blog.page_cache.invalidate('related')  # the related posts index reloads on its next use
+
+
+@pytest.mark.parametrize('viewer,url', cases())
+def test_view_within_query_budget(site, viewer, url):
+    client = blog.app.test_client()
+    if viewer:
+        login(client, site[viewer])
+    clear_caches()
+    response = client.get(url.format(**site))
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('is_read', [False, None], ids=['unread', 'legacy NULL'])
+def test_opening_an_unread_message_without_replies(site, is_read):
+    with blog.app.app_context():
+        blog.db.session.execute(blog.db.update(blog.Contact).where(blog.Contact.id == site['unanswered'])
+                                .values(is_read=is_read))
+        blog.db.session.commit()
+    client = login(blog.app.test_client(), site['admin'])
+    clear_caches()
+    response = client.get(f"/admin/contact/{site['unanswered']}")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    with blog.app.app_context():
+        assert blog.db.session.get(blog.Contact, site['unanswered']).is_read is True
+
+
+def test_every_budgeted_view_is_covered():
+    adapter = blog.app.url_map.bind('localhost')
+    covered = {adapter.match(url.split('?')[0].format(contact=1, slug='post'))[0]
+               for url in ADMIN_VIEWS + WRITER_VIEWS + PUBLIC_VIEWS}
+    budgeted = {endpoint for endpoint, view in blog.app.view_functions.items() if hasattr(view, 'query_budget')}
+    assert budgeted <= covered
+
+
+def test_over_budget_response_is_a_plain_500(site, monkeypatch):
+    monkeypatch.setattr(blog.app.view_functions['tag_index'], 'query_budget', 0)
+    before = dict(((labels['endpoint'],), value) for _, labels, value in blog.query_budget_violations.samples())
+    response = blog.app.test_client().get('/tags')
+    assert response.status_code == 500
+    assert response.mimetype == 'text/plain'
+    assert 'tag_index issued 1 queries, budget is 0' in response.get_data(as_text=True)
+    after = dict(((labels['endpoint'],), value) for _, labels, value in blog.query_budget_violations.samples())
+    assert after[('tag_index',)] == before.get(('tag_index',), 0) + 1
+
+
+def test_viewing_a_stale_post_rerenders_it_within_budget(site):
+    with blog.app.app_context():
+        blog.db.session.execute(blog.db.update(blog.Post).where(blog.Post.slug == site['slug'])
+                                .values(render_version='old'))
+        blog.db.session.commit()
+    clear_caches()
+    response = blog.app.test_client().get(f"/post/{site['slug']}")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    with blog.app.app_context():
+        assert blog.Post.query.filter_by(slug=site['slug']).one().render_version == blog.RENDER_VERSION
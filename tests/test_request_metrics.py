@@ -0,0 +1,17 @@
+"""Per-request SQL accounting."""
+
+import pytest
+
+import app as blog
+
+
+def test_failed_statement_leaves_no_query_timer():
+    with blog.app.test_request_context('/'):
+        connection = blog.db.session.connection()
+        with pytest.raises(blog.OperationalError):
+            blog.db.session.execute(blog.db.text('SELECT * FROM no_such_table'))
+        assert connection.info.get('query_started') == []
+        blog.db.session.rollback()
+        blog.db.session.execute(blog.db.text('SELECT 1'))
+        assert blog.g.query_count == 2
+        assert blog.g.sql_time > 0
@@ -0,0 +1,40 @@
+"""Full-text search says when SEARCH_RANK_WINDOW left older matches out."""
+
+import pytest
+
+import app as blog
+
+
+@pytest.fixture(scope='module')
+def client():
+    with blog.app.app_context():
+        blog.upgrade_schema()
+        user = blog.User(username='searcher', email='searcher@example.com', first_name='Sue', last_name='Searcher')
+        user.set_password('password')
+        blog.db.session.add(user)
+        blog.db.session.commit()
+        user_id = user.id
+    client = blog.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    for n in range(4):
+        response = client.post('/post/new', data={'title': f'Marmalade batch {n}', 'status': 'published',
+                                                  'content': f'<p>Seville oranges, marmalade batch {n}</p>'})
+        assert response.status_code == 302
+    return blog.app.test_client()
+
+
+def test_results_say_when_older_matches_are_left_out(client, monkeypatch):
+    with blog.app.app_context():
+        if not blog.search_supported():
+            pytest.skip('SQLite without FTS5')
+    monkeypatch.setitem(blog.app.config, 'SEARCH_RANK_WINDOW', 3)
+    page = client.get('/search?q=marmalade').get_data(as_text=True)
+    assert 'the 3 most recent matches' in page
+    assert 'batch 0' not in page
+
+    monkeypatch.setitem(blog.app.config, 'SEARCH_RANK_WINDOW', 4)
+    page = client.get('/search?q=marmalade').get_data(as_text=True)
+    assert 'most recent matches' not in page
+    assert 'batch 0' in page
@@ -0,0 +1,48 @@
+"""Login and contact form rate limits key on the client address forwarded by the proxy."""
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import app as blog
+
+PROXY = {'REMOTE_ADDR': '10.0.0.1'}
+
+
+def post_from(client_ip, path, data):
+    return blog.app.test_client().post(path, data=data, environ_base=PROXY,
+                                       headers={'X-Forwarded-For': client_ip})
+
+
+@pytest.fixture(autouse=True)
+def behind_proxy(monkeypatch):
+    """One trusted proxy hop, whatever TRUSTED_PROXY_HOPS the app was imported with."""
+    wsgi_app = blog.app.wsgi_app
+    if isinstance(wsgi_app, ProxyFix):
+        wsgi_app = wsgi_app.app
+    monkeypatch.setattr(blog.app, 'wsgi_app', ProxyFix(wsgi_app, x_for=1, x_proto=1))
+    monkeypatch.setitem(blog.app.config, 'TRUSTED_PROXY_HOPS', 1)
+
+
+def test_login_throttle_is_per_client_behind_proxy(monkeypatch):
+    monkeypatch.setitem(blog.app.config, 'LOGIN_THROTTLE_ENABLED', True)
+    monkeypatch.setitem(blog.app.config, 'LOGIN_IP_BURST', 3)
+    monkeypatch.setattr(blog, 'login_throttle', blog.RateLimiter())
+    statuses = [post_from('203.0.113.7', '/login', {'username': f'nobody{n}', 'password': 'wrong'}).status_code
+                for n in range(4)]
+    assert statuses[-1] == 429
+    other = post_from('198.51.100.9', '/login', {'username': 'someone', 'password': 'wrong'})
+    assert other.status_code != 429
+
+
+def test_contact_throttle_is_per_client_behind_proxy(monkeypatch):
+    monkeypatch.setitem(blog.app.config, 'CONTACT_THROTTLE_ENABLED', True)
+    monkeypatch.setitem(blog.app.config, 'CONTACT_IP_BURST', 2)
+    monkeypatch.setattr(blog, 'contact_throttle', blog.RateLimiter())
+
+    def message(n):
+        return {'firstName': 'Sam', 'lastName': 'Sender', 'email': f'sender{n}@example.com',
+                'subject': 'Hello', 'message': f'Message number {n}'}
+
+    statuses = [post_from('203.0.113.7', '/contact', message(n)).status_code for n in range(3)]
+    assert statuses == [302, 302, 429]
+    assert post_from('198.51.100.9', '/contact', message(3)).status_code == 302